@@ -0,0 +1,229 @@
+"""
+Answer cache for user questions.
+
+A question is looked up in two steps.
+
+The first step keys the answer by the question's content words, in order.
+The question is lowercased and its sentence punctuation is dropped (the
+normalized question), then filler words ("the", "please", "exactly", ...)
+are removed and each word is reduced to a base form, with a few common
+synonyms ("top", "leading") mapped to one word. So "What exactly are the top
+GEO tools?" and "what are best GEO tool" share one answer. A lookup whose
+normalized question equals the stored one is an exact hit; one that only
+shares the content words is a similar hit. These answers are stored in a
+TieredCache (TTL, LRU, optionally a SQLite file shared by all workers).
+
+The second step finds near-duplicates: questions that add or drop a
+qualifier ("what are the best free GEO tools"). Each question's shingles
+(its content words and pairs of adjacent content words, so word order
+counts) get a MinHash signature, and LSH bands of the signatures find
+candidates without a scan. A candidate is used only if the shingle
+similarity reaches ANSWER_CACHE_SIMILARITY and one question's content words
+appear, in order, in the other's, and both ask about the same numbers,
+negations and names. A swapped word ("Europe" / "Asia", "best" / "worst")
+or reordered operands ("12 to 15" / "15 to 12") therefore never match.
+The near-duplicate index is kept per process and is bounded by the same
+size and TTL.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from cache import TieredCache, make_key, minhash
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+# Shingle similarity at which a near-duplicate question's answer is reused
+# (0 = exact matches only, without the content-word step either)
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.6"))
+
+# 32 bands of 2 rows: questions at 0.6 similarity share a band with probability > 0.999
+BANDS = 32
+
+# Stripped from both ends of a word; "c++", "c#" and ".net" keep their symbols
+_EDGE_PUNCTUATION = "?!,;:\"'`()[]{}¿¡“”‘’"
+# Words that don't change what is asked. Negations and question words are kept.
+FILLER_WORDS = frozenset({"a", "an", "the", "please", "exactly", "actually", "really", "basically", "just"})
+# Words that ask the same thing, mapped to one form (after word_form)
+SYNONYMS = {
+    "top": "best", "leading": "best", "greatest": "best", "finest": "best",
+    "quick": "fast", "quickly": "fast", "inexpensive": "cheap", "affordable": "cheap",
+    "utilize": "use", "method": "way", "app": "tool", "application": "tool"
+}
+NEGATIONS = frozenset({"not", "no", "never", "without", "isn't", "aren't", "don't", "doesn't", "can't", "won't"})
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop sentence punctuation: "What is GEO?" -> "what is geo"."""
+    words = (word.strip(_EDGE_PUNCTUATION).rstrip(".") for word in (query or "").lower().split())
+    return " ".join(word for word in words if word)
+
+
+def word_form(word: str) -> str:
+    """Base form of a word: drops a possessive and a plural ending ("tools" -> "tool", "geo's" -> "geo")."""
+    if word.endswith(("'s", "’s")):
+        word = word[:-2]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    # Short words ("news", "was", "this") and words like "class" or "analysis" keep their "s"
+    if len(word) > 4 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def content_words(normalized: str) -> tuple:
+    """The normalized question's content words in their base form, in order."""
+    forms = (word_form(word) for word in normalized.split() if word not in FILLER_WORDS)
+    return tuple(SYNONYMS.get(form, form) for form in forms)
+
+
+def name_words(query: str) -> frozenset:
+    """
+    Base forms of the words the question names: capitalized words after the
+    first, acronyms ("GEO", "CRM") and words with digits.
+    """
+    names = set()
+    for position, word in enumerate((query or "").split()):
+        word = word.strip(_EDGE_PUNCTUATION).rstrip(".")
+        if not word:
+            continue
+        if any(c.isdigit() for c in word) or (len(word) > 1 and word.isupper()) or (position and word[0].isupper()):
+            names.update(content_words(word.lower()))
+    return frozenset(names)
+
+
+def shingles(words: tuple) -> frozenset:
+    """A question's content words and pairs of adjacent content words."""
+    return frozenset(words) | frozenset(f"{a} {b}" for a, b in zip(words, words[1:]))
+
+
+def is_subsequence(short: tuple, long: tuple) -> bool:
+    rest = iter(long)
+    return all(word in rest for word in short)
+
+
+def same_question(words: tuple, names: frozenset, other: tuple, other_names: frozenset) -> bool:
+    """
+    Whether two questions only differ by added qualifiers: one's content words
+    appear in order in the other's, and both have the same numbers, negations
+    and names.
+    """
+    short, long = (words, other) if len(words) <= len(other) else (other, words)
+    if not is_subsequence(short, long):
+        return False
+    if [w for w in words if any(c.isdigit() for c in w)] != [w for w in other if any(c.isdigit() for c in w)]:
+        return False
+    if NEGATIONS.intersection(words) != NEGATIONS.intersection(other):
+        return False
+    return (names | other_names) <= (set(words) & set(other))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 similarity: float = ANSWER_CACHE_SIMILARITY, db_path: str = None):
+        self.answers = TieredCache("answers", max_entries=max_entries, ttl=ttl, db_path=db_path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        # Near-duplicate index: answer key -> (words, names, shingles, band keys, created), in LRU order
+        self._entries = OrderedDict()
+        self._bands = {}
+        self._lock = threading.Lock()
+        self.counters = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "bypassed": 0}
+
+    def get(self, query: str, model: str):
+        """Return (answer, "exact" or "similar"), or (None, None) on a miss."""
+        normalized = normalize_query(query)
+        words = content_words(normalized) if self.similarity > 0 else ()
+        entry = self.answers.get(self._key(normalized, words, model))
+        if entry is None and words:
+            key = self._similar(words, name_words(query), model)
+            entry = self.answers.get(key) if key else None
+        if entry is None:
+            self._count("misses")
+            return None, None
+
+        entry = json.loads(entry)
+        match = "exact" if entry["query"] == normalized else "similar"
+        self._count(f"{match}_hits")
+        return entry["answer"], match
+
+    def put(self, query: str, model: str, answer: str):
+        normalized = normalize_query(query)
+        words = content_words(normalized) if self.similarity > 0 else ()
+        key = self._key(normalized, words, model)
+        self.answers.set(key, json.dumps({"query": normalized, "answer": answer}))
+        if not words:
+            return
+
+        question = shingles(words)
+        bands = [(model, band, rows.tobytes()) for band, rows in enumerate(np.split(minhash(question), BANDS))]
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (words, name_words(query), question, bands, time.time())
+            for band in bands:
+                self._bands.setdefault(band, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def bypass(self):
+        """Count a request that skipped the cache."""
+        self._count("bypassed")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters, indexed=len(self._entries))
+        stats["hits"] = stats["exact_hits"] + stats["similar_hits"]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    @staticmethod
+    def _key(normalized: str, words: tuple, model: str) -> str:
+        # A question made only of filler words is keyed by its normalized text
+        return make_key(" ".join(words) if words else normalized, model)
+
+    def _similar(self, words: tuple, names: frozenset, model: str):
+        """Key of the most similar earlier question that passes the guard, or None."""
+        question = shingles(words)
+        signature = minhash(question)
+        now = time.time()
+        best_key, best = None, self.similarity
+        with self._lock:
+            candidates = set()
+            for band, rows in enumerate(np.split(signature, BANDS)):
+                candidates |= self._bands.get((model, band, rows.tobytes()), set())
+            for key in candidates:
+                other, other_names, other_shingles, _, created = self._entries[key]
+                if now - created > self.ttl:
+                    self._drop(key)
+                    continue
+                score = jaccard(question, other_shingles)
+                if score >= best and same_question(words, names, other, other_names):
+                    best_key, best = key, score
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+        return best_key
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band in entry[3]:
+            keys = self._bands.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[band]
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
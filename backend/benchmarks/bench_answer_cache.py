@@ -0,0 +1,101 @@
+"""
+Benchmark answer cache lookups and check which reworded questions reuse an answer.
+
+Each case stores the answer to one question and looks up another. Rewordings
+that only add filler words, punctuation, plurals, synonyms or a qualifier
+must hit; questions that swap a word, reorder the words or change a number,
+negation or name must miss. Exits with status 1 if any case gives the wrong
+result.
+
+Usage (from the backend directory):
+    python benchmarks/bench_answer_cache.py --questions 5000 --lookups 1000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from answer_cache import AnswerCache
+
+TOOLS = "what are the best project management tools for small remote software teams in europe"
+MIGRATION = "how do I migrate a postgres database from version 12 to version 15 without downtime"
+
+# (stored question, looked-up question, expected match)
+CASES = [
+    ("what is GEO", "What is GEO?", "exact"),
+    ("what is GEO", "what is   geo.", "exact"),
+    ("what is GEO", "What exactly is GEO", "similar"),
+    ("what are the best GEO tools", "What are best GEO tool?", "similar"),
+    ("what are the top GEO tools", "what are the leading GEO tools", "similar"),
+    # An added or dropped qualifier
+    ("what are the best GEO tools", "what are the best free GEO tools", "similar"),
+    ("what are the best free GEO tools", "what are the best GEO tools", "similar"),
+    (TOOLS, TOOLS.replace("small", "small and fast"), "similar"),
+    (MIGRATION, MIGRATION + " on aws", "similar"),
+    # A qualifier that names something, or adds a number or negation
+    ("best CRM tools", "best CRM tools for Salesforce", None),
+    ("how to rank in ai answers", "how to rank in ai answers in 2025", None),
+    ("how to rank in ai answers", "how to not rank in ai answers", None),
+    ("what is GEO", "GEO what is", None),
+    ("what is GEO", "what is SEO", None),
+    ("is geo dead", "is geo not dead", None),
+    ("best seo tools 2024", "best seo tools 2025", None),
+    # One swapped noun or adjective
+    (TOOLS, TOOLS.replace("europe", "asia"), None),
+    (TOOLS, TOOLS.replace("best", "worst"), None),
+    (MIGRATION, MIGRATION.replace("postgres", "mysql"), None),
+    (TOOLS.replace("europe", "Europe"), TOOLS.replace("europe", "Asia"), None),
+    # Reordered operands
+    (MIGRATION, MIGRATION.replace("12 to version 15", "15 to version 12"), None),
+    ("is chatgpt better than perplexity for research", "is perplexity better than chatgpt for research", None),
+]
+
+
+def check_cases() -> list:
+    failures = []
+    for stored, asked, expected in CASES:
+        cache = AnswerCache(max_entries=16)
+        cache.put(stored, "m", "answer")
+        _, match = cache.get(asked, "m")
+        if match != expected:
+            failures.append({"stored": stored, "asked": asked, "expected": expected, "got": match})
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=5000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    failures = check_cases()
+
+    rng = random.Random(1)
+    vocabulary = [f"w{i}" for i in range(3000)]
+    questions = [" ".join(rng.sample(vocabulary, 8)) for _ in range(args.questions)]
+    cache = AnswerCache(max_entries=args.questions)
+    for question in questions:
+        cache.put(question, "m", "x")
+    lookups = [rng.choice(questions) for _ in range(args.lookups)]
+    start = time.perf_counter()
+    for question in lookups:
+        # An added qualifier, so every lookup goes through the near-duplicate index
+        cache.get("please " + question + " today?", "m")
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "questions": args.questions,
+        "lookup_us": round(elapsed / max(args.lookups, 1) * 1e6, 1),
+        "stats": cache.stats(),
+        "cases": len(CASES),
+        "failures": failures
+    }, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
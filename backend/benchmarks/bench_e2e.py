@@ -0,0 +1,386 @@
+"""
+Offline end-to-end load benchmark for the backend and the site auditor.
+
+Starts local stand-ins for the outside world:
+- a corpus server for recorded HTML pages (--corpus, a directory of .html
+  files; without one, synthetic pages from 20 KB to 3 MB are used),
+- the fake Groq server, with --llm-latency and an optional --llm-rpm limit,
+- a fake Lighthouse CLI that sleeps for --lighthouse-latency and prints a report.
+
+The backend and the site auditor then run under uvicorn as subprocesses
+pointed at them. /generate/summary, /compare and /api/audit each get
+--requests requests, --concurrency at a time. The JSON report has
+throughput, p50/p95/p99 latency and errors per endpoint, and each server's
+peak RSS.
+
+With --baseline, the run is compared with an earlier report. The script exits
+with status 1 when an endpoint's p95 latency rises, or its throughput falls,
+by more than --tolerance.
+
+Record real pages once (this needs internet access) and reuse them offline:
+    python benchmarks/bench_e2e.py --record urls.txt --corpus corpus/
+
+Usage (from the backend directory):
+    python benchmarks/bench_e2e.py --corpus corpus/ --requests 40 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AUDITOR_DIR = os.path.join(BACKEND_DIR, "..", "site-auditor-prototype", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from stubs import CorpusHandler, FakeGroqHandler, server_url, start_server
+
+ENDPOINTS = ("summary", "compare", "audit")
+SYNTHETIC_SIZES = (20_000, 100_000, 500_000, 1_000_000, 3_000_000)
+FAKE_ANALYSIS = {
+    "overall_alignment": {"most_aligned_url": "", "reason": "Benchmark"},
+    "url_analysis": {
+        "user_url": {"relevance_percent": 50, "topics_covered": [], "topics_missing": [], "geo_recommendations": []},
+        "competitors": []
+    }
+}
+FAKE_LIGHTHOUSE = """#!{python}
+import json, os, time
+time.sleep(float(os.environ.get("FAKE_LIGHTHOUSE_LATENCY", "0")))
+print(json.dumps({{
+    "categories": {{name: {{"score": 0.9}} for name in ("performance", "accessibility", "best-practices", "seo")}},
+    "audits": {{
+        "largest-contentful-paint": {{"numericValue": 1800}},
+        "max-potential-fid": {{"numericValue": 90}},
+        "cumulative-layout-shift": {{"numericValue": 0.05}}
+    }}
+}}))
+"""
+
+
+# ----- corpus
+
+def synthetic_page(target_bytes: int, index: int) -> bytes:
+    block = f"""<section><h2>Section heading</h2>
+<p>Generative engines prefer short factual passages about topic {index}. See
+<a href="https://en.wikipedia.org/wiki/Search_engine">the reference</a> and <a href="/docs">the docs</a>.</p>
+<ul><li>First point with a figure of 42%</li><li>Second point</li></ul>
+<table><tr><td>Option</td><td>Value</td></tr><tr><td>Plan</td><td>10</td></tr></table></section>
+"""
+    head = f"""<html><head><title>Synthetic page {index}</title>
+<meta name="description" content="Benchmark page {index}">
+<script type="application/ld+json">{{"@type": "FAQPage"}}</script></head><body><h1>Page {index}</h1>"""
+    return (head + block * max(1, target_bytes // len(block)) + "</body></html>").encode()
+
+
+def load_corpus(corpus: str) -> dict:
+    if corpus:
+        pages = {}
+        for name in sorted(os.listdir(corpus)):
+            if name.endswith((".html", ".htm")):
+                with open(os.path.join(corpus, name), "rb") as f:
+                    pages[name] = f.read()
+        if not pages:
+            raise SystemExit(f"No .html files in {corpus}")
+        return pages
+    return {f"synthetic-{size // 1000}k.html": synthetic_page(size, i) for i, size in enumerate(SYNTHETIC_SIZES)}
+
+
+def record(urls_file: str, corpus: str):
+    """Fetch the URLs listed in urls_file (one per line) and save them into the corpus directory."""
+    from fetcher import FetchError, fetch
+
+    os.makedirs(corpus, exist_ok=True)
+    saved = []
+    with open(urls_file) as f:
+        urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    for url in urls:
+        name = re.sub(r"[^A-Za-z0-9]+", "-", url.split("://", 1)[-1]).strip("-")[:100] + ".html"
+        try:
+            body = fetch(url).body
+        except FetchError as e:
+            print(f"Skipping {url}: {e}", file=sys.stderr)
+            continue
+        with open(os.path.join(corpus, name), "wb") as f:
+            f.write(body)
+        saved.append({"url": url, "file": name, "bytes": len(body)})
+    print(json.dumps({"corpus": corpus, "saved": saved}, indent=2))
+
+
+# ----- fake LLM
+
+def fake_reply(payload: dict) -> str:
+    """A reply shaped like what each prompt asks for."""
+    prompt = payload["messages"][-1]["content"]
+    if "Rate each numbered text" in prompt:
+        return json.dumps([7] * prompt.count("] TEXT:"))
+    if "Return ONLY valid JSON" in prompt or "JSON" in prompt[-400:]:
+        return json.dumps(FAKE_ANALYSIS)
+    # Echo the end of the prompt so different questions get different answers
+    return "Generative engines prefer short, factual passages. " + prompt[-120:]
+
+
+# ----- servers
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(name: str, command: list, cwd: str, env: dict, health_url: str, log_dir: str) -> subprocess.Popen:
+    log = open(os.path.join(log_dir, f"{name}.log"), "wb")
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            log.close()
+            with open(log.name, errors="replace") as f:
+                raise SystemExit(f"{name} exited during startup:\n{f.read()[-2000:]}")
+        try:
+            if httpx.get(health_url, timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise SystemExit(f"{name} did not start within 60 s (log: {log.name})")
+
+
+def memory_mb(pid: int) -> dict:
+    """Current and peak RSS of a process from /proc (Linux only; None elsewhere)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return {"rss_mb": None, "peak_rss_mb": None}
+    return {
+        "rss_mb": round(int(fields["VmRSS"].split()[0]) / 1024, 1),
+        "peak_rss_mb": round(int(fields["VmHWM"].split()[0]) / 1024, 1)
+    }
+
+
+# ----- load
+
+def percentile(values: list, p: float):
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, math.ceil(p / 100 * len(values)) - 1))]
+
+
+async def drive(client: httpx.AsyncClient, url: str, bodies: list, concurrency: int) -> dict:
+    """POST every body to url, concurrency at a time, and summarize the latencies."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = []
+
+    async def one(body):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, json=body)
+                data = response.json()
+                if response.status_code != 200 or "error" in data:
+                    errors.append(str(data.get("error", response.status_code))[:200])
+            except (httpx.HTTPError, ValueError) as e:
+                errors.append(f"{type(e).__name__}: {e}"[:200])
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(body) for body in bodies))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(bodies),
+        "errors": len(errors),
+        "first_errors": errors[:3],
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(len(bodies) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            name: round(percentile(latencies, p), 1) if latencies else None
+            for name, p in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+        }
+    }
+
+
+async def run_load(args, page_base: str, names: list, backend: str, auditor: str) -> dict:
+    def page_url(i):
+        # A distinct query string per request keeps the per-URL caches from answering
+        delay = f"&delay={args.page_delay:g}" if args.page_delay else ""
+        return f"{page_base}/corpus/{names[i % len(names)]}?r={i}{delay}"
+
+    def summary_body(i):
+        return {
+            "user_url": page_url(i),
+            "urls": [page_url(i + j) for j in range(1, args.competitors + 1)],
+            "query": f"Question {i}: how do generative engines pick sources?"
+        }
+
+    results = {}
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        if "summary" in args.endpoints:
+            bodies = [summary_body(i) for i in range(args.requests)]
+            results["summary"] = await drive(client, f"{backend}/generate/summary", bodies, args.concurrency)
+
+        if "compare" in args.endpoints:
+            # Setup, not timed: one summary job and a distinct answer per compare request
+            summary = (await client.post(f"{backend}/generate/summary", json=summary_body(args.requests))).json()
+            answers = await asyncio.gather(*(
+                client.post(f"{backend}/generate_llm_response", json={"query": f"Compare question {i}"})
+                for i in range(args.requests)
+            ))
+            if "job_id" not in summary or "error" in summary:
+                raise SystemExit(f"Compare setup failed: {summary.get('error')}")
+            bodies = [
+                {"summary_job_id": summary["job_id"], "llm_job_id": answer.json()["job_id"]} for answer in answers
+            ]
+            results["compare"] = await drive(client, f"{backend}/compare", bodies, args.concurrency)
+
+        if "audit" in args.endpoints:
+            bodies = [{"url": page_url(i), "lighthouse": args.lighthouse_latency >= 0} for i in range(args.requests)]
+            results["audit"] = await drive(client, f"{auditor}/api/audit", bodies, args.concurrency)
+    return results
+
+
+def regressions(report: dict, baseline_path: str, tolerance: float) -> list:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    found = []
+    for name, current in report["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        p95, base_p95 = current["latency_ms"]["p95"], before["latency_ms"]["p95"]
+        if p95 and base_p95 and p95 > base_p95 * (1 + tolerance):
+            found.append(f"{name}: p95 {base_p95} -> {p95} ms")
+        rps, base_rps = current["throughput_rps"], before["throughput_rps"]
+        if rps and base_rps and rps < base_rps * (1 - tolerance):
+            found.append(f"{name}: throughput {base_rps} -> {rps} req/s")
+        if current["errors"] > before["errors"]:
+            found.append(f"{name}: errors {before['errors']} -> {current['errors']}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="directory of recorded .html pages")
+    parser.add_argument("--record", metavar="URLS_FILE", help="save the listed pages into --corpus and exit")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated subset of %(default)s")
+    parser.add_argument("--requests", type=int, default=20, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--competitors", type=int, default=3, help="competitor URLs per summary request")
+    parser.add_argument("--page-delay", type=float, default=0, help="corpus server latency in ms")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="fake Groq latency in seconds")
+    parser.add_argument("--llm-rpm", type=int, default=0, help="fake Groq requests-per-minute limit (0 = none)")
+    parser.add_argument("--lighthouse-latency", type=float, default=1.0,
+                        help="fake Lighthouse run time in seconds (negative = audit without Lighthouse)")
+    parser.add_argument("--timeout", type=float, default=300, help="per-request timeout in seconds")
+    parser.add_argument("--baseline", help="earlier report to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.corpus:
+            parser.error("--record needs --corpus")
+        record(args.record, args.corpus)
+        return
+    args.endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    CorpusHandler.pages = load_corpus(args.corpus)
+    FakeGroqHandler.latency = args.llm_latency
+    FakeGroqHandler.responder = staticmethod(fake_reply)
+    FakeGroqHandler.reset(rpm_limit=args.llm_rpm)
+    page_server = start_server(CorpusHandler)
+    llm_server = start_server(FakeGroqHandler)
+    page_base = server_url(page_server)
+
+    work_dir = tempfile.mkdtemp(prefix="geo-bench-")
+    lighthouse_bin = os.path.join(work_dir, "fake-lighthouse")
+    with open(lighthouse_bin, "w") as f:
+        f.write(FAKE_LIGHTHOUSE.format(python=sys.executable))
+    os.chmod(lighthouse_bin, os.stat(lighthouse_bin).st_mode | stat.S_IEXEC)
+
+    env = dict(
+        os.environ,
+        GROQ_API_KEY="bench",
+        GROQ_BASE_URL=server_url(llm_server),
+        # The gateway is told the same limit the fake server enforces, as in production
+        LLM_RPM=str(args.llm_rpm),
+        LLM_TPM="0",
+        # Every corpus page lives on one host
+        FETCH_PER_HOST=str(max(64, args.concurrency * (args.competitors + 1))),
+        FETCH_MAX_BYTES=str(max(len(body) for body in CorpusHandler.pages.values()) * 2),
+        LIGHTHOUSE_BIN=lighthouse_bin,
+        FAKE_LIGHTHOUSE_LATENCY=str(max(0.0, args.lighthouse_latency)),
+        # No persistent caches or indexes, so every run starts cold
+        PAGE_CACHE_DB="", SUMMARY_CACHE_DB="", LIGHTHOUSE_CACHE_DB="", VECTOR_INDEX_DIR="", JOB_STORE_DB=""
+    )
+    backend_port, auditor_port = free_port(), free_port()
+    backend = f"http://127.0.0.1:{backend_port}"
+    auditor = f"http://127.0.0.1:{auditor_port}"
+    processes = {}
+    try:
+        processes["backend"] = start_app(
+            "backend",
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(backend_port), "--log-level", "warning"],
+            BACKEND_DIR, env, f"{backend}/", work_dir
+        )
+        if "audit" in args.endpoints:
+            processes["auditor"] = start_app(
+                "auditor",
+                [sys.executable, "-m", "uvicorn", "app:app", "--port", str(auditor_port), "--log-level", "warning"],
+                AUDITOR_DIR, env, f"{auditor}/api/health", work_dir
+            )
+        baseline_memory = {name: memory_mb(process.pid)["rss_mb"] for name, process in processes.items()}
+        endpoints = asyncio.run(run_load(args, page_base, list(CorpusHandler.pages), backend, auditor))
+
+        sizes = [len(body) for body in CorpusHandler.pages.values()]
+        report = {
+            "config": {
+                "requests": args.requests, "concurrency": args.concurrency, "competitors": args.competitors,
+                "llm_latency_s": args.llm_latency, "llm_rpm": args.llm_rpm,
+                "lighthouse_latency_s": args.lighthouse_latency, "page_delay_ms": args.page_delay
+            },
+            "corpus": {
+                "source": args.corpus or "synthetic", "pages": len(sizes), "min_bytes": min(sizes), "max_bytes": max(sizes)
+            },
+            "endpoints": endpoints,
+            "fake_groq": dict(FakeGroqHandler.counts),
+            "servers": {
+                name: {"startup_rss_mb": baseline_memory[name], **memory_mb(process.pid)}
+                for name, process in processes.items()
+            }
+        }
+    finally:
+        for process in processes.values():
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    failed = []
+    if args.baseline:
+        failed = regressions(report, args.baseline, args.tolerance)
+        report["regressions"] = failed
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
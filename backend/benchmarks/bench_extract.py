@@ -0,0 +1,81 @@
+"""
+Benchmark full-page (BeautifulSoup DOM) and streaming scrape_page extraction.
+
+Each mode runs in its own process, scraping the same large page from the
+local page server, and reports wall time and peak RSS. The streaming mode
+reads at most STREAM_MAX_BYTES of the page; pass --cap 0 to stream the whole
+page and check that both modes return the same output.
+
+Usage (from the backend directory):
+    python benchmarks/bench_extract.py --paragraphs 40000 --cap 0
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from stubs import PageHandler, make_page, server_url, start_server
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_child(url: str, mode: str):
+    """Scrape url once in this process and print the result as JSON."""
+    import crawler
+
+    crawler.STREAM_EXTRACT = mode == "stream"
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    page = crawler.scrape_page(url)
+    print(json.dumps({
+        "seconds": round(time.perf_counter() - started, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "baseline_rss_mb": baseline,
+        "paragraphs": page.get("content", "").count("\n") + 1 if page else 0,
+        "page": page
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=40000, help="paragraphs on the benchmark page")
+    parser.add_argument("--cap", type=int, default=2 * 1024 * 1024, help="STREAM_MAX_BYTES (0 = no cap)")
+    parser.add_argument("--child", nargs=2, metavar=("URL", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    server = start_server(PageHandler)
+    url = f"{server_url(server)}/page/1?paragraphs={args.paragraphs}"
+    size = len(make_page(1, args.paragraphs).encode())
+    env = dict(os.environ, FETCH_MAX_BYTES=str(size * 2), PAGE_CACHE_DB="")
+    env["STREAM_MAX_BYTES"] = str(args.cap or size * 2)
+
+    results = {}
+    for mode in ("dom", "stream"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", url, mode],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    report = {"page_bytes": size, "stream_max_bytes": int(env["STREAM_MAX_BYTES"])}
+    for mode, result in results.items():
+        report[mode] = {k: v for k, v in result.items() if k != "page"}
+    report["identical_output"] = results["dom"]["page"] == results["stream"]["page"]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark the LLM gateway against a rate-limited fake Groq server.
+
+1. Raw: every request sent at once with the plain SDK and no retries.
+   Requests over the fake server's RPM limit fail with 429.
+2. Gateway: the same burst through LLMGateway with a matching LLM_RPM.
+   Requests are paced by the token bucket and nothing is lost.
+3. Coalescing: identical concurrent requests share one API call.
+4. Priority: interactive requests overtake queued batch requests.
+
+Usage (from the backend directory):
+    python benchmarks/bench_gateway.py --requests 25 --rpm 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from stubs import FakeGroqHandler, server_url, start_server
+
+MODEL = "llama-3.1-8b-instant"
+
+
+def messages(i: int) -> list:
+    return [{"role": "user", "content": f"Question {i}"}]
+
+
+async def run_raw(count: int) -> dict:
+    from groq import AsyncGroq
+
+    client = AsyncGroq(max_retries=0)
+
+    async def one(i):
+        try:
+            await client.chat.completions.create(model=MODEL, messages=messages(i), max_tokens=10)
+            return True
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(count)))
+    return {"ok": sum(results), "failed": count - sum(results), "seconds": round(time.perf_counter() - start, 2)}
+
+
+async def run_gateway(gateway, count: int) -> dict:
+    async def one(i):
+        try:
+            await gateway.acomplete(messages(i), MODEL, max_tokens=10)
+            return True
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(count)))
+    return {"ok": sum(results), "failed": count - sum(results), "seconds": round(time.perf_counter() - start, 2)}
+
+
+async def run_coalescing(gateway, count: int) -> dict:
+    before = FakeGroqHandler.counts["requests"]
+    await asyncio.gather(*(gateway.acomplete(messages(-1), MODEL, max_tokens=10) for _ in range(count)))
+    return {"callers": count, "api_calls": FakeGroqHandler.counts["requests"] - before}
+
+
+async def run_priority(gateway, batch: int, interactive: int) -> dict:
+    from llm_gateway import BATCH, INTERACTIVE
+
+    start = time.perf_counter()
+
+    async def timed(i, priority):
+        await gateway.acomplete(messages(1000 + i), MODEL, max_tokens=10, priority=priority)
+        return time.perf_counter() - start
+
+    batch_tasks = [asyncio.create_task(timed(i, BATCH)) for i in range(batch)]
+    await asyncio.sleep(0.05)
+    interactive_tasks = [asyncio.create_task(timed(batch + i, INTERACTIVE)) for i in range(interactive)]
+    batch_times = await asyncio.gather(*batch_tasks)
+    interactive_times = await asyncio.gather(*interactive_tasks)
+    return {
+        "batch_mean_seconds": round(sum(batch_times) / len(batch_times), 2),
+        "interactive_mean_seconds": round(sum(interactive_times) / len(interactive_times), 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=25)
+    parser.add_argument("--rpm", type=int, default=20, help="fake server and gateway requests per minute")
+    parser.add_argument("--llm-latency", type=float, default=0.1, help="fake Groq latency in seconds")
+    args = parser.parse_args()
+
+    FakeGroqHandler.latency = args.llm_latency
+    llm_server = start_server(FakeGroqHandler)
+    os.environ["GROQ_API_KEY"] = "bench"
+    os.environ["GROQ_BASE_URL"] = server_url(llm_server)
+
+    from llm_gateway import LLMGateway
+
+    report = {"requests": args.requests, "rpm": args.rpm}
+
+    FakeGroqHandler.reset(args.rpm)
+    report["raw"] = asyncio.run(run_raw(args.requests))
+
+    FakeGroqHandler.reset(args.rpm)
+    report["gateway"] = asyncio.run(run_gateway(LLMGateway(rpm=args.rpm, tpm=0), args.requests))
+    report["gateway"]["server_429s"] = FakeGroqHandler.counts["rate_limited"]
+
+    FakeGroqHandler.reset(0)
+    report["coalescing"] = asyncio.run(run_coalescing(LLMGateway(rpm=0, tpm=0), args.requests))
+
+    # An empty bucket refilling one request per 0.1 s, so a queue builds up
+    FakeGroqHandler.reset(0)
+    gateway = LLMGateway(rpm=600, tpm=0)
+    gateway.requests.level = 0
+    report["priority"] = asyncio.run(run_priority(gateway, batch=20, interactive=5))
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark page cache revalidation and check that a 304 returns the cached page.
+
+A local server sends an ETag and Last-Modified with every page and answers
+304 when the request's validators match. Each page is scraped three times:
+cold, revalidated (the server answers 304) and after the server changes the
+page. The revalidated output must equal the cold one without a body being
+sent, the cache must hold the page's raw HTML, and the changed page must
+replace the cached one. Runs in both extraction modes, sync and async, and
+for fetch_page_async (the site crawler's raw-HTML path), whose cached pages
+scrape_page must then parse from the stored HTML. Exits with status 1 if any
+check fails.
+
+Usage (from the backend directory):
+    python benchmarks/bench_page_cache.py --pages 50 --paragraphs 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from stubs import ConditionalPageHandler, make_page, server_url, start_server
+
+
+def scrape_all(crawler, urls: list, mode: str) -> list:
+    if mode == "sync":
+        return [crawler.scrape_page(url) for url in urls]
+
+    async def run():
+        fetcher = crawler.AsyncFetcher()
+        try:
+            return await asyncio.gather(*(crawler.scrape_page_async(url, fetcher) for url in urls))
+        finally:
+            await fetcher.aclose()
+    return asyncio.run(run())
+
+
+def timed_round(crawler, urls: list, mode: str):
+    counts = dict(ConditionalPageHandler.counts)
+    started = time.perf_counter()
+    pages = scrape_all(crawler, urls, mode)
+    elapsed = time.perf_counter() - started
+    sent = {name: ConditionalPageHandler.counts[name] - counts[name] for name in counts}
+    return pages, round(elapsed, 3), sent
+
+
+def check_mode(crawler, base: str, args, stream: bool, mode: str) -> dict:
+    crawler.STREAM_EXTRACT = stream
+    name = f"{'stream' if stream else 'full'}-{mode}"
+    # Separate URLs per run, so every run starts cold
+    urls = [f"{base}/page/{name}-{i}?paragraphs={args.paragraphs}" for i in range(args.pages)]
+    ConditionalPageHandler.version = 1
+    failures = []
+
+    cold, cold_seconds, cold_sent = timed_round(crawler, urls, mode)
+    for url, page in zip(urls, cold):
+        index = url.split("/")[-1].split("?")[0]
+        expected = make_page(f"{index} v1", args.paragraphs).encode()
+        if crawler.page_cache.body(url) != expected:
+            failures.append({"run": name, "url": url, "check": "cached body is the page's HTML"})
+
+    warm, warm_seconds, warm_sent = timed_round(crawler, urls, mode)
+    if warm_sent["not_modified"] != len(urls) or warm_sent["ok"]:
+        failures.append({"run": name, "check": "revalidation answered with 304", "sent": warm_sent})
+    for url, before, after in zip(urls, cold, warm):
+        if not before or after != before:
+            failures.append({"run": name, "url": url, "check": "304 returns the cached page"})
+
+    ConditionalPageHandler.version = 2
+    changed, _, changed_sent = timed_round(crawler, urls, mode)
+    if changed_sent["ok"] != len(urls):
+        failures.append({"run": name, "check": "changed pages downloaded again", "sent": changed_sent})
+    for url, page in zip(urls, changed):
+        if not page.get("title", "").endswith("v2") or crawler.page_cache.get(url)["page"] != page:
+            failures.append({"run": name, "url": url, "check": "changed page replaces the cached one"})
+
+    return {
+        "run": name,
+        "cold_seconds": cold_seconds,
+        "revalidated_seconds": warm_seconds,
+        "cold_bytes": cold_sent["bytes"],
+        "revalidated_bytes": warm_sent["bytes"],
+        "failures": failures
+    }
+
+
+def check_fetch(crawler, base: str, args) -> dict:
+    """fetch_page_async returns the cached HTML on a 304, and scrape_page parses it later."""
+    crawler.STREAM_EXTRACT = True
+    urls = [f"{base}/page/raw-{i}?paragraphs={args.paragraphs}" for i in range(args.pages)]
+    ConditionalPageHandler.version = 1
+    failures = []
+
+    async def fetch_all():
+        fetcher = crawler.AsyncFetcher()
+        try:
+            return await asyncio.gather(*(crawler.fetch_page_async(url, fetcher) for url in urls))
+        finally:
+            await fetcher.aclose()
+
+    cold = asyncio.run(fetch_all())
+    counts = dict(ConditionalPageHandler.counts)
+    warm = asyncio.run(fetch_all())
+    not_modified = ConditionalPageHandler.counts["not_modified"] - counts["not_modified"]
+    if not_modified != len(urls):
+        failures.append({"run": "fetch", "check": "revalidation answered with 304", "not_modified": not_modified})
+    for url, before, after in zip(urls, cold, warm):
+        if after.status != 304 or after.body != before.body:
+            failures.append({"run": "fetch", "url": url, "check": "304 returns the cached HTML"})
+
+    scraped = scrape_all(crawler, urls, "async")
+    for url, result, page in zip(urls, cold, scraped):
+        if page != crawler.extract_page(url, result.text):
+            failures.append({"run": "fetch", "url": url, "check": "scrape_page parses the cached HTML"})
+    return {"run": "fetch", "failures": failures}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--paragraphs", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # crawler reads PAGE_CACHE_DB when it is imported
+        os.environ["PAGE_CACHE_DB"] = os.path.join(tmp, "pages.db")
+        import crawler
+
+        server = start_server(ConditionalPageHandler)
+        base = server_url(server)
+        runs = [
+            check_mode(crawler, base, args, stream, mode)
+            for stream in (True, False) for mode in ("sync", "async")
+        ]
+        runs.append(check_fetch(crawler, base, args))
+        stats = crawler.page_cache.stats()
+        server.shutdown()
+
+    failures = [failure for run in runs for failure in run.pop("failures")]
+    print(json.dumps({"pages": args.pages, "runs": runs, "page_cache": stats, "failures": failures}, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark /generate/summary against a local page server and a fake Groq server.
+
+Compares the old one-URL-at-a-time loop with the concurrent pipeline.
+Each competitor page gets a different delay, so the sequential run scales
+with the sum of the delays and the concurrent run with the slowest one.
+
+Usage (from the backend directory):
+    python benchmarks/bench_summary.py --competitors 10 --llm-latency 0.3
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from stubs import FakeGroqHandler, PageHandler, server_url, start_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--competitors", type=int, default=10)
+    parser.add_argument("--max-page-delay", type=float, default=500, help="slowest page delay in ms")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="fake Groq latency in seconds")
+    args = parser.parse_args()
+
+    FakeGroqHandler.latency = args.llm_latency
+    llm_server = start_server(FakeGroqHandler)
+    page_server = start_server(PageHandler)
+
+    # Point the Groq SDK at the fake server before the app modules build their clients
+    os.environ["GROQ_API_KEY"] = "bench"
+    os.environ["GROQ_BASE_URL"] = server_url(llm_server)
+    os.environ.setdefault("SCRAPE_CONCURRENCY", str(args.competitors + 1))
+    # Every stub page lives on one host, so lift the per-host connection cap
+    os.environ.setdefault("FETCH_PER_HOST", str(args.competitors + 1))
+    # Measure the pipeline, not the gateway's rate limiting
+    os.environ.setdefault("LLM_RPM", "0")
+    os.environ.setdefault("LLM_TPM", "0")
+
+    from fastapi.testclient import TestClient
+    from crawler import scrape_page
+    from summary import summarize_with_cohere, summary_cache
+    import main as app_main
+
+    base = server_url(page_server)
+    step = args.max_page_delay / max(args.competitors, 1)
+    user_url = f"{base}/page/0?delay={step:.0f}"
+    urls = [f"{base}/page/{i}?delay={step * i:.0f}" for i in range(1, args.competitors + 1)]
+
+    # Old behaviour: scrape and summarize each URL in turn
+    start = time.perf_counter()
+    for url in [user_url, *urls]:
+        summarize_with_cohere(scrape_page(url).get("content", ""))
+    sequential = time.perf_counter() - start
+    summary_cache.clear()
+
+    with TestClient(app_main.app) as client:
+        start = time.perf_counter()
+        response = client.post("/generate/summary", json={"user_url": user_url, "urls": urls, "query": "What is GEO?"})
+        concurrent = time.perf_counter() - start
+    data = response.json()
+    assert "error" not in data, data
+    assert [c["url"] for c in data["competitor_summaries"]] == urls, "competitor order not preserved"
+
+    slowest = args.max_page_delay / 1000 + args.llm_latency
+    print(json.dumps({
+        "pages": len(urls) + 1,
+        "sequential_s": round(sequential, 3),
+        "concurrent_s": round(concurrent, 3),
+        "slowest_page_s": round(slowest, 3),
+        "speedup": round(sequential / concurrent, 2)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
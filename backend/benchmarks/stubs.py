@@ -0,0 +1,240 @@
+"""
+Local stand-ins for the outside world used by the benchmarks:
+a page server with per-URL latency, a page server that answers conditional
+requests, a server for a corpus of recorded pages and a fake OpenAI-compatible
+Groq server.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_page(index: int, paragraphs: int = 20) -> str:
+    """Build a simple article page with a title, headings and paragraphs."""
+    body = "\n".join(
+        f"<p>Paragraph {i} of page {index}. Generative engines extract short, factual passages like this one.</p>"
+        for i in range(paragraphs)
+    )
+    return f"""<html><head><title>Page {index}</title>
+<meta name="description" content="Benchmark page {index}"></head>
+<body><h1>Page {index}</h1><h2>Section</h2>{body}</body></html>"""
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """Serves /page/<n>?delay=<ms>&paragraphs=<count> after sleeping for the requested delay."""
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        delay_ms = float(query.get("delay", ["0"])[0])
+        time.sleep(delay_ms / 1000)
+
+        index = parsed.path.rstrip("/").split("/")[-1]
+        body = make_page(index, int(query.get("paragraphs", ["20"])[0])).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ConditionalPageHandler(BaseHTTPRequestHandler):
+    """
+    Serves /page/<n>?paragraphs=<count> with an ETag and Last-Modified for the
+    current version, and answers 304 when If-None-Match or If-Modified-Since
+    matches it. Bump version to change every page.
+    """
+
+    version = 1
+    counts = {"ok": 0, "not_modified": 0, "bytes": 0}
+    _lock = threading.Lock()
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        index = parsed.path.rstrip("/").split("/")[-1]
+        etag = f'"{index}-v{self.version}"'
+        last_modified = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(86400 * self.version))
+        if self.headers.get("If-None-Match") == etag or self.headers.get("If-Modified-Since") == last_modified:
+            with self._lock:
+                self.counts["not_modified"] += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        paragraphs = int(parse_qs(parsed.query).get("paragraphs", ["20"])[0])
+        body = make_page(f"{index} v{self.version}", paragraphs).encode()
+        with self._lock:
+            self.counts["ok"] += 1
+            self.counts["bytes"] += len(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CorpusHandler(BaseHTTPRequestHandler):
+    """Serves the HTML in pages ({name: bytes}) as /corpus/<name>?delay=<ms>; other query parameters are ignored."""
+
+    pages = {}
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        delay_ms = float(parse_qs(parsed.query).get("delay", ["0"])[0])
+        time.sleep(delay_ms / 1000)
+
+        body = self.pages.get(parsed.path.rsplit("/", 1)[-1])
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    """
+    Answers /openai/v1/chat/completions with a canned reply after a fixed latency.
+    Streaming requests get the reply in small chunks, token_interval seconds apart.
+    With rpm_limit set, the server keeps a token bucket like the real API
+    (capacity rpm_limit, refilled continuously) and answers requests it can't
+    admit with a 429 and a Retry-After header. With responder set, the reply is
+    responder(payload) instead of the fixed one.
+    """
+
+    latency = 0.0
+    reply = "Fake summary of the page."
+    token_interval = 0.0
+    rpm_limit = 0
+    responder = None
+    counts = {"requests": 0, "rate_limited": 0}
+    _bucket = {"level": None, "updated": 0.0}
+    _lock = threading.Lock()
+
+    @classmethod
+    def reset(cls, rpm_limit: int = 0):
+        with cls._lock:
+            cls.rpm_limit = rpm_limit
+            cls._bucket.update(level=None, updated=0.0)
+            cls.counts.update(requests=0, rate_limited=0)
+
+    def _rate_limited(self) -> float:
+        """Seconds until the next request is allowed, or 0 if this one is."""
+        now = time.time()
+        with self._lock:
+            self.counts["requests"] += 1
+            if not self.rpm_limit:
+                return 0
+            bucket = self._bucket
+            rate = self.rpm_limit / 60
+            level = self.rpm_limit if bucket["level"] is None else bucket["level"]
+            level = min(self.rpm_limit, level + (now - bucket["updated"]) * rate)
+            bucket["updated"] = now
+            if level < 1:
+                bucket["level"] = level
+                self.counts["rate_limited"] += 1
+                return (1 - level) / rate
+            bucket["level"] = level - 1
+        return 0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        wait = self._rate_limited()
+        if wait:
+            body = json.dumps({"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}).encode()
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Retry-After", str(max(1, round(wait))))
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        time.sleep(self.latency)
+        reply = type(self).responder(payload) if type(self).responder else self.reply
+        if payload.get("stream"):
+            self._stream(payload, reply)
+            return
+
+        body = json.dumps({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110}
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, payload: dict, reply: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for start in range(0, len(reply), 8):
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {"content": reply[start:start + 8]}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.token_interval)
+        # Groq reports the usage of a stream in the last chunk's x_groq field
+        last = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake"),
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "x_groq": {"id": "req-fake", "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110}}
+        }
+        self.wfile.write(f"data: {json.dumps(last)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    # The default backlog of 5 would serialize the concurrent clients we are measuring
+    request_queue_size = 256
+    daemon_threads = True
+
+
+def start_server(handler_class) -> ThreadingHTTPServer:
+    """Start a threaded HTTP server on a free local port in the background."""
+    server = StubServer(("127.0.0.1", 0), handler_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def server_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
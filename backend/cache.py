@@ -0,0 +1,145 @@
+"""
+Two-tier TTL/LRU cache: an in-process LRU in front of an optional SQLite
+file that can be shared by several uvicorn workers. Also the hashing helpers
+the caches key on: content hashes, cache keys and MinHash signatures.
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+NUM_PERM = 64
+# Fixed seed, so a text gets the same signature in every process
+_rng = np.random.default_rng(61)
+# Multiply-shift hashing: (a * x + b) wraps modulo 2**64 and the top 32 bits are kept; a is odd
+_A = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64)
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so formatting-only changes hash the same."""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def make_key(*parts) -> str:
+    """Build a fixed-length cache key from any number of string parts."""
+    joined = "\x1f".join("" if p is None else str(p) for p in parts)
+    return hashlib.sha256(joined.encode("utf-8")).hexdigest()
+
+
+def minhash(shingles: frozenset) -> np.ndarray:
+    """NUM_PERM-value MinHash signature of a non-empty shingle set."""
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((np.outer(hashes, _A) + _B) >> np.uint64(32)).min(axis=0)
+
+
+class TieredCache:
+    """
+    String cache with TTL and LRU eviction.
+    Values are looked up in memory first, then in SQLite (if db_path is set).
+    """
+
+    def __init__(self, name: str, max_entries: int = 1024, ttl: float = 86400,
+                 db_path: str = None, max_disk_entries: int = 100000):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.counters = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0}
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS {name}_accessed ON {name}(accessed)")
+            self._db.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.counters["hits"] += 1
+                    self.counters["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    f"SELECT value, created FROM {self.name} WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[1] <= self.ttl:
+                    self._db.execute(f"UPDATE {self.name} SET accessed = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    self._remember(key, row[0], row[1])
+                    self.counters["hits"] += 1
+                    self.counters["disk_hits"] += 1
+                    return row[0]
+
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self.counters["sets"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self.name} (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                )
+                # Pruning scans the table, so only do it every 100 writes
+                if self.counters["sets"] % 100 == 0:
+                    self._prune_disk(now)
+                self._db.commit()
+
+    def _remember(self, key: str, value: str, created: float):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _prune_disk(self, now: float):
+        self._db.execute(f"DELETE FROM {self.name} WHERE created < ?", (now - self.ttl,))
+        self._db.execute(
+            f"DELETE FROM {self.name} WHERE key IN (SELECT key FROM {self.name} "
+            "ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["hit_rate"] = round(self.counters["hits"] / lookups, 4) if lookups else 0.0
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()[0]
+            return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.name}")
+                self._db.commit()
@@ -0,0 +1,123 @@
+"""
+Token-aware chunking of page content.
+
+Pages are split along heading/section boundaries into chunks that fit a
+token budget, so long pages can be summarized piece by piece instead of
+being truncated. Token counts use a fast local approximation of the
+model's tokenizer (about one token per short word or punctuation mark).
+"""
+import os
+import re
+
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "1200"))
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate BPE token count: one per word or symbol, plus one per 6 extra characters of long words."""
+    count = 0
+    for piece in _TOKEN_RE.findall(text or ""):
+        count += 1 + max(0, len(piece) - 6) // 6
+    return count
+
+
+def _split_oversized(text: str, max_tokens: int) -> list:
+    """Split text that is over budget by paragraphs, then sentences, then words."""
+    splitters = (
+        (lambda t: t.split("\n"), "\n"),
+        (_SENTENCE_RE.split, " "),
+        (lambda t: t.split(" "), " "),
+    )
+    for split, joiner in splitters:
+        parts = [p.strip() for p in split(text) if p.strip()]
+        if len(parts) > 1:
+            return _pack(parts, max_tokens, joiner)
+    return [text]
+
+
+def _pack(parts: list, max_tokens: int, joiner: str) -> list:
+    """Greedily pack parts into pieces of at most max_tokens, splitting parts that are too big."""
+    pieces, current, current_tokens = [], [], 0
+    for part in parts:
+        tokens = estimate_tokens(part)
+        if tokens > max_tokens:
+            if current:
+                pieces.append(joiner.join(current))
+                current, current_tokens = [], 0
+            pieces.extend(_split_oversized(part, max_tokens))
+            continue
+        if current and current_tokens + tokens > max_tokens:
+            pieces.append(joiner.join(current))
+            current, current_tokens = [], 0
+        current.append(part)
+        current_tokens += tokens
+    if current:
+        pieces.append(joiner.join(current))
+    return pieces
+
+
+def sections_from_text(text: str) -> list:
+    """Treat plain content (one paragraph per line) as a single untitled section."""
+    return [{"heading": None, "level": 0, "text": text}] if text and text.strip() else []
+
+
+def chunk_sections(sections: list, max_tokens: int = CHUNK_TOKENS) -> list:
+    """
+    Pack sections into chunks of at most max_tokens. Small neighbouring
+    sections share a chunk; a section bigger than the budget is split on its own.
+    Each chunk is {"index", "heading", "text", "tokens"}.
+    """
+    chunks = []
+    current, current_tokens, current_heading = [], 0, None
+
+    def flush():
+        nonlocal current, current_tokens, current_heading
+        if current:
+            text = "\n".join(current)
+            chunks.append({"index": len(chunks) + 1, "heading": current_heading,
+                           "text": text, "tokens": estimate_tokens(text)})
+        current, current_tokens, current_heading = [], 0, None
+
+    for section in sections:
+        heading = section.get("heading")
+        body = section.get("text", "").strip()
+        block = f"{heading}\n{body}" if heading and body else (heading or body)
+        if not block:
+            continue
+        tokens = estimate_tokens(block)
+
+        if tokens > max_tokens:
+            flush()
+            for piece in _split_oversized(body, max_tokens - estimate_tokens(heading or "")):
+                current, current_heading = [f"{heading}\n{piece}" if heading else piece], heading
+                flush()
+            continue
+        if current and current_tokens + tokens > max_tokens:
+            flush()
+        if not current:
+            current_heading = heading
+        current.append(block)
+        current_tokens += tokens
+
+    flush()
+    return chunks
+
+
+def group_for_merge(texts: list, max_tokens: int = CHUNK_TOKENS) -> list:
+    """
+    Group partial summaries so each group fits in one merge prompt.
+    Always merges at least two per group so repeated merging converges.
+    """
+    groups, current, current_tokens = [], [], 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if len(current) >= 2 and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
@@ -1,16 +1,39 @@
-import requests
+import asyncio
+import os
+
 from bs4 import BeautifulSoup
 
+from fetcher import MAX_BYTES, AsyncFetcher, FetchError, FetchResult, decode_body, fetch
+from metrics import timed
+from page_cache import PageCache, conditional_headers
+from stream_extract import BLOCK_TAGS, HEADING_TAGS, StreamingPageParser
+
+# Persistent conditional-request cache, enabled by pointing PAGE_CACHE_DB at a SQLite file
+page_cache = PageCache(os.environ["PAGE_CACHE_DB"]) if os.getenv("PAGE_CACHE_DB") else None
+# scrape_page parses pages as they download instead of building a DOM (0 = parse the full page)
+STREAM_EXTRACT = os.getenv("STREAM_EXTRACT", "1") != "0"
+# Bytes of HTML read per page in streaming mode; the rest of the page is ignored
+STREAM_MAX_BYTES = int(os.getenv("STREAM_MAX_BYTES", str(2 * 1024 * 1024)))
+
 def fetch_html(url: str, headers: dict = None) -> str:
     """
     Fetch the HTML content of a URL.
     """
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        return response.text
-    except requests.RequestException as e:
-        print(f"Error fetching {url}: {e}")
+        return fetch(url, headers).text
+    except FetchError as e:
+        print(e)
+        return ""
+
+
+async def fetch_html_async(url: str, fetcher: AsyncFetcher, headers: dict = None) -> str:
+    """
+    Fetch the HTML content of a URL without blocking the event loop.
+    """
+    try:
+        return (await fetcher.fetch(url, headers)).text
+    except FetchError as e:
+        print(e)
         return ""
 
 
@@ -31,27 +54,45 @@ def extract_content(soup: BeautifulSoup) -> str:
     return text
 
 
-def scrape_page(url: str, headers: dict = None) -> dict:
+def extract_sections(soup: BeautifulSoup) -> list:
     """
-    Scrape a web page and return structured output:
-    - title
-    - meta description
-    - headings (h1-h3)
-    - all links
-    - article content (text)
+    Split the page into heading-delimited sections:
+    [{"heading": str or None, "level": int, "text": str}].
+    Only the innermost text blocks are kept, so nested blocks aren't counted twice.
+    """
+    sections = []
+    current = {"heading": None, "level": 0, "parts": []}
+    for el in soup.find_all(HEADING_TAGS + BLOCK_TAGS):
+        if el.name in HEADING_TAGS:
+            if current["heading"] or current["parts"]:
+                sections.append(current)
+            current = {"heading": el.get_text(" ", strip=True), "level": int(el.name[1]), "parts": []}
+        elif el.find(BLOCK_TAGS) is None:
+            text = el.get_text(" ", strip=True)
+            if text:
+                current["parts"].append(text)
+    if current["heading"] or current["parts"]:
+        sections.append(current)
+
+    return [
+        {"heading": section["heading"], "level": section["level"], "text": "\n".join(section["parts"])}
+        for section in sections
+    ]
+
+
+@timed("parse")
+def extract_page(url: str, html: str) -> dict:
+    """
+    Build the structured scrape_page output from already fetched HTML.
     """
-    html = fetch_html(url, headers)
-    if not html:
-        return {}
-
     soup = parse_html(html)
 
     # Extract title
-    title = soup.title.string.strip() if soup.title else None
+    title = soup.title.string.strip() if soup.title and soup.title.string else None
 
     # Extract meta description
     meta_desc_tag = soup.find("meta", attrs={"name": "description"})
-    meta_description = meta_desc_tag["content"].strip() if meta_desc_tag else None
+    meta_description = meta_desc_tag.get("content", "").strip() if meta_desc_tag else None
 
     # Extract headings
     headings = {}
@@ -70,8 +111,125 @@ def scrape_page(url: str, headers: dict = None) -> dict:
         "meta_description": meta_description,
         "headings": headings,
         "links": links,
-        "content": content
+        "content": content,
+        "sections": extract_sections(soup)
     }
 
 
+def _cached_entry(url: str, headers: dict = None, need_body: bool = False):
+    """Look up the page cache and return (entry, request headers with validators)."""
+    entry = page_cache.get(url) if page_cache else None
+    # An entry that can't produce what the caller needs is refetched in full
+    if entry is None or not entry["has_body"] and (need_body or entry["page"] is None):
+        return None, headers
+    return entry, conditional_headers(entry, headers)
+
+
+def _new_sink():
+    """Return (sink, max_bytes) for a fetch in the configured extraction mode."""
+    if not STREAM_EXTRACT:
+        return None, MAX_BYTES
+    # The page cache stores the raw HTML too, so the sink keeps it when the cache is on
+    return StreamingPageParser(keep_body=page_cache is not None), STREAM_MAX_BYTES
+
+
+def _remember(url: str, result: FetchResult, entry: dict, body: bytes, page: dict = None):
+    """Store a freshly fetched page in the page cache if the server sent validators."""
+    if not page_cache:
+        return
+    if entry is not None:
+        page_cache.mark_modified()
+    etag = result.headers.get("etag")
+    last_modified = result.headers.get("last-modified")
+    if etag or last_modified:
+        page_cache.put(url, etag, last_modified, body, page)
+
+
+def _store_page(url: str, result: FetchResult, entry: dict, sink: StreamingPageParser = None) -> dict:
+    """
+    Build the output of a freshly fetched page (parsed already when it was
+    streamed into a sink) and remember it if the server sent validators.
+    """
+    page = sink.page(url) if sink is not None else extract_page(url, result.text)
+    if page:
+        _remember(url, result, entry, bytes(sink.body) if sink is not None else result.body, page)
+    return page
+
+
+def _not_modified(url: str, entry: dict) -> dict:
+    """The cached output for a 304, parsed from the cached HTML if only that was stored."""
+    page_cache.mark_not_modified(url)
+    if entry["page"] is None:
+        entry["page"] = extract_page(url, decode_body(page_cache.body(url)))
+        page_cache.set_page(url, entry["page"])
+    return entry["page"]
+
+
+def scrape_page(url: str, headers: dict = None) -> dict:
+    """
+    Scrape a web page and return structured output:
+    - title
+    - meta description
+    - headings (h1-h3)
+    - all links
+    - article content (text)
+    - heading-delimited sections
+    A 304 from the page cache's revalidation returns the cached output unparsed.
+    With STREAM_EXTRACT the page is parsed while it downloads, without a DOM.
+    """
+    entry, request_headers = _cached_entry(url, headers)
+    sink, max_bytes = _new_sink()
+    try:
+        result = fetch(url, request_headers, max_bytes, sink)
+    except FetchError as e:
+        print(e)
+        return {}
+
+    if result.status == 304 and entry is not None:
+        return _not_modified(url, entry)
+    if sink is None and not result.body:
+        return {}
+
+    return _store_page(url, result, entry, sink)
+
+
+async def scrape_page_async(url: str, fetcher: AsyncFetcher, headers: dict = None) -> dict:
+    """
+    Async variant of scrape_page. Parsing never runs on the event loop: a
+    full-page lxml parse runs in a worker thread, and a streaming parse is fed
+    in batches of chunks, each in a worker thread, as the body arrives.
+    """
+    entry, request_headers = _cached_entry(url, headers)
+    sink, max_bytes = _new_sink()
+    try:
+        result = await fetcher.fetch(url, request_headers, max_bytes, sink)
+    except FetchError as e:
+        print(e)
+        return {}
+
+    if result.status == 304 and entry is not None:
+        return await asyncio.to_thread(_not_modified, url, entry)
+    if sink is None and not result.body:
+        return {}
+
+    return await asyncio.to_thread(_store_page, url, result, entry, sink)
+
+
+async def fetch_page_async(url: str, fetcher: AsyncFetcher, headers: dict = None) -> FetchResult:
+    """
+    Fetch a page's raw HTML through the page cache, for callers that parse it
+    themselves (the site crawler). A 304 returns the cached HTML; a new HTML
+    page is stored without its scrape_page output. Raises FetchError.
+    """
+    entry, request_headers = _cached_entry(url, headers, need_body=True)
+    result = await fetcher.fetch(url, request_headers)
+    if result.status == 304 and entry is not None:
+        body = await asyncio.to_thread(page_cache.body, url)
+        page_cache.mark_not_modified(url)
+        return FetchResult(url=result.url, status=result.status, headers=result.headers, body=body)
+    if "html" in result.headers.get("content-type", "text/html") and result.body:
+        await asyncio.to_thread(_remember, url, result, entry, result.body)
+    return result
+
+
 # Example usage
@@ -0,0 +1,302 @@
+"""
+Shared HTTP fetcher used by the GeoHouse backend and the site auditor.
+
+Both the sync and async clients keep pooled keep-alive connections, cap the
+number of connections per host, apply connect/read timeouts, limit the
+response size and retry transient failures with exponential backoff.
+
+Passing a sink streams the body into it chunk by chunk instead of buffering
+it: the sink's start(headers) is called once the response headers are in and
+feed(chunk) for every chunk. With a sink, max_bytes truncates the body instead
+of failing the fetch. The async client collects chunks into batches of
+SINK_BATCH_BYTES and feeds each batch in a worker thread, so a sink that
+parses (stream_extract) doesn't block the event loop.
+"""
+import asyncio
+import contextlib
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import FETCH_BYTES, timed
+
+try:
+    import brotli  # noqa: F401  (lets requests/httpx decode "br" responses)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+CONNECT_TIMEOUT = float(os.getenv("FETCH_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("FETCH_READ_TIMEOUT", "15"))
+MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(5 * 1024 * 1024)))
+MAX_RETRIES = int(os.getenv("FETCH_RETRIES", "2"))
+BACKOFF = float(os.getenv("FETCH_BACKOFF", "0.5"))
+PER_HOST_CONNECTIONS = int(os.getenv("FETCH_PER_HOST", "4"))
+MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "64"))
+# Hosts whose connection pools the sync session keeps (least recently used are closed)
+POOL_HOSTS = int(os.getenv("FETCH_POOL_HOSTS", "64"))
+# Bytes the async client collects before feeding them to a sink
+SINK_BATCH_BYTES = int(os.getenv("FETCH_SINK_BATCH", str(256 * 1024)))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRY_AFTER = 30
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+
+_CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.I)
+
+
+class FetchError(Exception):
+    """Raised when a page could not be fetched."""
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int
+    headers: dict = field(default_factory=dict)
+    body: bytes = b""
+    truncated: bool = False
+
+    @property
+    def text(self) -> str:
+        return decode_body(self.body, self.headers.get("content-type", ""))
+
+
+def decode_body(body: bytes, content_type: str = "") -> str:
+    """
+    Decode a response body using the header charset, then a <meta charset>, then UTF-8.
+    """
+    match = re.search(r"charset=([\w-]+)", content_type or "", re.I)
+    charset = match.group(1) if match else None
+    if not charset:
+        meta = _CHARSET_RE.search(body[:4096])
+        charset = meta.group(1).decode("ascii") if meta else "utf-8"
+    try:
+        return body.decode(charset, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+def _merge_headers(headers: dict = None) -> dict:
+    merged = dict(DEFAULT_HEADERS)
+    if headers:
+        merged.update(headers)
+    return merged
+
+
+def _backoff_delay(attempt: int, retry_after: str = None) -> float:
+    """Exponential backoff, honoring a numeric Retry-After header when present."""
+    if retry_after and retry_after.strip().isdigit():
+        return min(float(retry_after), MAX_RETRY_AFTER)
+    return BACKOFF * (2 ** attempt)
+
+
+def _feed(sink, chunk: bytes, received: int, max_bytes: int):
+    """Pass a chunk to a sink, cut at max_bytes. Returns (bytes received, truncated)."""
+    if received + len(chunk) > max_bytes:
+        sink.feed(chunk[:max_bytes - received])
+        return max_bytes, True
+    sink.feed(chunk)
+    return received + len(chunk), False
+
+
+def _check_length(url: str, headers, max_bytes: int):
+    length = headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_bytes:
+        raise FetchError(f"{url} is larger than {max_bytes} bytes")
+
+
+# ============================================================
+# SYNC CLIENT
+# ============================================================
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Return the process-wide pooled session, creating it on first use. It
+    keeps pools for POOL_HOSTS hosts; pool_block makes threads wait for a
+    free connection instead of opening more than PER_HOST_CONNECTIONS to one host.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_HOSTS,
+                    pool_maxsize=PER_HOST_CONNECTIONS,
+                    pool_block=True,
+                    max_retries=0
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+@timed("fetch")
+def fetch(url: str, headers: dict = None, max_bytes: int = MAX_BYTES, sink=None) -> FetchResult:
+    """
+    Fetch a URL with the shared session. Raises FetchError on failure.
+    """
+    session = get_session()
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            with session.get(
+                url,
+                headers=_merge_headers(headers),
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                stream=True
+            ) as response:
+                if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+                    time.sleep(_backoff_delay(attempt, response.headers.get("retry-after")))
+                    continue
+                if response.status_code >= 400:
+                    raise FetchError(f"{url} returned HTTP {response.status_code}")
+                result_headers = {k.lower(): v for k, v in response.headers.items()}
+                if sink is None:
+                    _check_length(url, response.headers, max_bytes)
+                else:
+                    sink.start(result_headers)
+
+                body = bytearray()
+                received, truncated = 0, False
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    if sink is not None:
+                        received, truncated = _feed(sink, chunk, received, max_bytes)
+                        if truncated:
+                            break
+                        continue
+                    body.extend(chunk)
+                    if len(body) > max_bytes:
+                        raise FetchError(f"{url} is larger than {max_bytes} bytes")
+
+                FETCH_BYTES.inc(amount=received if sink is not None else len(body))
+                return FetchResult(
+                    url=response.url,
+                    status=response.status_code,
+                    headers=result_headers,
+                    body=bytes(body),
+                    truncated=truncated
+                )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= MAX_RETRIES:
+                raise FetchError(f"Error fetching {url}: {e}") from e
+            time.sleep(_backoff_delay(attempt))
+        except requests.RequestException as e:
+            raise FetchError(f"Error fetching {url}: {e}") from e
+    raise FetchError(f"Error fetching {url}: retries exhausted")
+
+
+# ============================================================
+# ASYNC CLIENT
+# ============================================================
+
+class AsyncFetcher:
+    """
+    Pooled async fetcher. Create one per event loop (e.g. in the app lifespan)
+    and close it with aclose() on shutdown.
+    """
+
+    def __init__(self, per_host: int = PER_HOST_CONNECTIONS, max_connections: int = MAX_CONNECTIONS):
+        self.per_host = per_host
+        self.client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            follow_redirects=True
+        )
+        # host -> [semaphore, requests holding or waiting for it]; dropped when unused
+        self._host_slots = {}
+
+    @contextlib.asynccontextmanager
+    async def _slot(self, url: str):
+        """Hold one of the host's connection slots."""
+        host = urlsplit(url).netloc.lower()
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = [asyncio.Semaphore(self.per_host), 0]
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                yield
+        finally:
+            slot[1] -= 1
+            if not slot[1]:
+                del self._host_slots[host]
+
+    @timed("fetch")
+    async def fetch(self, url: str, headers: dict = None, max_bytes: int = MAX_BYTES, sink=None) -> FetchResult:
+        """
+        Fetch a URL, holding one of the host's connection slots. Raises FetchError on failure.
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                async with self._slot(url):
+                    async with self.client.stream("GET", url, headers=headers) as response:
+                        if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+                            delay = _backoff_delay(attempt, response.headers.get("retry-after"))
+                        else:
+                            return await self._read(url, response, max_bytes, sink)
+            except httpx.TransportError as e:
+                if attempt >= MAX_RETRIES:
+                    raise FetchError(f"Error fetching {url}: {e}") from e
+                delay = _backoff_delay(attempt)
+            except httpx.HTTPError as e:
+                raise FetchError(f"Error fetching {url}: {e}") from e
+            # Back off outside the host slot so other requests can use it
+            await asyncio.sleep(delay)
+        raise FetchError(f"Error fetching {url}: retries exhausted")
+
+    async def _read(self, url: str, response: httpx.Response, max_bytes: int, sink=None) -> FetchResult:
+        if response.status_code >= 400:
+            raise FetchError(f"{url} returned HTTP {response.status_code}")
+        result_headers = {k.lower(): v for k, v in response.headers.items()}
+        if sink is None:
+            _check_length(url, response.headers, max_bytes)
+        else:
+            sink.start(result_headers)
+
+        body = bytearray()
+        received, truncated = 0, False
+        async for chunk in response.aiter_bytes():
+            body.extend(chunk)
+            if sink is not None:
+                if len(body) >= SINK_BATCH_BYTES or received + len(body) >= max_bytes:
+                    received, truncated = await asyncio.to_thread(_feed, sink, bytes(body), received, max_bytes)
+                    body.clear()
+                    if truncated:
+                        break
+                continue
+            if len(body) > max_bytes:
+                raise FetchError(f"{url} is larger than {max_bytes} bytes")
+        if sink is not None and body:
+            received, truncated = await asyncio.to_thread(_feed, sink, bytes(body), received, max_bytes)
+            body.clear()
+
+        FETCH_BYTES.inc(amount=received if sink is not None else len(body))
+        return FetchResult(
+            url=str(response.url),
+            status=response.status_code,
+            headers=result_headers,
+            body=bytes(body),
+            truncated=truncated
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,148 @@
+"""
+Job store for summary, LLM answer and comparison results.
+
+MemoryJobStore keeps a bounded, TTL-limited dict per worker. SQLiteJobStore
+persists jobs to a file so every uvicorn worker sees the same jobs.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+JOB_STORE_SIZE = int(os.getenv("JOB_STORE_SIZE", "1000"))
+JOB_TTL = float(os.getenv("JOB_TTL", "3600"))
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+def _new_job(kind: str) -> dict:
+    now = time.time()
+    return {
+        "job_id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": PENDING,
+        "result": None,
+        "error": None,
+        "created": now,
+        "updated": now
+    }
+
+
+class MemoryJobStore:
+    def __init__(self, max_jobs: int = JOB_STORE_SIZE, ttl: float = JOB_TTL):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, kind: str) -> dict:
+        job = _new_job(kind)
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+            self._evict(job["created"])
+        return dict(job)
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or time.time() - job["created"] > self.ttl:
+                return None
+            return dict(job)
+
+    def finish(self, job_id: str, result: dict = None, error: str = None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(
+                status=FAILED if error else DONE,
+                result=result,
+                error=error,
+                updated=time.time()
+            )
+
+    def _evict(self, now: float):
+        # Oldest jobs first: expired ones, then whatever exceeds max_jobs
+        while self._jobs:
+            job_id, job = next(iter(self._jobs.items()))
+            if now - job["created"] > self.ttl or len(self._jobs) > self.max_jobs:
+                del self._jobs[job_id]
+            else:
+                break
+
+
+class SQLiteJobStore:
+    def __init__(self, db_path: str, max_jobs: int = JOB_STORE_SIZE, ttl: float = JOB_TTL):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, "
+            "result TEXT, error TEXT, created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_created ON jobs(created)")
+        self._db.commit()
+
+    def create(self, kind: str) -> dict:
+        job = _new_job(kind)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (job_id, kind, status, result, error, created, updated) "
+                "VALUES (?, ?, ?, NULL, NULL, ?, ?)",
+                (job["job_id"], kind, PENDING, job["created"], job["updated"])
+            )
+            self._evict(job["created"])
+            self._db.commit()
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT job_id, kind, status, result, error, created, updated FROM jobs "
+                "WHERE job_id = ? AND created >= ?",
+                (job_id, time.time() - self.ttl)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "result": json.loads(row[3]) if row[3] else None,
+            "error": row[4],
+            "created": row[5],
+            "updated": row[6]
+        }
+
+    def finish(self, job_id: str, result: dict = None, error: str = None):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated = ? WHERE job_id = ?",
+                (FAILED if error else DONE, json.dumps(result) if result is not None else None,
+                 error, time.time(), job_id)
+            )
+            self._db.commit()
+
+    def _evict(self, now: float):
+        self._db.execute("DELETE FROM jobs WHERE created < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs "
+            "ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_jobs,)
+        )
+
+
+def create_job_store():
+    """Use SQLite when JOB_STORE_DB is set (multi-worker deployments), memory otherwise."""
+    db_path = os.getenv("JOB_STORE_DB")
+    if db_path:
+        return SQLiteJobStore(db_path)
+    return MemoryJobStore()
@@ -0,0 +1,94 @@
+"""
+Incremental JSON scanner for streamed LLM output.
+
+Feed it text as it arrives and it returns every object or array that has
+just closed at one of the watched paths, without waiting for the whole
+document. Text before the first "{" (e.g. a ```json fence) is ignored.
+"""
+import json
+
+ANY_INDEX = None
+
+
+class JSONStreamScanner:
+    def __init__(self, watch):
+        """
+        watch: iterable of paths, e.g. ("url_analysis", "competitors", ANY_INDEX)
+        for each element of url_analysis.competitors.
+        """
+        self.watch = [tuple(path) for path in watch]
+        self.buffer = ""
+        self.pos = 0
+        self.stack = []
+        self.in_string = False
+        self.escaped = False
+        self.string_start = 0
+        self.started = False
+        self.finished = False
+
+    def feed(self, text: str) -> list:
+        """Consume more text. Returns a list of (path, value) for newly completed watched values."""
+        self.buffer += text
+        completed = []
+        while self.pos < len(self.buffer) and not self.finished:
+            char = self.buffer[self.pos]
+            if self.in_string:
+                self._string_char(char)
+            elif not self.started:
+                if char == "{":
+                    self.started = True
+                    self._open("object")
+            elif char == '"':
+                self.in_string = True
+                self.string_start = self.pos
+            elif char in "{[":
+                self._open("object" if char == "{" else "array")
+            elif char in "}]":
+                frame = self.stack.pop()
+                if self._watched(frame["path"]):
+                    try:
+                        value = json.loads(self.buffer[frame["start"]:self.pos + 1])
+                        completed.append((frame["path"], value))
+                    except ValueError:
+                        pass  # malformed model output; the final parse will report it
+                if not self.stack:
+                    self.finished = True
+            elif char == ":" and self.stack[-1]["type"] == "object":
+                self.stack[-1]["expect_key"] = False
+            elif char == ",":
+                frame = self.stack[-1]
+                if frame["type"] == "object":
+                    frame["expect_key"] = True
+                else:
+                    frame["index"] += 1
+            self.pos += 1
+        return completed
+
+    def _string_char(self, char: str):
+        if self.escaped:
+            self.escaped = False
+        elif char == "\\":
+            self.escaped = True
+        elif char == '"':
+            self.in_string = False
+            frame = self.stack[-1]
+            if frame["type"] == "object" and frame["expect_key"]:
+                frame["key"] = json.loads(self.buffer[self.string_start:self.pos + 1])
+
+    def _open(self, kind: str):
+        if self.stack:
+            parent = self.stack[-1]
+            step = parent["key"] if parent["type"] == "object" else parent["index"]
+            path = parent["path"] + (step,)
+        else:
+            path = ()
+        self.stack.append({"type": kind, "start": self.pos, "path": path,
+                           "key": None, "expect_key": True, "index": 0})
+
+    def _watched(self, path: tuple) -> bool:
+        for pattern in self.watch:
+            if len(pattern) == len(path) and all(
+                p is ANY_INDEX or p == step for p, step in zip(pattern, path)
+            ):
+                return True
+        return False
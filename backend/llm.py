@@ -1,24 +1,41 @@
-import os
-from groq import Groq
-from dotenv import load_dotenv
+from llm_gateway import INTERACTIVE, gateway
+from metrics import timed
 
-load_dotenv()
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+def _messages(prompt: str) -> list:
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": prompt}
+    ]
 
 
-def query_groq_llm(prompt: str, model: str = "llama-3.1-8b-instant") -> str:
+@timed("llm")
+def query_groq_llm(prompt: str, model: str = "llama-3.1-8b-instant", priority: int = INTERACTIVE) -> str:
     if not prompt or not prompt.strip():
         return ""
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.5,
-        max_tokens=1500
-    )
-
-    return response.choices[0].message.content.strip()
+    return gateway.complete(_messages(prompt), model, max_tokens=1500, temperature=0.5, priority=priority)
+
+
+@timed("llm")
+async def query_groq_llm_async(prompt: str, model: str = "llama-3.1-8b-instant", max_tokens: int = 1500,
+                               priority: int = INTERACTIVE) -> str:
+    """
+    Async variant of query_groq_llm with a configurable completion budget.
+    """
+    if not prompt or not prompt.strip():
+        return ""
+
+    return await gateway.acomplete(_messages(prompt), model, max_tokens=max_tokens, temperature=0.5, priority=priority)
+
+
+@timed("llm")
+async def stream_groq_llm(prompt: str, model: str = "llama-3.1-8b-instant", priority: int = INTERACTIVE):
+    """
+    Same request as query_groq_llm, but yields the answer text as it is generated.
+    """
+    if not prompt or not prompt.strip():
+        return
+
+    async for text in gateway.astream(_messages(prompt), model, max_tokens=1500, temperature=0.5, priority=priority):
+        yield text
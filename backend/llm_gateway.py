@@ -0,0 +1,442 @@
+"""
+Shared gateway for every Groq chat completion.
+
+- Token buckets on requests per minute (LLM_RPM) and tokens per minute
+  (LLM_TPM) admit requests before they are sent, so bursts queue up here
+  instead of coming back as 429s.
+- Waiting requests are admitted in priority order: INTERACTIVE before BATCH.
+- 429s pause the whole gateway for the server's retry-after; 5xx and
+  connection errors are retried with exponential backoff.
+- Identical requests already in flight share one API call. If the caller
+  that sent it is cancelled, a waiting caller sends it again.
+
+Sync callers (threads) and async callers (event loops) share one scheduler.
+The Groq SDK reads GROQ_BASE_URL, which is how it is pointed at a fake server.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from dotenv import load_dotenv
+from groq import APIConnectionError, AsyncGroq, Groq, InternalServerError, RateLimitError
+
+from cache import make_key
+from chunker import estimate_tokens
+from metrics import LLM_TOKENS, registry, stage
+
+load_dotenv()
+
+LLM_RPM = int(os.getenv("LLM_RPM", "30"))
+LLM_TPM = int(os.getenv("LLM_TPM", "30000"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF = float(os.getenv("LLM_BACKOFF", "0.5"))
+MAX_RETRY_AFTER = 60
+
+INTERACTIVE = 0
+BATCH = 1
+
+RETRYABLE = (RateLimitError, InternalServerError, APIConnectionError)
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, holding at most one minute's worth. 0 disables it."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        # A request bigger than the bucket would never fit; let it through on a full bucket
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        if self.capacity:
+            self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class _Waiter:
+    """A request waiting for admission, ordered by priority, then arrival."""
+    __slots__ = ("priority", "seq", "tokens", "wake", "state")
+
+    def __init__(self, priority: int, seq: int, tokens: int, wake):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.wake = wake
+        # "queued", then "admitted" (its budget is taken) or "cancelled"
+        self.state = "queued"
+
+    def __lt__(self, other) -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _LeaderGone(Exception):
+    """Set on a shared request whose leader was cancelled; a follower retries as the new leader."""
+
+
+def _retry_after(error: Exception):
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return min(float(value), MAX_RETRY_AFTER)
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    def __init__(self, rpm: int = LLM_RPM, tpm: int = LLM_TPM, max_retries: int = LLM_MAX_RETRIES):
+        self.max_retries = max_retries
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.counters = {"requests": 0, "retries": 0, "rate_limited": 0, "coalesced": 0, "failed": 0}
+        self._paused_until = 0.0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._dispatcher = None
+        self._inflight = {}
+        self._client = None
+        self._async_client = None
+
+    # ----- clients (created on first use; retries are handled here, not by the SDK)
+
+    @property
+    def client(self) -> Groq:
+        if self._client is None:
+            self._client = Groq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0)
+        return self._client
+
+    @property
+    def async_client(self) -> AsyncGroq:
+        if self._async_client is None:
+            self._async_client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0)
+        return self._async_client
+
+    def configured(self) -> bool:
+        """Whether GROQ_API_KEY is set. Clients are only built on first use, so a missing key shows up here."""
+        return bool(os.getenv("GROQ_API_KEY"))
+
+    # ----- admission
+
+    def _enqueue(self, tokens: int, priority: int, wake) -> _Waiter:
+        with self._cond:
+            waiter = _Waiter(priority, next(self._seq), tokens, wake)
+            heapq.heappush(self._waiters, waiter)
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, daemon=True, name="llm-gateway")
+                self._dispatcher.start()
+            self._cond.notify()
+            return waiter
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._waiters:
+                    self._cond.wait()
+                waiter = self._waiters[0]
+                now = time.monotonic()
+                delay = max(
+                    self._paused_until - now,
+                    self.requests.wait_time(1, now),
+                    self.tokens.wait_time(waiter.tokens, now)
+                )
+                if delay > 0:
+                    # A new, more urgent request or a pause wakes us early
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._waiters)
+                self.requests.take(1)
+                self.tokens.take(waiter.tokens)
+                waiter.state = "admitted"
+            try:
+                waiter.wake()
+            except RuntimeError:
+                # The waiter's event loop has closed, so nobody will use this admission
+                self._cancel(waiter)
+
+    def _cancel(self, waiter: _Waiter):
+        """Drop a waiter that gave up: remove it from the queue, or return its budget if it was admitted."""
+        with self._cond:
+            if waiter.state == "queued":
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+            elif waiter.state == "admitted":
+                self.requests.give_back(1)
+                self.tokens.give_back(waiter.tokens)
+            waiter.state = "cancelled"
+            self._cond.notify()
+
+    def _acquire(self, tokens: int, priority: int):
+        admitted = threading.Event()
+        with stage("llm_queue"):
+            self._enqueue(tokens, priority, admitted.set)
+            admitted.wait()
+
+    async def _acquire_async(self, tokens: int, priority: int):
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+
+        def wake():
+            # A cancelled waiter's future is already done; _cancel returns its budget
+            loop.call_soon_threadsafe(lambda: admitted.done() or admitted.set_result(None))
+
+        with stage("llm_queue"):
+            waiter = self._enqueue(tokens, priority, wake)
+            try:
+                await admitted
+            except asyncio.CancelledError:
+                self._cancel(waiter)
+                raise
+
+    def _settle(self, reserved: int, usage, model: str):
+        """Return the unused part of a token reservation once actual usage is known."""
+        LLM_TOKENS.inc(model, "prompt", amount=getattr(usage, "prompt_tokens", None) or 0)
+        LLM_TOKENS.inc(model, "completion", amount=getattr(usage, "completion_tokens", None) or 0)
+        actual = getattr(usage, "total_tokens", None)
+        if actual is not None and actual < reserved:
+            with self._cond:
+                self.tokens.give_back(reserved - actual)
+                self._cond.notify()
+
+    def _count(self, name: str):
+        with self._cond:
+            self.counters[name] += 1
+
+    def _backoff(self, error: Exception, attempt: int) -> float:
+        """Seconds to wait before retrying. A 429 pauses every request, not just this one."""
+        with self._cond:
+            if isinstance(error, RateLimitError):
+                self.counters["rate_limited"] += 1
+                pause = _retry_after(error) or LLM_BACKOFF * (2 ** attempt)
+                self._paused_until = max(self._paused_until, time.monotonic() + pause)
+                self._cond.notify()
+                return 0.0
+        return LLM_BACKOFF * (2 ** attempt) + random.uniform(0, LLM_BACKOFF)
+
+    def paused_for(self) -> float:
+        """Seconds until a rate-limit pause ends (0 when not paused)."""
+        return max(0.0, self._paused_until - time.monotonic())
+
+    # ----- requests
+
+    @staticmethod
+    def _request_args(messages, model, max_tokens, temperature) -> dict:
+        return {"model": model, "messages": messages, "max_tokens": max_tokens, "temperature": temperature}
+
+    @staticmethod
+    def _reservation(messages, max_tokens) -> int:
+        return sum(estimate_tokens(m["content"]) + 4 for m in messages) + max_tokens
+
+    def _coalesce(self, args: dict):
+        """Return (key, future, leader) for a request; followers wait on the leader's future."""
+        key = make_key(json.dumps(args, sort_keys=True))
+        with self._cond:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.counters["coalesced"] += 1
+                return key, future, False
+            future = self._inflight[key] = Future()
+            return key, future, True
+
+    def _follow(self, args: dict):
+        """
+        Return (None, None, result) from an identical in-flight request, or
+        (key, future, None) once this caller has to lead.
+        """
+        while True:
+            key, shared, leader = self._coalesce(args)
+            if leader:
+                return key, shared, None
+            try:
+                return None, None, shared.result()
+            except _LeaderGone:
+                continue
+
+    async def _afollow(self, args: dict):
+        """Async variant of _follow."""
+        while True:
+            key, shared, leader = self._coalesce(args)
+            if leader:
+                return key, shared, None
+            try:
+                return None, None, await asyncio.wrap_future(shared)
+            except _LeaderGone:
+                continue
+
+    def _resolve(self, key: str, future: Future, result=None, error: Exception = None):
+        with self._cond:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def complete(self, messages: list, model: str, max_tokens: int = 1500, temperature: float = 0.5,
+                 priority: int = INTERACTIVE, retries: int = None) -> str:
+        """Chat completion text. Blocks until admitted; raises after the last failed retry."""
+        args = self._request_args(messages, model, max_tokens, temperature)
+        key, shared, result = self._follow(args)
+        if shared is None:
+            return result
+
+        reserved = self._reservation(messages, max_tokens)
+        retries = self.max_retries if retries is None else retries
+        try:
+            for attempt in range(retries + 1):
+                self._acquire(reserved, priority)
+                try:
+                    self._count("requests")
+                    with stage("groq"):
+                        response = self.client.chat.completions.create(**args)
+                    break
+                except RETRYABLE as e:
+                    delay = self._backoff(e, attempt)
+                    if attempt == retries:
+                        raise
+                    self._count("retries")
+                    time.sleep(delay)
+            self._settle(reserved, response.usage, model)
+            result = response.choices[0].message.content.strip()
+        except Exception as e:
+            self._count("failed")
+            self._resolve(key, shared, error=e)
+            raise
+        except BaseException:
+            self._resolve(key, shared, error=_LeaderGone())
+            raise
+        self._resolve(key, shared, result)
+        return result
+
+    async def acomplete(self, messages: list, model: str, max_tokens: int = 1500, temperature: float = 0.5,
+                        priority: int = INTERACTIVE, retries: int = None) -> str:
+        """Async variant of complete. A cancelled leader hands identical waiting requests to a follower."""
+        args = self._request_args(messages, model, max_tokens, temperature)
+        key, shared, result = await self._afollow(args)
+        if shared is None:
+            return result
+
+        reserved = self._reservation(messages, max_tokens)
+        retries = self.max_retries if retries is None else retries
+        sent = False
+        try:
+            for attempt in range(retries + 1):
+                await self._acquire_async(reserved, priority)
+                sent = True
+                try:
+                    self._count("requests")
+                    with stage("groq"):
+                        response = await self.async_client.chat.completions.create(**args)
+                    break
+                except RETRYABLE as e:
+                    sent = False
+                    delay = self._backoff(e, attempt)
+                    if attempt == retries:
+                        raise
+                    self._count("retries")
+                    await asyncio.sleep(delay)
+            sent = False
+            self._settle(reserved, response.usage, model)
+            result = response.choices[0].message.content.strip()
+        except asyncio.CancelledError:
+            if sent:
+                # The abandoned call never reports its usage; return its token reservation
+                with self._cond:
+                    self.tokens.give_back(reserved)
+                    self._cond.notify()
+            self._resolve(key, shared, error=_LeaderGone())
+            raise
+        except Exception as e:
+            self._count("failed")
+            self._resolve(key, shared, error=e)
+            raise
+        self._resolve(key, shared, result)
+        return result
+
+    async def astream(self, messages: list, model: str, max_tokens: int = 1500, temperature: float = 0.5,
+                      priority: int = INTERACTIVE):
+        """
+        Yield completion text as it is generated. Retries only happen before the first token.
+        The token reservation is settled when the stream ends, from the usage Groq sends
+        with the last chunk, or estimated from the text received if there is none.
+        """
+        args = self._request_args(messages, model, max_tokens, temperature)
+        reserved = self._reservation(messages, max_tokens)
+        admitted, usage, parts = False, None, []
+        try:
+            for attempt in range(self.max_retries + 1):
+                await self._acquire_async(reserved, priority)
+                admitted = True
+                try:
+                    self._count("requests")
+                    stream = await self.async_client.chat.completions.create(**args, stream=True)
+                    break
+                except RETRYABLE as e:
+                    delay = self._backoff(e, attempt)
+                    if attempt == self.max_retries:
+                        raise
+                    self._count("retries")
+                    await asyncio.sleep(delay)
+            async for chunk in stream:
+                usage = (chunk.x_groq.usage if chunk.x_groq else None) or chunk.usage or usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield parts[-1]
+        except (Exception, asyncio.CancelledError):
+            self._count("failed")
+            raise
+        finally:
+            if admitted:
+                if usage is None:
+                    prompt = reserved - max_tokens
+                    completion = estimate_tokens("".join(parts))
+                    usage = SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion,
+                                            total_tokens=prompt + completion)
+                self._settle(reserved, usage, model)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(
+                self.counters,
+                queued=len(self._waiters),
+                inflight_shared=len(self._inflight),
+                paused_for=round(self.paused_for(), 2)
+            )
+
+
+gateway = LLMGateway()
+
+
+def _gateway_counters() -> dict:
+    stats = gateway.stats()
+    return {(name,): stats[name] for name in gateway.counters}
+
+
+registry.collect(
+    "geo_llm_gateway_total", "counter", "LLM gateway requests, retries, rate limits, coalesced and failed calls",
+    ["event"], _gateway_counters
+)
+registry.collect(
+    "geo_llm_queue_depth", "gauge", "Requests waiting for LLM gateway admission",
+    (), lambda: {(): gateway.stats()["queued"]}
+)
@@ -1,11 +1,45 @@
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
 from typing import List
 from fastapi import FastAPI, Request
-from crawler import scrape_page
-from summary import summarize_with_cohere
-from llm import query_groq_llm
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from crawler import page_cache, scrape_page_async
+from fetcher import AsyncFetcher
+from summary import summarize_with_cohere_async, summary_cache
+from answer_cache import AnswerCache
+from monitor import MONITOR_INTERVAL, MONITOR_MAX_WATCHES, MONITOR_THRESHOLD, Monitor, new_watch, watch_view
+from chunker import chunk_sections, sections_from_text
+from llm import query_groq_llm_async, stream_groq_llm
+from llm_gateway import gateway
+from metrics import CONTENT_TYPE, METRICS_ENABLED, register_cache, registry, trace_requests
+from json_stream import ANY_INDEX, JSONStreamScanner
+from mapreduce import map_reduce_compare, map_sections, parse_json_reply, reduce_analysis, use_map_reduce, with_local_scores
+from relevance import COMPARE_TOP_K, score_pages, top_k, used_chunks
+from vector_index import VectorIndex
+from jobs import DONE, PENDING, create_job_store
 from fastapi.middleware.cors import CORSMiddleware
 
 import os
+import sys
+
+# Max number of pages scraped/summarized at once for a single request
+SCRAPE_CONCURRENCY = max(1, int(os.getenv("SCRAPE_CONCURRENCY", "5")))
+# Chunks per indexed page that are summarized for a query when use_index is set
+INDEX_SUMMARY_CHUNKS = int(os.getenv("INDEX_SUMMARY_CHUNKS", "4"))
+# Most results one /index/search request returns
+INDEX_SEARCH_MAX_K = int(os.getenv("INDEX_SEARCH_MAX_K", "100"))
+
+# Also serve the site auditor from this app under this path prefix (e.g. /auditor)
+AUDITOR_MOUNT = os.getenv("AUDITOR_MOUNT", "").rstrip("/")
+AUDITOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "site-auditor-prototype", "backend")
+
+vector_index = VectorIndex(os.environ["VECTOR_INDEX_DIR"]) if os.getenv("VECTOR_INDEX_DIR") else None
+answer_cache = AnswerCache(db_path=os.getenv("ANSWER_CACHE_DB"))
+ANSWER_MODEL = "llama-3.1-8b-instant"
+# Run due monitoring checks in the background (set to 0 on all but one worker when MONITOR_DB is shared)
+MONITOR_SCHEDULER = os.getenv("MONITOR_SCHEDULER", "1") != "0"
 
 PROMPT = """
 You are a Generative Engine Optimization (GEO) analyst.
@@ -133,22 +167,319 @@ For the competitors section:
 
 """
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled fetcher per worker, shared by all requests
+    app.state.fetcher = AsyncFetcher()
+    monitor.start(app.state.fetcher, schedule=MONITOR_SCHEDULER)
+    yield
+    await monitor.stop()
+    await app.state.fetcher.aclose()
+    if auditor is not None:
+        # A mounted app's own lifespan doesn't run
+        await auditor.close_fetcher()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],        # allow all origins
     allow_credentials=True,
     allow_methods=["*"],        # allow all HTTP methods
     allow_headers=["*"],        # allow all headers
+    expose_headers=["Server-Timing"],
 )
 
+auditor = None
+if AUDITOR_MOUNT:
+    sys.path.append(AUDITOR_DIR)
+    import app as auditor
+    app.mount(AUDITOR_MOUNT, auditor.app)
+
+
+if METRICS_ENABLED:
+    app.middleware("http")(trace_requests)
+    register_cache("summaries", summary_cache.stats)
+    register_cache("answers", answer_cache.stats)
+    if page_cache:
+        # A 304 on revalidation is a hit; a changed page is a miss
+        register_cache("pages", page_cache.stats, hit_key="not_modified", miss_key="modified")
 
-summaries = []
+
+jobs = create_job_store()
+# Strong references to background job tasks so they aren't garbage collected
+_background_tasks = set()
 
 @app.get("/")
 async def health():
     return {"message":"Health ok"}
 
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until GROQ_API_KEY is set (Groq clients are only created on first use)."""
+    checks = {"groq": gateway.configured()}
+    if not checks["groq"]:
+        return JSONResponse({"status": "not ready", "checks": checks}, status_code=503)
+    return {"status": "ready", "checks": checks}
+
+def page_text(page: dict) -> str:
+    """Full text of a scraped page: its sections with headings, falling back to <p> content."""
+    sections = page.get("sections") or []
+    blocks = [f"{s['heading']}\n{s['text']}" if s["heading"] else s["text"] for s in sections]
+    return "\n\n".join(b for b in blocks if b.strip()) or page.get("content", "")
+
+
+def chunk_previews(chunks: List[dict]) -> List[dict]:
+    """Chunks in the shape the dashboard's ChunksPage renders."""
+    return [
+        {
+            "id": f"chunk-{chunk['index']}",
+            "index": chunk["index"],
+            "heading": chunk["heading"],
+            "tokenCount": chunk["tokens"],
+            "preview": chunk["text"][:280],
+            "aiUsesThis": False,
+            "text": chunk["text"]
+        }
+        for chunk in chunks
+    ]
+
+
+async def scrape_and_index(fetcher: AsyncFetcher, url: str):
+    """
+    Scrape a page and split it into chunks, adding them to the vector index
+    when it is enabled. Returns (chunks, index status), chunks being None
+    when the page has no extractable content.
+    """
+    output = await scrape_page_async(url, fetcher)
+    text = page_text(output)
+    if not text:
+        return None, None
+    chunks = chunk_sections(output.get("sections") or sections_from_text(text))
+    status = None
+    if vector_index is not None:
+        status = await asyncio.to_thread(vector_index.upsert, url, chunks, output.get("title"))
+    return chunks, status
+
+
+def indexed_chunks(url: str, query: str):
+    """
+    Chunks of an indexed page, narrowed to the ones that best match the query.
+    Returns None when the page isn't indexed.
+    """
+    chunks = vector_index.page_chunks(url)
+    if not chunks or not query:
+        return chunks
+    best = {hit["chunk_index"] for hit in vector_index.search(query, INDEX_SUMMARY_CHUNKS, urls=[url])}
+    return [chunk for chunk in chunks if chunk["index"] in best] or chunks
+
+
+async def scrape_and_summarize(fetcher: AsyncFetcher, url: str, query: str, semaphore: asyncio.Semaphore,
+                               use_index: bool = False):
+    """
+    Scrape a single URL and summarize its content. With use_index, pages
+    already in the vector index are not fetched again.
+    Returns (summary, chunks), or None when the page has no extractable content.
+    """
+    async with semaphore:
+        chunks = None
+        if use_index and vector_index is not None:
+            chunks = await asyncio.to_thread(indexed_chunks, url, query)
+        if chunks is None:
+            chunks, _ = await scrape_and_index(fetcher, url)
+        if not chunks:
+            return None
+        text = "\n\n".join(chunk["text"] for chunk in chunks)
+        sections = [{"heading": None, "text": chunk["text"]} for chunk in chunks]
+        summary = await summarize_with_cohere_async(text, query, sections)
+        return summary, chunks
+
+
+async def summarize_pages(fetcher: AsyncFetcher, user_url: str, urls: List[str], query: str,
+                          use_index: bool = False) -> dict:
+    """
+    Scrape and summarize the user URL and all competitors concurrently.
+    Returns the summary result, or a dict with an "error" key.
+    """
+    semaphore = asyncio.Semaphore(SCRAPE_CONCURRENCY)
+    # gather keeps input order, so competitor_summaries matches urls
+    results = await asyncio.gather(
+        *(scrape_and_summarize(fetcher, url, query, semaphore, use_index) for url in [user_url, *urls]),
+        return_exceptions=True
+    )
+
+    user_result, competitor_results = results[0], results[1:]
+    if isinstance(user_result, Exception):
+        return {"error": f"Error processing user URL: {str(user_result)}"}
+    if user_result is None:
+        return {"error": f"Failed to scrape content from {user_url}"}
+
+    summaries_list = []
+    for url, result in zip(urls, competitor_results):
+        if isinstance(result, Exception):
+            summaries_list.append({"url": url, "summary": f"Error: {str(result)}"})
+        elif result is None:
+            summaries_list.append({"url": url, "summary": "Failed to scrape content"})
+        else:
+            summaries_list.append({"url": url, "summary": result[0], "chunks": [c["text"] for c in result[1]]})
+
+    user_summary, user_chunks = user_result
+    return {
+        "count": len(urls),
+        "user_url": user_url,
+        "user_summary": user_summary,
+        "user_chunks": chunk_previews(user_chunks),
+        "competitor_summaries": summaries_list
+    }
+
+
+async def run_job(job_id: str, coro) -> dict:
+    """Await a job's work and record its result (or error) in the job store."""
+    try:
+        result = await coro
+    except Exception as e:
+        result = {"error": f"Server error: {str(e)}"}
+    if "error" in result:
+        jobs.finish(job_id, error=result["error"])
+    else:
+        jobs.finish(job_id, result=result)
+    return result
+
+
+async def submit_job(kind: str, coro, background: bool = False) -> dict:
+    """
+    Create a job for coro. In background mode return the job ID right away,
+    otherwise wait and return the result along with its job ID.
+    """
+    job_id = jobs.create(kind)["job_id"]
+    if background:
+        task = asyncio.create_task(run_job(job_id, coro))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        return {"job_id": job_id, "status": PENDING}
+    result = await run_job(job_id, coro)
+    return {"job_id": job_id, **result}
+
+
+def load_job_result(job_id: str, kind: str):
+    """Return (result, error) for a finished job of the given kind."""
+    if not job_id:
+        return None, f"Missing '{kind}' job ID."
+    job = jobs.get(job_id)
+    if job is None or job["kind"] != kind:
+        return None, f"Unknown {kind} job: {job_id}"
+    if job["status"] != DONE:
+        return None, job["error"] or f"Job {job_id} is still {job['status']}."
+    return job["result"], None
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    stats = {"summaries": summary_cache.stats(), "answers": answer_cache.stats()}
+    if page_cache:
+        stats["pages"] = page_cache.stats()
+    if vector_index is not None:
+        stats["index"] = vector_index.stats()
+    return stats
+
+
+@app.get("/llm/stats")
+async def llm_stats():
+    """Request, retry, rate-limit and queue counters of the shared LLM gateway."""
+    return gateway.stats()
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics: stage latencies and errors, bytes fetched, LLM tokens and cache lookups."""
+    if not METRICS_ENABLED:
+        return JSONResponse({"error": "Metrics are disabled. Set METRICS_ENABLED=1 to enable them."}, status_code=404)
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+@app.post("/index")
+async def index_pages(request: Request):
+    """Scrape pages into the vector index; pages whose content didn't change are left as is."""
+    try:
+        if vector_index is None:
+            return {"error": "Vector index is disabled. Set VECTOR_INDEX_DIR to enable it."}
+        body = await request.json()
+        urls: List[str] = body.get("urls", [])
+        if not urls:
+            return {"error": "Please provide 'urls' list in JSON body."}
+
+        semaphore = asyncio.Semaphore(SCRAPE_CONCURRENCY)
+
+        async def index_one(url):
+            async with semaphore:
+                try:
+                    chunks, status = await scrape_and_index(request.app.state.fetcher, url)
+                except Exception as e:
+                    return {"url": url, "status": "failed", "error": str(e)}
+            if chunks is None:
+                return {"url": url, "status": "failed", "error": "Failed to scrape content"}
+            return {"url": url, "status": status, "chunks": len(chunks)}
+
+        return {"results": await asyncio.gather(*(index_one(url) for url in urls))}
+    except Exception as e:
+        return {"error": f"Server error: {str(e)}"}
+
+
+@app.post("/index/search")
+async def search_index(request: Request):
+    try:
+        if vector_index is None:
+            return {"error": "Vector index is disabled. Set VECTOR_INDEX_DIR to enable it."}
+        body = await request.json()
+        query = body.get("query")
+        if not query:
+            return {"error": "Please provide 'query' in JSON body."}
+
+        k, error = parse_count(body, "k")
+        if error:
+            return JSONResponse({"error": error}, status_code=400)
+        k = min(10 if k is None else k, INDEX_SEARCH_MAX_K)
+
+        started = time.perf_counter()
+        results = await asyncio.to_thread(vector_index.search, query, k, body.get("urls"), body.get("domains"))
+        return {"query": query, "results": results, "took_ms": round((time.perf_counter() - started) * 1000, 2)}
+    except Exception as e:
+        return {"error": f"Server error: {str(e)}"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        return {"error": f"Unknown job: {job_id}"}
+    return job
+
+
+@app.get("/jobs/{job_id}/chunks")
+async def get_job_chunks(job_id: str, llm_job_id: str = None):
+    """
+    Chunks of the user's page from a summary job, for the dashboard.
+    With llm_job_id, each chunk is scored against that answer and flagged
+    when the answer likely draws on it.
+    """
+    summary, error = load_job_result(job_id, "summary")
+    if error:
+        return {"error": error}
+    chunks = [{k: v for k, v in c.items() if k != "text"} for c in summary.get("user_chunks", [])]
+
+    if llm_job_id:
+        llm, error = load_job_result(llm_job_id, "llm_response")
+        if error:
+            return {"error": error}
+        texts = [c["text"] for c in summary.get("user_chunks", [])]
+        chunk_scores = score_pages(llm["response"], [texts])[0]["chunk_scores"]
+        for chunk, score, used in zip(chunks, chunk_scores, used_chunks(chunk_scores)):
+            chunk["relevance"] = score
+            chunk["aiUsesThis"] = used
+    return {"job_id": job_id, "chunks": chunks}
+
+
 @app.post("/generate/summary")
 async def crawl_and_summarize(request: Request):
     try:
@@ -160,37 +491,34 @@ async def crawl_and_summarize(request: Request):
         if not user_url or not urls:
             return {"error": "Please provide 'user_url' and 'urls' list in JSON body."}
 
-        # Scrape user URL
-        try:
-            output = scrape_page(user_url)
-            content = output.get("content", "")
-            if not content:
-                return {"error": f"Failed to scrape content from {user_url}"}
-            user_summary = summarize_with_cohere(content, query)
-        except Exception as e:
-            return {"error": f"Error processing user URL: {str(e)}"}
-
-        # Scrape competitor URLs
-        summaries_list = []
-        for url in urls:
-            try:
-                output = scrape_page(url)
-                content = output.get("content", "")
-                if content:
-                    summary = summarize_with_cohere(content, query)
-                    summaries_list.append({"url": url, "summary": summary})
-                else:
-                    summaries_list.append({"url": url, "summary": "Failed to scrape content"})
-            except Exception as e:
-                summaries_list.append({"url": url, "summary": f"Error: {str(e)}"})
-
-        summaries.append({"user_summary": user_summary, "competitor_summaries": summaries_list})
-        return {"count": len(urls), "user_summary": user_summary, "competitor_summaries": summaries_list}
+        return await submit_job(
+            "summary",
+            summarize_pages(request.app.state.fetcher, user_url, urls, query, bool(body.get("use_index"))),
+            background=bool(body.get("background"))
+        )
     
     except Exception as e:
         return {"error": f"Server error: {str(e)}"}
 
 
+async def answer_query(query: str, use_cache: bool = True) -> dict:
+    """
+    The AI answer to a query. An earlier answer to the same or a reworded
+    question is reused unless use_cache is off; "cached" says which.
+    """
+    if use_cache:
+        response, match = answer_cache.get(query, ANSWER_MODEL)
+        if response is not None:
+            return {"query": query, "response": response, "cached": match}
+    else:
+        answer_cache.bypass()
+
+    response = await query_groq_llm_async(query, ANSWER_MODEL)
+    if response:
+        answer_cache.put(query, ANSWER_MODEL, response)
+    return {"query": query, "response": response, "cached": None}
+
+
 @app.post("/generate_llm_response")
 async def generate_llm_response(request: Request):
     try:
@@ -198,46 +526,24 @@ async def generate_llm_response(request: Request):
         user_query = body.get("query")
         if not user_query:
             return {"error": "Please provide 'query' in JSON body."}
-        response = query_groq_llm(user_query)
-        summaries.append({"llm_resp":response})
-        return {"response":response}
+        return await submit_job(
+            "llm_response", answer_query(user_query, not body.get("no_cache")), background=bool(body.get("background"))
+        )
     except Exception as e:
         return {"error": f"Server error: {str(e)}"}
 
-@app.post("/compare")
-async def compare():
-    try:
-        if len(summaries) < 2:
-            return {
-                "error": "Not enough data. Call /generate/summary and /generate_llm_response first."
-            }
-        llm_resp = None
-        user_summary = None
-        competitor_summaries = None
-
-        for item in reversed(summaries):
-            if "llm_resp" in item and llm_resp is None:
-                llm_resp = item["llm_resp"]
-            if "user_summary" in item and user_summary is None:
-                user_summary = item["user_summary"]
-                competitor_summaries = item["competitor_summaries"]
-
-            if llm_resp and user_summary and competitor_summaries:
-                break
-
-        if not llm_resp or not user_summary or not competitor_summaries:
-            return {"error": "Missing required summaries for comparison."}
-
-        # Build competitor text
-        competitor_text = ""
-        for comp in competitor_summaries:
-            competitor_text += f"""
+
+def build_compare_prompt(llm_resp: str, user_summary: str, competitor_summaries: List[dict]) -> str:
+    # Build competitor text
+    competitor_text = ""
+    for comp in competitor_summaries:
+        competitor_text += f"""
 URL: {comp['url']}
 Summary:
 {comp['summary']}
 """
 
-        final_prompt = f"""
+    return f"""
 {PROMPT}
 
 === AI GENERATED ANSWER ===
@@ -250,10 +556,411 @@ Summary:
 {competitor_text}
 """
 
-        geo_analysis = query_groq_llm(final_prompt)
 
-        return {
-            "geo_analysis": geo_analysis
-        }
+def local_scores(summary: dict, llm: dict) -> dict:
+    """Relevance percents of the user page and each competitor, scored locally from their chunks."""
+    pages = [[c["text"] for c in summary.get("user_chunks", [])]]
+    pages += [comp.get("chunks", []) for comp in summary["competitor_summaries"]]
+    results = score_pages(llm["response"], pages)
+    return {
+        "user": results[0]["relevance_percent"],
+        "competitors": [r["relevance_percent"] for r in results[1:]]
+    }
+
+
+async def rank_competitors(summary: dict, llm: dict, k: int = None):
+    """Return (scores, selected): local scores and the indices of the competitors worth an LLM pass."""
+    scores = await asyncio.to_thread(local_scores, summary, llm)
+    selected = top_k(scores["competitors"], COMPARE_TOP_K if k is None else k)
+    return scores, selected
+
+
+def url_key(url) -> str:
+    """Compare URLs the way a model may echo them: case, whitespace and a trailing slash don't count."""
+    return url.strip().rstrip("/").lower() if isinstance(url, str) else ""
+
+
+def merge_single_analysis(geo_analysis: str, summary: dict, scores: dict, selected: List[int]) -> str:
+    """
+    Apply local scores to a single-prompt analysis and add the competitors
+    that were left out of the prompt. Unparseable output is returned as is.
+    """
+    data = parse_json_reply(geo_analysis)
+    url_analysis = data.get("url_analysis") if isinstance(data, dict) else None
+    if not isinstance(url_analysis, dict):
+        return geo_analysis
+
+    competitor_summaries = summary["competitor_summaries"]
+    items = [item for item in url_analysis.get("competitors") or [] if isinstance(item, dict)]
+    # Match analyses on their URL; the model may drop or reorder competitors
+    unmatched = {}
+    for index in selected:
+        unmatched.setdefault(url_key(competitor_summaries[index]["url"]), []).append(index)
+    analyses = {}
+    for item in items:
+        indices = unmatched.get(url_key(item.get("url")))
+        if indices:
+            analyses[indices.pop(0)] = item
+    # Only an analysis without a URL falls back to its position in the prompt
+    for position, item in enumerate(items):
+        if url_key(item.get("url")) or position >= len(selected) or selected[position] in analyses:
+            continue
+        item["url"] = competitor_summaries[selected[position]]["url"]
+        analyses[selected[position]] = item
+    user = url_analysis.get("user_url") if isinstance(url_analysis.get("user_url"), dict) else None
+    user, competitors = with_local_scores(user, analyses, competitor_summaries, scores)
+    url_analysis["user_url"] = user
+    url_analysis["competitors"] = competitors
+    return json.dumps(data)
+
+
+async def compare_jobs(summary: dict, llm: dict, mode: str = None, k: int = None) -> dict:
+    competitor_summaries = summary["competitor_summaries"]
+    scores, selected = await rank_competitors(summary, llm, k)
+    if use_map_reduce(mode, len(selected)):
+        geo_analysis = await map_reduce_compare(
+            llm["response"], summary.get("user_url"), summary["user_summary"], competitor_summaries,
+            scores, selected
+        )
+        return {"geo_analysis": geo_analysis, "mode": "map_reduce", "relevance": scores}
+
+    final_prompt = build_compare_prompt(
+        llm["response"], summary["user_summary"], [competitor_summaries[i] for i in selected]
+    )
+    geo_analysis = await query_groq_llm_async(final_prompt)
+    geo_analysis = merge_single_analysis(geo_analysis, summary, scores, selected)
+    return {"geo_analysis": geo_analysis, "mode": "single", "relevance": scores}
+
+
+def parse_count(body: dict, name: str):
+    """Return (n, error) for an optional whole number >= 0 in a request body (None when absent)."""
+    value = body.get(name)
+    if value is None:
+        return None, None
+    try:
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise ValueError(value)
+        n = int(value)
+    except (TypeError, ValueError):
+        n = -1
+    if n < 0:
+        return None, f"'{name}' must be a whole number, 0 or more."
+    return n, None
+
+
+def parse_top_k(body: dict):
+    """Return (k, error) for the optional "top_k" of a request body (None = COMPARE_TOP_K, 0 = all)."""
+    return parse_count(body, "top_k")
+
+
+def load_compare_inputs(body: dict):
+    """Return (summary, llm, top_k, error) for a /compare request body."""
+    k, error = parse_top_k(body)
+    if error:
+        return None, None, None, error
+    summary, error = load_job_result(body.get("summary_job_id"), "summary")
+    if error:
+        return None, None, None, error
+    llm, error = load_job_result(body.get("llm_job_id"), "llm_response")
+    if error:
+        return None, None, None, error
+
+    if not llm.get("response") or not summary.get("user_summary") or not summary.get("competitor_summaries"):
+        return None, None, None, "Missing required summaries for comparison."
+    return summary, llm, k, None
+
+
+@app.post("/compare")
+async def compare(request: Request):
+    try:
+        body = await request.json()
+        summary, llm, k, error = load_compare_inputs(body)
+        if error:
+            return {"error": error}
+
+        return await submit_job(
+            "compare",
+            compare_jobs(summary, llm, body.get("mode"), k),
+            background=bool(body.get("background"))
+        )
+    except Exception as e:
+        return {"error": f"Server error: {str(e)}"}
+
+
+async def monitor_compare(watch: dict, summary: dict) -> dict:
+    """Re-run the GEO comparison of a watch from its stored summaries."""
+    llm = await answer_query(watch["query"])
+    if not llm.get("response"):
+        return {"error": "Failed to generate the AI answer."}
+    summary = dict(summary, user_chunks=chunk_previews(summary["user_chunks"]))
+    return await compare_jobs(summary, llm, watch.get("mode"), watch.get("top_k"))
+
+
+monitor = Monitor(monitor_compare)
+
+
+def monitor_section_counts():
+    stats = monitor.stats()
+    return {("summarized",): stats["sections_summarized"], ("reused",): stats["sections_reused"]}
+
+
+if METRICS_ENABLED:
+    registry.collect(
+        "geo_monitor_sections_total", "counter", "Sections of watched pages summarized again or reused",
+        ["result"], monitor_section_counts
+    )
+
+
+@app.post("/monitor")
+async def create_watch(request: Request):
+    """
+    Watch a user page and its competitors for a query. Pages are rechecked
+    every interval seconds; only changed sections are summarized again, and
+    the comparison is re-run once the change since the last one reaches threshold.
+    """
+    try:
+        body = await request.json()
+        query = body.get("query")
+        user_url = body.get("user_url")
+        urls: List[str] = body.get("urls", [])
+        if not query or not user_url or not urls:
+            return {"error": "Please provide 'query', 'user_url' and 'urls' list in JSON body."}
+        k, error = parse_top_k(body)
+        if error:
+            return {"error": error}
+        if monitor.store.count() >= MONITOR_MAX_WATCHES:
+            return {"error": f"Too many watches (max {MONITOR_MAX_WATCHES}). Delete one first."}
+        watch = new_watch(
+            query, user_url, urls,
+            interval=float(body.get("interval", MONITOR_INTERVAL)),
+            threshold=float(body.get("threshold", MONITOR_THRESHOLD)),
+            mode=body.get("mode"), top_k=k
+        )
+    except Exception as e:
+        return {"error": f"Server error: {str(e)}"}
+    return watch_view(monitor.add(watch), detail=False)
+
+
+@app.get("/monitor")
+async def list_watches():
+    return {"watches": [watch_view(watch, detail=False) for watch in monitor.store.all()], "stats": monitor.stats()}
+
+
+@app.get("/monitor/{watch_id}")
+async def get_watch(watch_id: str):
+    """A watch's pages, the diff of its last check and its latest comparison."""
+    watch = monitor.store.get(watch_id)
+    if watch is None:
+        return {"error": f"Unknown watch: {watch_id}"}
+    return watch_view(watch)
+
+
+@app.post("/monitor/{watch_id}/run")
+async def run_watch(watch_id: str):
+    """Check a watch now instead of waiting for its next scheduled run."""
+    return await monitor.run_now(watch_id)
+
+
+@app.delete("/monitor/{watch_id}")
+async def delete_watch(watch_id: str):
+    if not monitor.store.delete(watch_id):
+        return {"error": f"Unknown watch: {watch_id}"}
+    return {"deleted": watch_id}
+
+
+
+# Parts of the GEO analysis JSON sent to the client as soon as they close
+STREAM_SECTIONS = [
+    ("overall_alignment",),
+    ("url_analysis", "user_url"),
+    ("url_analysis", "competitors", ANY_INDEX),
+]
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def compare_failed(job_id: str, e: Exception) -> str:
+    """Record a streamed comparison's error in its job and return the error event."""
+    error = f"Server error: {str(e)}"
+    jobs.finish(job_id, error=error)
+    return sse_event("error", {"error": error})
+
+
+async def stream_map_reduce(job_id: str, summary: dict, llm: dict, scores: dict, selected: List[int]):
+    """Map-reduce variant of stream_compare: sections arrive as each per-page call finishes."""
+    user = None
+    analyses = {}
+    try:
+        async for section in map_sections(llm["response"], summary.get("user_url"), summary["user_summary"],
+                                          [summary["competitor_summaries"][i] for i in selected]):
+            if section[0] == "user_url":
+                user = section[1]
+                user["relevance_percent"] = scores["user"]
+                yield sse_event("user_url", user)
+            else:
+                index = selected[section[1]]
+                analyses[index] = section[2]
+                analyses[index]["relevance_percent"] = scores["competitors"][index]
+                yield sse_event("competitor", {"index": index, "analysis": analyses[index]})
+    except Exception as e:
+        yield compare_failed(job_id, e)
+        return
+
+    user, competitors = with_local_scores(user, analyses, summary["competitor_summaries"], scores)
+    for index, analysis in enumerate(competitors):
+        if index not in analyses:
+            yield sse_event("competitor", {"index": index, "analysis": analysis})
+    analysis = reduce_analysis(summary.get("user_url"), user, competitors)
+    yield sse_event("overall_alignment", analysis["overall_alignment"])
+    geo_analysis = json.dumps(analysis)
+    jobs.finish(job_id, result={"geo_analysis": geo_analysis, "mode": "map_reduce", "relevance": scores})
+    yield sse_event("done", {"job_id": job_id, "geo_analysis": geo_analysis})
+
+
+async def stream_compare(summary: dict, llm: dict, mode: str = None, k: int = None, job_id: str = None):
+    """
+    Yield server-sent events for a comparison: raw tokens, each completed
+    section of the analysis, and finally the full text. The result is also
+    stored as a compare job (a new one unless job_id is given).
+    """
+    job_id = job_id or jobs.create("compare")["job_id"]
+    yield sse_event("job", {"job_id": job_id})
+
+    try:
+        scores, selected = await rank_competitors(summary, llm, k)
+    except Exception as e:
+        yield compare_failed(job_id, e)
+        return
+    yield sse_event("relevance", scores)
+    if use_map_reduce(mode, len(selected)):
+        async for event in stream_map_reduce(job_id, summary, llm, scores, selected):
+            yield event
+        return
+
+    final_prompt = build_compare_prompt(
+        llm["response"], summary["user_summary"], [summary["competitor_summaries"][i] for i in selected]
+    )
+    scanner = JSONStreamScanner(STREAM_SECTIONS)
+    parts = []
+    try:
+        async for token in stream_groq_llm(final_prompt):
+            parts.append(token)
+            yield sse_event("token", {"text": token})
+            for path, value in scanner.feed(token):
+                if path[0] == "overall_alignment":
+                    yield sse_event("overall_alignment", value)
+                elif not isinstance(value, dict):
+                    continue
+                elif path[-1] == "user_url":
+                    value["relevance_percent"] = scores["user"]
+                    yield sse_event("user_url", value)
+                elif path[-1] < len(selected):
+                    index = selected[path[-1]]
+                    value["relevance_percent"] = scores["competitors"][index]
+                    yield sse_event("competitor", {"index": index, "analysis": value})
+    except Exception as e:
+        yield compare_failed(job_id, e)
+        return
+
+    geo_analysis = merge_single_analysis("".join(parts).strip(), summary, scores, selected)
+    jobs.finish(job_id, result={"geo_analysis": geo_analysis, "mode": "single", "relevance": scores})
+    yield sse_event("done", {"job_id": job_id, "geo_analysis": geo_analysis})
+
+
+@app.post("/compare/stream")
+async def compare_stream(request: Request):
+    try:
+        body = await request.json()
+        summary, llm, k, error = load_compare_inputs(body)
+        if error:
+            return {"error": error}
+    except Exception as e:
+        return {"error": f"Server error: {str(e)}"}
+
+    return StreamingResponse(
+        stream_compare(summary, llm, body.get("mode"), k),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+async def stream_analyze(fetcher: AsyncFetcher, query: str, user_url: str, urls: List[str],
+                         mode: str = None, k: int = None, use_index: bool = False, use_cache: bool = True):
+    """
+    Full analysis in one stream. The AI answer and the page scraping and
+    summarization run concurrently; the comparison starts as soon as both are
+    done, so the total is about max(answer, summaries) + compare. Each step is
+    stored as a job, and "stage" events report progress.
+    """
+    started = time.perf_counter()
+    llm_job_id = jobs.create("llm_response")["job_id"]
+    summary_job_id = jobs.create("summary")["job_id"]
+    yield sse_event("jobs", {"llm_job_id": llm_job_id, "summary_job_id": summary_job_id})
+
+    stages = {
+        asyncio.create_task(run_job(llm_job_id, answer_query(query, use_cache))): ("answer", llm_job_id),
+        asyncio.create_task(run_job(summary_job_id, summarize_pages(fetcher, user_url, urls, query, use_index))):
+            ("summary", summary_job_id),
+    }
+    for stage, _ in stages.values():
+        yield sse_event("stage", {"stage": stage, "status": "running", "elapsed_ms": 0})
+
+    results = {}
+    pending = set(stages)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                stage, _ = stages[task]
+                result = task.result()
+                if "error" in result:
+                    yield sse_event("stage", {"stage": stage, "status": "error", "elapsed_ms": elapsed_ms(started)})
+                    yield sse_event("error", {"error": result["error"]})
+                    return
+                results[stage] = result
+                yield sse_event("stage", {"stage": stage, "status": "done", "elapsed_ms": elapsed_ms(started)})
+                yield sse_event(stage, result)
+    finally:
+        # On an error or a client disconnect, don't leave the other step running
+        for task in pending:
+            task.cancel()
+            jobs.finish(stages[task][1], error="Cancelled")
+
+    compare_job_id = jobs.create("compare")["job_id"]
+    yield sse_event("stage", {"stage": "compare", "status": "running", "elapsed_ms": elapsed_ms(started)})
+    async for event in stream_compare(results["summary"], results["answer"], mode, k, compare_job_id):
+        yield event
+    job = jobs.get(compare_job_id)
+    status = "done" if job and job["status"] == DONE else "error"
+    yield sse_event("stage", {"stage": "compare", "status": status, "elapsed_ms": elapsed_ms(started)})
+
+
+@app.post("/analyze")
+async def analyze(request: Request):
+    try:
+        body = await request.json()
+        query = body.get("query")
+        user_url = body.get("user_url")
+        urls: List[str] = body.get("urls", [])
+        if not query or not user_url or not urls:
+            return {"error": "Please provide 'query', 'user_url' and 'urls' list in JSON body."}
+        k, error = parse_top_k(body)
+        if error:
+            return {"error": error}
     except Exception as e:
         return {"error": f"Server error: {str(e)}"}
+
+    return StreamingResponse(
+        stream_analyze(
+            request.app.state.fetcher, query, user_url, urls,
+            body.get("mode"), k, bool(body.get("use_index")), not body.get("no_cache")
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,216 @@
+"""
+Map-reduce GEO comparison.
+
+Instead of one prompt holding every competitor summary, each page is
+analyzed against the AI answer in its own small prompt (map), concurrently.
+The results are merged deterministically into the same JSON structure the
+single-prompt /compare returns (reduce). Per-call tokens stay bounded no
+matter how many competitors are compared.
+"""
+import asyncio
+import json
+import os
+import re
+
+from llm import query_groq_llm_async
+
+COMPARE_CONCURRENCY = max(1, int(os.getenv("COMPARE_CONCURRENCY", "8")))
+MAP_MAX_TOKENS = int(os.getenv("MAP_MAX_TOKENS", "600"))
+# Above this many competitors, /compare switches to map-reduce automatically
+MAP_REDUCE_THRESHOLD = int(os.getenv("MAP_REDUCE_THRESHOLD", "5"))
+
+MAP_PROMPT = """
+You are a Generative Engine Optimization (GEO) analyst.
+
+Analyze how ONE webpage aligns with an AI-generated answer:
+- Which topics from the AI answer are present, and which are missing or weak
+- Approximate relevance percentage (0-100)
+- Content structure used (definitions, steps, lists, examples, FAQs), its strengths and gaps
+- Which content elements generative models would reuse or prefer
+Focus on clarity, structure, and completeness. Do NOT mention SEO keywords or search engines.
+
+Return ONLY valid JSON in this structure:
+{schema}
+
+=== AI GENERATED ANSWER ===
+{answer}
+
+=== {label} ===
+URL: {url}
+Summary:
+{summary}
+"""
+
+USER_SCHEMA = """{
+  "relevance_percent": number,
+  "topics_covered": [string],
+  "topics_missing": [string],
+  "structural_strengths": [string],
+  "structural_gaps": [string],
+  "ai_preferred_elements": [string],
+  "geo_recommendations": [
+    {
+      "recommendation": string,
+      "why_it_helps_ai_generation": string
+    }
+  ]
+}
+For geo_recommendations, answer in depth: "What should be added or modified so that
+generative AI engines can better understand, extract, and reuse this content?\""""
+
+COMPETITOR_SCHEMA = """{
+  "relevance_percent": number,
+  "topics_covered": [string],
+  "topics_missing": [string],
+  "structural_strengths": [string],
+  "structural_gaps": [string],
+  "ai_preferred_elements": [string],
+  "geo_recommendations": [string]
+}
+Keep geo_recommendations brief."""
+
+LIST_FIELDS = ["topics_covered", "topics_missing", "structural_strengths", "structural_gaps", "ai_preferred_elements"]
+
+
+def parse_json_reply(text: str) -> dict:
+    """Parse a model reply that should be a JSON object, tolerating code fences and chatter."""
+    cleaned = re.sub(r"```(?:json)?", "", text or "").strip()
+    try:
+        return json.loads(cleaned)
+    except ValueError:
+        match = re.search(r"\{.*\}", cleaned, re.S)
+        if match:
+            try:
+                return json.loads(match.group(0))
+            except ValueError:
+                pass
+    return {}
+
+
+def _clean_analysis(data: dict, url: str = None) -> dict:
+    """Fill in missing fields so every page analysis has the full shape."""
+    analysis = {"url": url} if url is not None else {}
+    try:
+        analysis["relevance_percent"] = max(0, min(100, int(float(data.get("relevance_percent", 0)))))
+    except (TypeError, ValueError):
+        analysis["relevance_percent"] = 0
+    for field in LIST_FIELDS:
+        value = data.get(field)
+        analysis[field] = [str(v) for v in value] if isinstance(value, list) else []
+    recommendations = data.get("geo_recommendations")
+    analysis["geo_recommendations"] = recommendations if isinstance(recommendations, list) else []
+    return analysis
+
+
+async def _map_page(answer: str, label: str, schema: str, url: str, summary: str, semaphore) -> dict:
+    prompt = MAP_PROMPT.format(schema=schema, answer=answer, label=label, url=url, summary=summary)
+    async with semaphore:
+        try:
+            reply = await query_groq_llm_async(prompt, max_tokens=MAP_MAX_TOKENS)
+        except Exception as e:
+            print(f"Map step failed for {url}: {e}")
+            reply = ""
+    return parse_json_reply(reply)
+
+
+async def map_sections(llm_resp: str, user_url: str, user_summary: str, competitor_summaries: list):
+    """
+    Run every per-page analysis concurrently and yield them as they finish:
+    ("user_url", analysis) once and ("competitor", index, analysis) per competitor.
+    """
+    semaphore = asyncio.Semaphore(COMPARE_CONCURRENCY)
+
+    async def user_task():
+        data = await _map_page(llm_resp, "USER PAGE SUMMARY", USER_SCHEMA, user_url, user_summary, semaphore)
+        return ("user_url", _clean_analysis(data))
+
+    async def competitor_task(index, comp):
+        data = await _map_page(llm_resp, "COMPETITOR PAGE SUMMARY", COMPETITOR_SCHEMA,
+                               comp["url"], comp["summary"], semaphore)
+        return ("competitor", index, _clean_analysis(data, comp["url"]))
+
+    tasks = [user_task()] + [competitor_task(i, comp) for i, comp in enumerate(competitor_summaries)]
+    for finished in asyncio.as_completed(tasks):
+        yield await finished
+
+
+def _topic_set(topics: list) -> dict:
+    return {t.strip().lower(): t.strip() for t in topics if t and t.strip()}
+
+
+def reduce_analysis(user_url: str, user: dict, competitors: list) -> dict:
+    """
+    Deterministically merge per-page analyses into the /compare JSON structure.
+    """
+    user_topics = _topic_set(user["topics_covered"])
+    competitor_topics = {}
+    for comp in competitors:
+        for key, topic in _topic_set(comp["topics_covered"]).items():
+            competitor_topics.setdefault(key, topic)
+
+    user["comparison_with_competitors"] = {
+        "advantages": [t for k, t in user_topics.items() if k not in competitor_topics][:10],
+        "disadvantages": [t for k, t in competitor_topics.items() if k not in user_topics][:10]
+    }
+
+    # Ties go to the user's page, then to the earliest competitor
+    best_url, best = user_url, user
+    for comp in competitors:
+        if comp["relevance_percent"] > best["relevance_percent"]:
+            best_url, best = comp["url"], comp
+    covered = ", ".join(best["topics_covered"][:3])
+    reason = f"Highest relevance to the AI answer ({best['relevance_percent']}%)"
+    if covered:
+        reason += f"; covers {covered}"
+
+    return {
+        "overall_alignment": {"most_aligned_url": best_url, "reason": reason},
+        "url_analysis": {"user_url": user, "competitors": competitors}
+    }
+
+
+def with_local_scores(user: dict, analyses: dict, competitor_summaries: list, scores: dict = None):
+    """
+    Apply the local relevance scores and fill in competitors that were not
+    sent to the LLM. analyses maps competitor index to its analysis.
+    Returns (user, competitors) with competitors in input order.
+    """
+    competitors = []
+    for index, comp in enumerate(competitor_summaries):
+        analysis = analyses.get(index)
+        if analysis is None:
+            analysis = dict(_clean_analysis({}, comp["url"]), llm_analyzed=False)
+        if scores:
+            analysis["relevance_percent"] = scores["competitors"][index]
+        competitors.append(analysis)
+    if scores and user is not None:
+        user["relevance_percent"] = scores["user"]
+    return user, competitors
+
+
+async def map_reduce_compare(llm_resp: str, user_url: str, user_summary: str, competitor_summaries: list,
+                             scores: dict = None, selected: list = None) -> str:
+    """
+    Run the map-reduce comparison and return the analysis as a JSON string.
+    Only the competitors at the selected indices are analyzed by the LLM.
+    """
+    if selected is None:
+        selected = list(range(len(competitor_summaries)))
+    user = None
+    analyses = {}
+    async for section in map_sections(llm_resp, user_url, user_summary,
+                                      [competitor_summaries[i] for i in selected]):
+        if section[0] == "user_url":
+            user = section[1]
+        else:
+            analyses[selected[section[1]]] = section[2]
+    user, competitors = with_local_scores(user, analyses, competitor_summaries, scores)
+    return json.dumps(reduce_analysis(user_url, user, competitors))
+
+
+def use_map_reduce(mode: str, competitor_count: int) -> bool:
+    if mode == "map_reduce":
+        return True
+    if mode == "single":
+        return False
+    return competitor_count > MAP_REDUCE_THRESHOLD
@@ -0,0 +1,277 @@
+"""
+Stage timings and counters in the Prometheus text format.
+
+timed(stage) wraps a function (plain, async or async generator) and records
+its latency histogram, error count and in-flight gauge under that stage
+label. Traced requests also collect their stage timings, which the apps
+return in a Server-Timing header. Counters from caches and the LLM gateway
+are read when /metrics is scraped.
+
+With METRICS_ENABLED=0, timed returns functions unchanged and every metric
+update returns right away, so the instrumentation costs nothing.
+"""
+import bisect
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+# Trace every request; otherwise only requests sent with an "X-Trace: 1" header are traced
+TRACE_REQUESTS = os.getenv("TRACE_REQUESTS", "0") != "0"
+TRACE_HEADER = "X-Trace"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; Lighthouse runs and long LLM calls land in the upper buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_trace = ContextVar("trace", default=None)
+
+
+def _label_text(names, values, extra: str = "") -> str:
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_label_text(self.labels, labels)} {_number(value)}" for labels, value in values
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then the sum
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        with self._lock:
+            values = sorted((labels, list(series)) for labels, series in self._values.items())
+        lines = self._header()
+        for labels, series in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = 'le="{}"'.format(bound if bound == "+Inf" else _number(float(bound)))
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Collected(_Metric):
+    """A metric whose values are read from a callback when it is rendered."""
+
+    def __init__(self, name: str, kind: str, help_text: str, labels=()):
+        super().__init__(name, help_text, labels)
+        self.kind = kind
+        self._sources = []
+
+    def add_source(self, fn):
+        """fn() returns {label values tuple: value}."""
+        self._sources.append(fn)
+
+    def render(self) -> list:
+        values = {}
+        for fn in self._sources:
+            try:
+                values.update(fn())
+            except Exception as e:
+                print(f"Metrics collection error for {self.name}: {e}")
+        return self._header() + [
+            f"{self.name}{_label_text(self.labels, labels)} {_number(value)}" for labels, value in sorted(values.items())
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labels=()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels=()) -> Gauge:
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def collect(self, name: str, kind: str, help_text: str, labels, fn):
+        """Register a callback metric; several callbacks can feed the same name."""
+        self._add(Collected(name, kind, help_text, labels)).add_source(fn)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram("geo_stage_seconds", "Time spent in each pipeline stage", ["stage"])
+STAGE_ERRORS = registry.counter("geo_stage_errors_total", "Stage calls that raised an exception", ["stage"])
+STAGE_INFLIGHT = registry.gauge("geo_stage_inflight", "Stage calls currently running", ["stage"])
+FETCH_BYTES = registry.counter("geo_fetch_bytes_total", "Response body bytes read by the fetcher")
+LLM_TOKENS = registry.counter("geo_llm_tokens_total", "Tokens reported by Groq", ["model", "kind"])
+
+
+def register_cache(name: str, stats, hit_key: str = "hits", miss_key: str = "misses"):
+    """Report a cache's hit and miss counters (read from stats()) as geo_cache_lookups_total."""
+    def lookups():
+        counters = stats()
+        return {(name, "hit"): counters[hit_key], (name, "miss"): counters[miss_key]}
+
+    registry.collect("geo_cache_lookups_total", "counter", "Cache lookups by result", ["cache", "result"], lookups)
+
+
+# ----- stages and traces
+
+@contextmanager
+def stage(name: str):
+    """Time a block as one call of the named stage."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    STAGE_INFLIGHT.inc(name)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_INFLIGHT.dec(name)
+        STAGE_SECONDS.observe(elapsed, name)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((name, elapsed))
+
+
+def timed(name: str):
+    """Decorator form of stage(); functions are returned unchanged when metrics are disabled."""
+    def decorate(fn):
+        if not METRICS_ENABLED:
+            return fn
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with stage(name):
+                    async for item in fn(*args, **kwargs):
+                        yield item
+        elif inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with stage(name):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def wants_trace(headers) -> bool:
+    return METRICS_ENABLED and (TRACE_REQUESTS or headers.get(TRACE_HEADER) == "1")
+
+
+def start_trace():
+    """Collect stage timings for the current request (and tasks it starts). Returns a token for finish_trace."""
+    return _trace.set([])
+
+
+def finish_trace(token) -> list:
+    """Stop tracing and return [(stage, seconds)] in the order the stages finished."""
+    trace = _trace.get()
+    _trace.reset(token)
+    return list(trace or [])
+
+
+def server_timing(trace: list) -> str:
+    """Server-Timing header value: total milliseconds and call count per stage."""
+    totals = {}
+    for name, seconds in trace:
+        total, calls = totals.get(name, (0.0, 0))
+        totals[name] = (total + seconds, calls + 1)
+    return ", ".join(
+        f'{name};dur={total * 1000:.1f};desc="{calls} call{"s" if calls != 1 else ""}"'
+        for name, (total, calls) in totals.items()
+    )
+
+
+async def trace_requests(request, call_next):
+    """ASGI "http" middleware: return the stage timings of traced requests in a Server-Timing header."""
+    if not wants_trace(request.headers):
+        return await call_next(request)
+    token = start_trace()
+    try:
+        response = await call_next(request)
+    finally:
+        trace = finish_trace(token)
+    # Streamed responses send their headers before any stage has finished
+    if trace:
+        response.headers["Server-Timing"] = server_timing(trace)
+    return response
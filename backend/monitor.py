@@ -0,0 +1,500 @@
+"""
+Incremental competitor monitoring.
+
+A watch tracks a user page and its competitors for one query and rechecks
+them every `interval` seconds with scrape_page. Pages are split into
+sections at their h1/h2 headings (deeper headings stay inside their parent
+section), and each section is fingerprinted by a hash of its text and a
+MinHash signature of its word shingles. On a recheck:
+
+- a section whose hash is unchanged keeps its stored summary, and a page
+  with no changed section keeps its page summary, so it costs no LLM call;
+- changed and new sections are summarized again, and the page summary is
+  merged from the section summaries;
+- the signatures estimate how much of each changed section was rewritten,
+  which, weighted by words, gives the page's and the watch's change.
+
+Change accumulates across checks until it reaches the watch's threshold;
+only then is the GEO comparison run again. LLM calls therefore scale with
+the number of changed sections, not with the number of pages watched.
+
+The scheduler runs due watches in the background. Fetches to one domain
+start at least MONITOR_DOMAIN_DELAY seconds apart, across all watches.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from cache import content_hash, minhash, normalize_text
+from chunker import chunk_sections, sections_from_text
+from crawler import scrape_page_async
+from fetcher import AsyncFetcher
+from summary import SUMMARY_ERROR_PREFIX, merge_summaries_async, summarize_with_cohere_async
+
+MONITOR_INTERVAL = float(os.getenv("MONITOR_INTERVAL", "3600"))
+MONITOR_MIN_INTERVAL = float(os.getenv("MONITOR_MIN_INTERVAL", "60"))
+# Fraction of the watched text that must change before the comparison is run again
+MONITOR_THRESHOLD = float(os.getenv("MONITOR_THRESHOLD", "0.1"))
+MONITOR_DOMAIN_DELAY = float(os.getenv("MONITOR_DOMAIN_DELAY", "2"))
+# Pages checked at once, across all watches
+MONITOR_CONCURRENCY = max(1, int(os.getenv("MONITOR_CONCURRENCY", "4")))
+MONITOR_MAX_WATCHES = int(os.getenv("MONITOR_MAX_WATCHES", "100"))
+# Deepest heading level that starts a new monitored section
+MONITOR_SECTION_LEVEL = int(os.getenv("MONITOR_SECTION_LEVEL", "2"))
+# Longest the scheduler sleeps between looking for due watches
+MONITOR_TICK = 30.0
+SHINGLE_WORDS = 3
+
+
+# ----- sections, fingerprints and diffs
+
+def monitor_sections(page: dict) -> list:
+    """
+    Group a scraped page's sections at headings of level MONITOR_SECTION_LEVEL
+    or above. Returns [{"key", "heading", "text"}]; the key tells apart
+    sections with the same heading by their order.
+    """
+    groups = []
+    for section in page.get("sections") or sections_from_text(page.get("content", "")):
+        heading, text = section.get("heading"), section.get("text", "").strip()
+        if not groups or (heading and 0 < section.get("level", 0) <= MONITOR_SECTION_LEVEL):
+            groups.append({"heading": heading, "parts": [text] if text else []})
+        else:
+            block = f"{heading}\n{text}" if heading and text else (heading or text)
+            if block:
+                groups[-1]["parts"].append(block)
+
+    seen = {}
+    sections = []
+    for group in groups:
+        name = normalize_text(group["heading"]).lower()
+        seen[name] = seen.get(name, -1) + 1
+        sections.append({"key": f"{name}#{seen[name]}", "heading": group["heading"], "text": "\n".join(group["parts"])})
+    return sections
+
+
+def fingerprint(text: str) -> dict:
+    """Hash, word count and shingle MinHash of a section's text."""
+    words = normalize_text(text).lower().split()
+    shingles = frozenset(
+        " ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))
+    )
+    return {"hash": content_hash(text), "words": len(words), "minhash": minhash(shingles).tolist()}
+
+
+def similarity(a: list, b: list) -> float:
+    """Estimated Jaccard similarity of two sections' shingles."""
+    return float(np.mean(np.asarray(a) == np.asarray(b)))
+
+
+def diff_sections(old: list, new: list) -> dict:
+    """
+    Section-level diff of two fingerprinted section lists. Returns the
+    headings of added, removed and changed sections and "change", the
+    word-weighted fraction of the text that changed (0 to 1).
+    """
+    previous = {section["key"]: section for section in old}
+    current = {section["key"] for section in new}
+    added, removed, changed = [], [], []
+    changed_words = total_words = 0.0
+
+    for section in new:
+        before = previous.get(section["key"])
+        words = max(section["words"], before["words"] if before else 0)
+        total_words += words
+        if before is None:
+            added.append(section["heading"])
+            changed_words += words
+        elif before["hash"] != section["hash"]:
+            changed.append(section["heading"])
+            changed_words += words * (1 - similarity(before["minhash"], section["minhash"]))
+    for section in old:
+        if section["key"] not in current:
+            removed.append(section["heading"])
+            total_words += section["words"]
+            changed_words += section["words"]
+
+    return {
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "change": round(changed_words / total_words, 4) if total_words else 0.0
+    }
+
+
+class DomainLimiter:
+    """Starts requests to the same domain at least `delay` seconds apart."""
+
+    def __init__(self, delay: float = MONITOR_DOMAIN_DELAY):
+        self.delay = delay
+        self._next = {}
+
+    async def wait(self, url: str):
+        domain = urlsplit(url).netloc.lower()
+        domain = domain[4:] if domain.startswith("www.") else domain
+        now = time.monotonic()
+        # Reserve the next free turn right away, so waiters keep their order
+        turn = max(now, self._next.get(domain, 0.0))
+        self._next[domain] = turn + self.delay
+        if turn > now:
+            await asyncio.sleep(turn - now)
+
+
+# ----- watches
+
+class WatchStore:
+    """
+    Watches in memory, or in SQLite when db_path is set. The SQLite table is
+    read on every call, so workers sharing it see each other's watches and
+    the watches survive restarts.
+    """
+
+    def __init__(self, db_path: str = None):
+        self._watches = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS watches (watch_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            self._db.commit()
+
+    def all(self) -> list:
+        with self._lock:
+            if self._db is None:
+                return list(self._watches.values())
+            return [json.loads(data) for data, in self._db.execute("SELECT data FROM watches")]
+
+    def get(self, watch_id: str):
+        with self._lock:
+            if self._db is None:
+                return self._watches.get(watch_id)
+            row = self._db.execute("SELECT data FROM watches WHERE watch_id = ?", (watch_id,)).fetchone()
+            return json.loads(row[0]) if row else None
+
+    def count(self) -> int:
+        with self._lock:
+            if self._db is None:
+                return len(self._watches)
+            return self._db.execute("SELECT COUNT(*) FROM watches").fetchone()[0]
+
+    def due_times(self) -> list:
+        """(watch_id, next_run) of every watch, without loading the page states."""
+        with self._lock:
+            if self._db is None:
+                return [(watch["watch_id"], watch["next_run"]) for watch in self._watches.values()]
+            return self._db.execute("SELECT watch_id, json_extract(data, '$.next_run') FROM watches").fetchall()
+
+    def save(self, watch: dict):
+        with self._lock:
+            if self._db is None:
+                self._watches[watch["watch_id"]] = watch
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO watches (watch_id, data) VALUES (?, ?)",
+                (watch["watch_id"], json.dumps(watch))
+            )
+            self._db.commit()
+
+    def delete(self, watch_id: str) -> bool:
+        with self._lock:
+            if self._db is None:
+                return self._watches.pop(watch_id, None) is not None
+            found = self._db.execute("DELETE FROM watches WHERE watch_id = ?", (watch_id,)).rowcount > 0
+            self._db.commit()
+            return found
+
+
+def new_watch(query: str, user_url: str, urls: list, interval: float = MONITOR_INTERVAL,
+              threshold: float = MONITOR_THRESHOLD, mode: str = None, top_k: int = None) -> dict:
+    now = time.time()
+    return {
+        "watch_id": uuid.uuid4().hex,
+        "query": query,
+        "user_url": user_url,
+        "urls": urls,
+        "interval": max(MONITOR_MIN_INTERVAL, interval),
+        "threshold": threshold,
+        "mode": mode,
+        "top_k": top_k,
+        "created": now,
+        "next_run": now,
+        "last_run": None,
+        # Change since the last comparison, added up over checks
+        "pending_change": 0.0,
+        "pages": {},
+        "last_check": None,
+        "comparison": None,
+        "stats": {"checks": 0, "sections_summarized": 0, "sections_reused": 0, "comparisons": 0, "comparisons_skipped": 0}
+    }
+
+
+def watch_view(watch: dict, detail: bool = True) -> dict:
+    """A watch as returned by the API, without fingerprints and chunk texts."""
+    view = {
+        key: watch[key] for key in (
+            "watch_id", "query", "user_url", "urls", "interval", "threshold", "created", "next_run", "last_run",
+            "pending_change", "stats"
+        )
+    }
+    if not detail:
+        return view
+    view["pages"] = {
+        url: {
+            "summary": page.get("summary"),
+            "sections": [section["heading"] for section in page.get("sections", [])],
+            "checked": page.get("checked"),
+            "changed": page.get("changed"),
+            "error": page.get("error")
+        }
+        for url, page in watch["pages"].items()
+    }
+    view["last_check"] = watch["last_check"]
+    view["comparison"] = watch["comparison"]
+    return view
+
+
+class Monitor:
+    """
+    Checks watches on a schedule. compare_fn(watch, summary) runs the GEO
+    comparison; summary has the shape of a /generate/summary result, with
+    the user page's raw chunks in "user_chunks".
+    """
+
+    def __init__(self, compare_fn, store: WatchStore = None):
+        self.compare_fn = compare_fn
+        self.store = store or WatchStore(os.getenv("MONITOR_DB"))
+        self.limiter = DomainLimiter()
+        self.slots = asyncio.Semaphore(MONITOR_CONCURRENCY)
+        self.fetcher = None
+        self.counters = {"checks": 0, "sections_summarized": 0, "sections_reused": 0, "comparisons": 0,
+                         "comparisons_skipped": 0}
+        self._running = {}
+        self._scheduler = None
+        self._wake = None
+
+    # ----- scheduler
+
+    def start(self, fetcher: AsyncFetcher, schedule: bool = True):
+        self.fetcher = fetcher
+        self._wake = asyncio.Event()
+        if schedule:
+            self._scheduler = asyncio.create_task(self._schedule())
+
+    async def stop(self):
+        tasks = list(self._running.values())
+        if self._scheduler is not None:
+            tasks.append(self._scheduler)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def add(self, watch: dict) -> dict:
+        self.store.save(watch)
+        if self._wake is not None:
+            self._wake.set()
+        return watch
+
+    async def run_now(self, watch_id: str) -> dict:
+        """Check a watch right away (or wait for the check in progress) and return its last_check."""
+        watch = self.store.get(watch_id)
+        if watch is None:
+            return {"error": f"Unknown watch: {watch_id}"}
+        task = self._running.get(watch_id) or self._start(watch_id)
+        await asyncio.shield(task)
+        watch = self.store.get(watch_id)
+        return watch["last_check"] if watch is not None else {"error": f"Watch {watch_id} was deleted"}
+
+    async def _schedule(self):
+        while True:
+            now = time.time()
+            next_due = now + MONITOR_TICK
+            # Read from the store on every tick, so watches added by other workers are picked up
+            for watch_id, next_run in self.store.due_times():
+                if watch_id in self._running:
+                    continue
+                if next_run <= now:
+                    self._start(watch_id)
+                else:
+                    next_due = min(next_due, next_run)
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(0.0, next_due - time.time()))
+            except asyncio.TimeoutError:
+                pass
+
+    def _start(self, watch_id: str) -> asyncio.Task:
+        task = self._running[watch_id] = asyncio.create_task(self._run(watch_id))
+        return task
+
+    async def _run(self, watch_id: str):
+        try:
+            watch = self.store.get(watch_id)
+            if watch is not None:
+                await self.check(watch)
+        except Exception as e:
+            print(f"Monitor error for watch {watch_id}: {e}")
+        finally:
+            self._running.pop(watch_id, None)
+            watch = self.store.get(watch_id)
+            if watch is not None:
+                # Deleted watches are not saved again
+                watch["next_run"] = time.time() + watch["interval"]
+                self.store.save(watch)
+
+    # ----- checks
+
+    async def check(self, watch: dict) -> dict:
+        """Recheck every page of a watch, then compare again if enough has changed."""
+        started = time.time()
+        urls = [watch["user_url"], *watch["urls"]]
+        results = await asyncio.gather(*(self._check_page(watch, url) for url in urls))
+
+        changed_words = total_words = 0.0
+        summarized = reused = 0
+        pages = {}
+        for url, (state, diff, words, counts) in zip(urls, results):
+            watch["pages"][url] = state
+            pages[url] = diff
+            changed_words += diff.get("change", 0.0) * words
+            total_words += words
+            summarized += counts[0]
+            reused += counts[1]
+        change = round(changed_words / total_words, 4) if total_words else 0.0
+        watch["pending_change"] = round(watch["pending_change"] + change, 4)
+
+        self._count(watch, checks=1, sections_summarized=summarized, sections_reused=reused)
+
+        compared = False
+        if watch["pages"][watch["user_url"]].get("summary") and (
+            watch["comparison"] is None or watch["pending_change"] >= watch["threshold"]
+        ):
+            result = await self.compare_fn(watch, self._summary(watch))
+            if "error" in result:
+                print(f"Monitor comparison failed for watch {watch['watch_id']}: {result['error']}")
+            else:
+                watch["comparison"] = {"at": time.time(), "change": watch["pending_change"], "result": result}
+                watch["pending_change"] = 0.0
+                compared = True
+        self._count(watch, **{"comparisons" if compared else "comparisons_skipped": 1})
+
+        watch["last_run"] = started
+        watch["last_check"] = {
+            "at": started,
+            "duration_ms": round((time.time() - started) * 1000, 1),
+            "change": change,
+            "pages": pages,
+            "sections_summarized": summarized,
+            "sections_reused": reused,
+            "compared": compared
+        }
+        if self.store.get(watch["watch_id"]) is not None:
+            self.store.save(watch)
+        return watch["last_check"]
+
+    async def _check_page(self, watch: dict, url: str):
+        """Return (new page state, diff, words, (sections summarized, reused)) for one URL."""
+        previous = watch["pages"].get(url) or {}
+        # Take the domain turn only once a slot is held, so the fetch starts on that turn
+        async with self.slots:
+            await self.limiter.wait(url)
+            page = await scrape_page_async(url, self.fetcher)
+        now = time.time()
+        old_sections = previous.get("sections", [])
+        old_words = sum(section["words"] for section in old_sections)
+        if not page:
+            # Keep what we had, so an unreachable page doesn't count as removed
+            state = dict(previous, checked=now, error="Failed to scrape content")
+            return state, {"error": state["error"]}, old_words, (0, 0)
+
+        sections = []
+        for section in monitor_sections(page):
+            sections.append({"key": section["key"], "heading": section["heading"], **fingerprint(section["text"]),
+                             "text": section["text"]})
+        diff = diff_sections(old_sections, sections)
+
+        # Summaries follow the text, so a section that only moved keeps its summary
+        known = {section["hash"]: section["summary"] for section in old_sections if section.get("summary") is not None}
+        todo = [section for section in sections if section["hash"] not in known]
+        summaries = await asyncio.gather(
+            *(self._summarize_section(section["text"], watch["query"]) for section in todo)
+        )
+        known.update((section["hash"], summary) for section, summary in zip(todo, summaries) if summary is not None)
+        for section in sections:
+            section["summary"] = known.get(section["hash"])
+
+        page_summary = previous.get("summary")
+        hashes = [section["hash"] for section in sections]
+        if page_summary is None or hashes != [section["hash"] for section in old_sections]:
+            page_summary = await self._page_summary(sections, watch["query"])
+
+        state = {
+            # Section texts are only needed to build chunks, which are stored instead
+            "sections": [{key: value for key, value in section.items() if key != "text"} for section in sections],
+            "summary": page_summary,
+            "chunks": chunk_sections(page.get("sections") or sections_from_text(page.get("content", ""))),
+            "checked": now,
+            "changed": now if diff["added"] or diff["removed"] or diff["changed"] else previous.get("changed"),
+            "error": None if page_summary else "Failed to summarize content"
+        }
+        words = max(sum(section["words"] for section in sections), old_words)
+        return state, diff, words, (len(todo), len(sections) - len(todo))
+
+    async def _summarize_section(self, text: str, query: str):
+        """A section's summary, or None if summarizing failed (it is retried on the next check)."""
+        if not text.strip():
+            return ""
+        summary = await summarize_with_cohere_async(text, query)
+        return None if summary.startswith(SUMMARY_ERROR_PREFIX) else summary
+
+    async def _page_summary(self, sections: list, query: str):
+        """Merge the section summaries into the page summary (None until every section has one)."""
+        if any(section["summary"] is None for section in sections):
+            return None
+        summarized = [section for section in sections if section["summary"]]
+        if len(summarized) <= 1:
+            return summarized[0]["summary"] if summarized else None
+        parts = [
+            f"{section['heading']}: {section['summary']}" if section["heading"] else section["summary"]
+            for section in summarized
+        ]
+        try:
+            return await merge_summaries_async(parts, query)
+        except Exception as e:
+            print(f"Monitor merge error: {e}")
+            return None
+
+    def _summary(self, watch: dict) -> dict:
+        user = watch["pages"][watch["user_url"]]
+        competitors = []
+        for url in watch["urls"]:
+            page = watch["pages"].get(url) or {}
+            if page.get("summary"):
+                competitors.append(
+                    {"url": url, "summary": page["summary"], "chunks": [chunk["text"] for chunk in page["chunks"]]}
+                )
+            else:
+                competitors.append({"url": url, "summary": page.get("error") or "Failed to scrape content"})
+        return {
+            "count": len(watch["urls"]),
+            "user_url": watch["user_url"],
+            "user_summary": user["summary"],
+            "user_chunks": user["chunks"],
+            "competitor_summaries": competitors
+        }
+
+    def _count(self, watch: dict, **amounts):
+        for name, amount in amounts.items():
+            watch["stats"][name] += amount
+            self.counters[name] += amount
+
+    def stats(self) -> dict:
+        """Counters of this process since it started, plus the current watch count."""
+        return dict(self.counters, watches=self.store.count(), running=len(self._running))
@@ -0,0 +1,87 @@
+"""
+Persistent page cache for HTTP conditional requests.
+
+Stores the body, ETag, Last-Modified and parsed scrape_page output per URL,
+so a 304 Not Modified answer can skip both the download and the parse. Pages
+fetched only for their HTML (the site crawler) are stored without the parsed
+output; it is built from the body the first time scrape_page needs it.
+"""
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class PageCache:
+    def __init__(self, db_path: str):
+        self._db = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+            "body BLOB, page TEXT NOT NULL, fetched REAL NOT NULL, validated REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self.counters = {"not_modified": 0, "modified": 0, "stored": 0}
+
+    def get(self, url: str):
+        """Return the cached entry for a URL, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, page, body IS NOT NULL FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "page": json.loads(row[2]), "has_body": bool(row[3])}
+
+    def body(self, url: str):
+        """Return the cached raw HTML for a URL, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT body FROM pages WHERE url = ?", (url,)).fetchone()
+        return zlib.decompress(row[0]) if row and row[0] else None
+
+    def put(self, url: str, etag: str, last_modified: str, body, page: dict = None):
+        """Store a page with its raw HTML (body). page is None when it hasn't been parsed."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, body, page, fetched, validated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, zlib.compress(body) if body else None, json.dumps(page), now, now)
+            )
+            self._db.commit()
+            self.counters["stored"] += 1
+
+    def set_page(self, url: str, page: dict):
+        """Add the parsed output to a page stored without it."""
+        with self._lock:
+            self._db.execute("UPDATE pages SET page = ? WHERE url = ?", (json.dumps(page), url))
+            self._db.commit()
+
+    def mark_not_modified(self, url: str):
+        with self._lock:
+            self._db.execute("UPDATE pages SET validated = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+            self.counters["not_modified"] += 1
+
+    def mark_modified(self):
+        with self._lock:
+            self.counters["modified"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            return stats
+
+
+def conditional_headers(entry: dict, headers: dict = None) -> dict:
+    """Add If-None-Match / If-Modified-Since for a cached entry to the request headers."""
+    merged = dict(headers or {})
+    if entry.get("etag"):
+        merged["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        merged["If-Modified-Since"] = entry["last_modified"]
+    return merged
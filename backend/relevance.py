@@ -0,0 +1,105 @@
+"""
+Local relevance scoring of page chunks against the AI answer.
+
+Chunks and pages are turned into TF-IDF vectors over the vocabulary of the
+pages being compared, and all of them are scored against the answer with a
+single matrix-vector product. Everything runs on the CPU with NumPy, so
+relevance_percent no longer needs an LLM pass and is deterministic.
+"""
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+# Only the K most relevant competitors are sent to the LLM for analysis (0 = all)
+COMPARE_TOP_K = int(os.getenv("COMPARE_TOP_K", "3"))
+# A chunk counts as used by the AI answer at this cosine similarity or above...
+CHUNK_USE_THRESHOLD = float(os.getenv("CHUNK_USE_THRESHOLD", "0.1"))
+# ...and when it scores at least this fraction of the page's best chunk
+CHUNK_USE_RATIO = 0.5
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers him his how i if in into is it its itself just me more most my no nor not now of off on once
+only or other our ours out over own same she should so some such than that the their theirs them then
+there these they this those through to too under until up very was we were what when where which while
+who whom why will with would you your yours
+""".split())
+
+
+def tokenize(text: str) -> list:
+    return [t for t in _WORD_RE.findall((text or "").lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def _tfidf(docs: list, vocab: dict, idf: np.ndarray) -> np.ndarray:
+    """L2-normalized TF-IDF rows (sublinear tf) for tokenized docs."""
+    matrix = np.zeros((len(docs), len(vocab)), dtype=np.float32)
+    for row, tokens in enumerate(docs):
+        for token, count in Counter(tokens).items():
+            col = vocab.get(token)
+            if col is not None:
+                matrix[row, col] = 1.0 + math.log(count)
+    matrix *= idf
+    return _normalize(matrix)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def score_pages(answer: str, pages: list) -> list:
+    """
+    Score pages against the answer. pages is a list of pages, each a list of
+    chunk texts. Returns one {"relevance_percent", "chunk_scores"} per page,
+    where chunk_scores are cosine similarities in chunk order.
+    """
+    chunk_tokens = [tokenize(text) for page in pages for text in page]
+    sizes = [len(page) for page in pages]
+    answer_tokens = tokenize(answer)
+    if not chunk_tokens or not answer_tokens:
+        return [{"relevance_percent": 0, "chunk_scores": [0.0] * size} for size in sizes]
+
+    # Vocabulary and IDF come from the chunks; answer terms no page uses can't score anyway
+    df = Counter(token for tokens in chunk_tokens for token in set(tokens))
+    vocab = {token: i for i, token in enumerate(sorted(df))}
+    n = len(chunk_tokens)
+    idf = np.array([math.log((1 + n) / (1 + df[token])) + 1.0 for token in vocab], dtype=np.float32)
+
+    chunks = _tfidf(chunk_tokens, vocab, idf)
+    page_of = np.repeat(np.arange(len(pages)), sizes)
+    page_vectors = np.zeros((len(pages), len(vocab)), dtype=np.float32)
+    np.add.at(page_vectors, page_of, chunks)
+    answer_vector = _tfidf([answer_tokens], vocab, idf)[0]
+
+    # One matrix-vector product scores every chunk and every page
+    scores = np.vstack([chunks, _normalize(page_vectors)]) @ answer_vector
+    chunk_scores, page_scores = scores[:n], scores[n:]
+
+    results, start = [], 0
+    for size, page_score in zip(sizes, page_scores):
+        results.append({
+            "relevance_percent": int(round(100 * float(page_score))),
+            "chunk_scores": [round(float(s), 4) for s in chunk_scores[start:start + size]]
+        })
+        start += size
+    return results
+
+
+def used_chunks(chunk_scores: list) -> list:
+    """Flag the chunks the AI answer most likely draws on."""
+    best = max(chunk_scores, default=0.0)
+    return [s >= CHUNK_USE_THRESHOLD and s >= CHUNK_USE_RATIO * best for s in chunk_scores]
+
+
+def top_k(percents: list, k: int = COMPARE_TOP_K) -> list:
+    """Indices of the k highest percents in their original order (all of them when k <= 0)."""
+    if k <= 0 or k >= len(percents):
+        return list(range(len(percents)))
+    ranked = sorted(range(len(percents)), key=lambda i: (-percents[i], i))[:k]
+    return sorted(ranked)
@@ -0,0 +1,310 @@
+"""
+Bounded-depth site crawler.
+
+Starting from one URL, it seeds the frontier from robots.txt sitemaps (or
+/sitemap.xml) and follows same-site links up to a maximum depth. Design points:
+
+- The frontier is a priority heap: shallow pages first, and within a depth,
+  pages with shorter paths first.
+- Seen URLs are kept in a Bloom filter, so memory stays fixed however many
+  links a site has.
+- Requests to a host are spaced by a politeness delay (or the robots.txt
+  Crawl-delay, if longer).
+- Workers fetch and parse concurrently. Pages are handed to the caller through
+  a small queue, so a slow consumer slows the crawl instead of buffering pages.
+- Pages are fetched through the page cache (crawler.fetch_page_async), so with
+  PAGE_CACHE_DB set a re-crawl revalidates pages and reuses unchanged HTML.
+"""
+import asyncio
+import hashlib
+import itertools
+import math
+import os
+import time
+import xml.etree.ElementTree as ET
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+from crawler import fetch_page_async
+from fetcher import AsyncFetcher, FetchError
+
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "500"))
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "3"))
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "8"))
+# Minimum seconds between two requests to the same host
+CRAWL_DELAY = float(os.getenv("CRAWL_DELAY", "0.25"))
+# Frontier entries kept at once; links found beyond this are dropped
+CRAWL_MAX_FRONTIER = int(os.getenv("CRAWL_MAX_FRONTIER", "50000"))
+# Longest robots.txt Crawl-delay we honor
+MAX_CRAWL_DELAY = 10.0
+CRAWL_USER_AGENT = "GEOAnalyzerBot"
+
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+# Query parameters that never change the page content
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "ref", "mc_cid", "mc_eid"}
+SKIP_EXTENSIONS = (
+    ".pdf", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".css", ".js", ".json",
+    ".xml", ".zip", ".gz", ".mp3", ".mp4", ".avi", ".mov", ".woff", ".woff2", ".ttf", ".exe", ".dmg"
+)
+
+
+def normalize_url(url: str, base: str = None):
+    """
+    Canonical form of an absolute http(s) URL, or None for anything else.
+    The scheme and host are lowercased, default ports, fragments and tracking
+    parameters are dropped, and the remaining query parameters are sorted.
+    """
+    try:
+        parts = urlsplit(urljoin(base, url.strip()) if base else url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https") or not parts.hostname:
+        return None
+
+    host = parts.hostname.lower()
+    if port and port != {"http": 80, "https": 443}[scheme]:
+        host = f"{host}:{port}"
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    ))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def parse_sitemap(body: bytes):
+    """Return (locs, is_index) for a sitemap or sitemap index document."""
+    root = ET.fromstring(body)
+    locs = [loc.text.strip() for loc in root.iter(f"{SITEMAP_NS}loc") if loc.text]
+    return locs, root.tag == f"{SITEMAP_NS}sitemapindex"
+
+
+class BloomFilter:
+    """Fixed-size set membership with a false-positive rate of about error_rate at capacity."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def add(self, item: str) -> bool:
+        """Add an item. Returns False if it was (probably) already present."""
+        new = False
+        for p in self._positions(item):
+            if not self.bits[p >> 3] & (1 << (p & 7)):
+                self.bits[p >> 3] |= 1 << (p & 7)
+                new = True
+        self.count += new
+        return new
+
+
+class SiteCrawler:
+    """
+    Crawl one site with a pool of async workers. extract(result) runs in a
+    worker thread on every HTML page and returns (links, data); the links
+    are followed and the data is yielded with the page.
+    """
+
+    def __init__(self, fetcher: AsyncFetcher, extract, max_pages: int = CRAWL_MAX_PAGES,
+                 max_depth: int = CRAWL_MAX_DEPTH, workers: int = CRAWL_WORKERS, delay: float = CRAWL_DELAY,
+                 max_frontier: int = CRAWL_MAX_FRONTIER):
+        self.fetcher = fetcher
+        self.extract = extract
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.workers = max(1, workers)
+        self.delay = delay
+        self.max_frontier = max_frontier
+        # Links found far outnumber pages fetched, so size the filter for both
+        self.seen = BloomFilter(max(10 * max_pages, 10000))
+        self.stats = {"fetched": 0, "failed": 0, "skipped_robots": 0, "skipped_type": 0, "dropped": 0}
+        self._frontier = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._robots = {}
+        self._next_slot = {}
+        self._site = None
+
+    # ----- frontier
+
+    @staticmethod
+    def _site_of(netloc: str) -> str:
+        # example.com and www.example.com are the same site
+        return netloc[4:] if netloc.startswith("www.") else netloc
+
+    def _push(self, url: str, depth: int):
+        parts = urlsplit(url)
+        if depth > self.max_depth or self._site_of(parts.netloc) != self._site:
+            return
+        if parts.path.lower().endswith(SKIP_EXTENSIONS) or not self.seen.add(url):
+            return
+        if self._frontier.qsize() >= self.max_frontier:
+            self.stats["dropped"] += 1
+            return
+        path_depth = parts.path.rstrip("/").count("/")
+        self._frontier.put_nowait(((depth, path_depth), next(self._seq), url, depth))
+
+    # ----- robots.txt and sitemaps
+
+    async def _load_robots(self, root: str) -> RobotFileParser:
+        robots = RobotFileParser()
+        try:
+            result = await self.fetcher.fetch(f"{root}/robots.txt")
+            robots.parse(result.text.splitlines())
+        except FetchError:
+            # A missing robots.txt allows everything
+            robots.parse([])
+        return robots
+
+    async def _robots_for(self, url: str) -> RobotFileParser:
+        """robots.txt rules of the URL's host, fetched once per host."""
+        parts = urlsplit(url)
+        if parts.netloc not in self._robots:
+            self._robots[parts.netloc] = asyncio.ensure_future(self._load_robots(f"{parts.scheme}://{parts.netloc}"))
+        return await self._robots[parts.netloc]
+
+    async def _sitemap_urls(self, sitemaps: list) -> list:
+        """Page URLs from sitemaps, following index files, up to max_pages."""
+        urls = []
+        pending = list(sitemaps)
+        visited = set()
+        while pending and len(urls) < self.max_pages:
+            current = pending.pop(0)
+            if current in visited:
+                continue
+            visited.add(current)
+            try:
+                locs, is_index = parse_sitemap((await self.fetcher.fetch(current)).body)
+            except (FetchError, ET.ParseError) as e:
+                print(f"Sitemap error for {current}: {e}")
+                continue
+            if is_index:
+                pending.extend(locs)
+            else:
+                urls.extend(locs)
+        return urls[:self.max_pages]
+
+    # ----- fetching
+
+    async def _wait_turn(self, host: str, robots: RobotFileParser):
+        """Reserve the host's next request slot and sleep until it comes up."""
+        requested = robots.crawl_delay(CRAWL_USER_AGENT)
+        delay = max(self.delay, min(float(requested or 0), MAX_CRAWL_DELAY))
+        now = time.monotonic()
+        start = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = start + delay
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def _visit(self, url: str, depth: int):
+        """Fetch and extract one page. Returns None when robots.txt disallows it."""
+        robots = await self._robots_for(url)
+        if not robots.can_fetch(CRAWL_USER_AGENT, url):
+            self.stats["skipped_robots"] += 1
+            return None
+        await self._wait_turn(urlsplit(url).netloc, robots)
+        try:
+            result = await fetch_page_async(url, self.fetcher)
+        except FetchError as e:
+            self.stats["failed"] += 1
+            return {"url": url, "depth": depth, "error": str(e)}
+
+        if "html" not in result.headers.get("content-type", "text/html"):
+            self.stats["skipped_type"] += 1
+            return {"url": url, "depth": depth, "error": "Not an HTML page"}
+        try:
+            links, data = await asyncio.to_thread(self.extract, result)
+        except Exception as e:
+            self.stats["failed"] += 1
+            return {"url": url, "depth": depth, "error": f"Parse error: {e}"}
+
+        self.stats["fetched"] += 1
+        if depth < self.max_depth:
+            # Links resolve against the final URL, after redirects
+            for link in links:
+                link = normalize_url(link, result.url)
+                if link:
+                    self._push(link, depth + 1)
+        return {"url": url, "depth": depth, "data": data}
+
+    async def crawl(self, start_url: str):
+        """
+        Yield {"url", "depth", "data"} for each crawled page (or "error"
+        instead of "data" when it failed), in roughly priority order.
+        To stop early, close the generator (e.g. contextlib.aclosing) so the
+        workers are cancelled.
+        """
+        start_url = normalize_url(start_url)
+        if not start_url:
+            return
+        parts = urlsplit(start_url)
+        self._site = self._site_of(parts.netloc)
+        root = f"{parts.scheme}://{parts.netloc}"
+        robots = await self._robots_for(start_url)
+
+        self._push(start_url, 0)
+        for url in await self._sitemap_urls(robots.site_maps() or [f"{root}/sitemap.xml"]):
+            url = normalize_url(url)
+            if url:
+                self._push(url, 0)
+
+        pages = asyncio.Queue(maxsize=self.workers)
+        claimed = 0
+
+        async def worker():
+            nonlocal claimed
+            while True:
+                _, _, url, depth = await self._frontier.get()
+                try:
+                    # Past the page budget the rest of the frontier is just drained
+                    if claimed >= self.max_pages:
+                        continue
+                    claimed += 1
+                    try:
+                        page = await self._visit(url, depth)
+                    except Exception as e:
+                        self.stats["failed"] += 1
+                        page = {"url": url, "depth": depth, "error": str(e)}
+                    if page is None:
+                        # Pages robots.txt rules out don't use up the page budget
+                        claimed -= 1
+                    else:
+                        await pages.put(page)
+                finally:
+                    self._frontier.task_done()
+
+        async def run_workers():
+            workers = [asyncio.create_task(worker()) for _ in range(self.workers)]
+            try:
+                # Every entry processed, including the links found along the way
+                await self._frontier.join()
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+            await pages.put(None)
+
+        runner = asyncio.create_task(run_workers())
+        try:
+            while True:
+                page = await pages.get()
+                if page is None:
+                    break
+                yield page
+        finally:
+            # The consumer stopped early (or the crawl failed): stop the workers
+            runner.cancel()
+            try:
+                await runner
+            except asyncio.CancelledError:
+                pass
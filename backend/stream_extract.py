@@ -0,0 +1,215 @@
+"""
+Streaming scrape_page extraction.
+
+An lxml parser target receives start/end/data events as response chunks are
+fed in, and keeps only what scrape_page returns (title, meta description,
+h1-h3, links, paragraph text and heading-delimited sections). No DOM is built,
+and unless keep_body is set (the page cache stores it) the raw body is not
+kept, so memory per page is bounded by the extracted text rather than the
+HTML size. The output matches extract_page.
+"""
+import re
+
+from lxml import etree
+
+from metrics import timed
+
+_CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.I)
+# Bytes buffered before the parser is created, to find a <meta charset>
+SNIFF_BYTES = 4096
+HEADING_TAGS = ["h1", "h2", "h3", "h4", "h5", "h6"]
+BLOCK_TAGS = ["p", "li", "blockquote", "pre", "td", "th", "dt", "dd"]
+# Text inside these never shows up in the extracted fields
+SKIP_TAGS = {"script", "style", "template"}
+
+
+def _strip_join(pieces: list, separator: str = "") -> str:
+    """Like BeautifulSoup's get_text(separator, strip=True)."""
+    return separator.join(p for p in (piece.strip() for piece in pieces) if p)
+
+
+class PageTarget:
+    """lxml parser target that collects the scrape_page fields."""
+
+    def __init__(self):
+        self.title = None
+        self.meta_description = None
+        self.headings = {"h1": [], "h2": [], "h3": []}
+        self.links = []
+        self.paragraphs = []
+        self.sections = []
+        self._section = {"heading": None, "level": 0, "parts": []}
+        self._stack = []
+        self._collecting = []
+        self._blocks = []
+        self._text = []
+        self._skip = 0
+        self._closed = False
+
+    def _flush(self):
+        # lxml may split one text node across several data() calls
+        if self._text:
+            text = "".join(self._text)
+            self._text = []
+            if not self._skip:
+                for frame in self._collecting:
+                    frame["pieces"].append(text)
+
+    def start(self, tag, attrib):
+        self._flush()
+        tag = tag.lower() if isinstance(tag, str) else ""
+        frame = {"tag": tag, "pieces": None}
+
+        if tag in SKIP_TAGS:
+            self._skip += 1
+        elif tag == "a" and "href" in attrib:
+            self.links.append(attrib["href"])
+        elif tag == "meta" and attrib.get("name") == "description" and self.meta_description is None:
+            self.meta_description = (attrib.get("content") or "").strip()
+
+        if tag in HEADING_TAGS:
+            if self._section["heading"] or self._section["parts"]:
+                self.sections.append(self._section)
+            self._section = {"heading": None, "level": int(tag[1]), "parts": []}
+            frame["section"] = self._section
+        elif tag in BLOCK_TAGS:
+            # Only innermost blocks are kept; reserve this one's place in document order
+            for block in self._blocks:
+                block["nested"] = True
+            frame["slot"] = (self._section["parts"], len(self._section["parts"]))
+            frame["nested"] = False
+            self._section["parts"].append(None)
+            self._blocks.append(frame)
+
+        if tag in HEADING_TAGS or tag in BLOCK_TAGS or tag == "title":
+            frame["pieces"] = []
+            self._collecting.append(frame)
+        self._stack.append(frame)
+
+    def end(self, tag):
+        self._flush()
+        if not self._stack:
+            return
+        frame = self._stack.pop()
+        tag = frame["tag"]
+        if tag in SKIP_TAGS:
+            self._skip -= 1
+        if frame["pieces"] is None:
+            return
+        self._collecting.remove(frame)
+        pieces = frame["pieces"]
+
+        if tag == "title":
+            if self.title is None and pieces:
+                self.title = "".join(pieces).strip()
+            return
+        if tag == "p":
+            text = _strip_join(pieces)
+            if text:
+                self.paragraphs.append(text)
+        if tag in self.headings:
+            self.headings[tag].append(_strip_join(pieces))
+        if tag in HEADING_TAGS:
+            frame["section"]["heading"] = _strip_join(pieces, " ")
+        elif tag in BLOCK_TAGS:
+            self._blocks.remove(frame)
+            parts, index = frame["slot"]
+            if not frame["nested"]:
+                parts[index] = _strip_join(pieces, " ") or None
+
+    def data(self, data):
+        self._text.append(data)
+
+    def comment(self, text):
+        self._flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._flush()
+        # Elements still open at the end of a truncated page
+        while self._stack:
+            self.end(self._stack[-1]["tag"])
+        if self._section["heading"] or self._section["parts"]:
+            self.sections.append(self._section)
+
+
+class StreamingPageParser:
+    """
+    Fetch sink: start(headers) is called once the response headers are in,
+    then feed(chunk) per body chunk, then page(url) builds the scrape_page output.
+    With keep_body, the bytes fed in are also kept in body.
+    """
+
+    def __init__(self, keep_body: bool = False):
+        self.received = 0
+        self.keep_body = keep_body
+        self.body = bytearray()
+        self._parser = None
+        self._target = None
+        self._charset = None
+        self._head = b""
+
+    def start(self, headers: dict):
+        # Called again when a fetch is retried, so reset everything
+        self.received = 0
+        self.body = bytearray()
+        self._parser = None
+        self._target = PageTarget()
+        self._head = b""
+        match = re.search(r"charset=([\w-]+)", headers.get("content-type", ""), re.I)
+        self._charset = match.group(1) if match else None
+
+    def _open(self):
+        charset = self._charset
+        if not charset:
+            meta = _CHARSET_RE.search(self._head[:SNIFF_BYTES])
+            charset = meta.group(1).decode("ascii") if meta else "utf-8"
+        try:
+            self._parser = etree.HTMLParser(target=self._target, encoding=charset)
+        except LookupError:
+            self._parser = etree.HTMLParser(target=self._target, encoding="utf-8")
+        self._parser.feed(self._head)
+        self._head = b""
+
+    def feed(self, chunk: bytes):
+        self.received += len(chunk)
+        if self.keep_body:
+            self.body.extend(chunk)
+        if self._parser is None:
+            self._head += chunk
+            if len(self._head) >= SNIFF_BYTES:
+                self._open()
+        elif chunk:
+            self._parser.feed(chunk)
+
+    @timed("parse")
+    def page(self, url: str) -> dict:
+        """The scrape_page output, or {} when nothing was received."""
+        if not self.received:
+            return {}
+        if self._parser is None:
+            self._open()
+        try:
+            self._parser.close()
+        except etree.XMLSyntaxError:
+            # Truncated or badly broken HTML: keep what was extracted so far
+            self._target.close()
+        target = self._target
+        return {
+            "url": url,
+            "title": target.title,
+            "meta_description": target.meta_description,
+            "headings": target.headings,
+            "links": target.links,
+            "content": "\n".join(target.paragraphs),
+            "sections": [
+                {
+                    "heading": section["heading"],
+                    "level": section["level"],
+                    "text": "\n".join(part for part in section["parts"] if part)
+                }
+                for section in target.sections
+            ]
+        }
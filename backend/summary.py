@@ -1,31 +1,46 @@
+import asyncio
 import os 
 from dotenv import load_dotenv
-from groq import Groq
+
+from cache import TieredCache, content_hash, make_key, normalize_text
+from chunker import chunk_sections, estimate_tokens, group_for_merge, sections_from_text
+from llm_gateway import gateway
+from metrics import timed
 
 load_dotenv()
 
-api_key = os.getenv("GROQ_API_KEY")
-if not api_key:
-    raise ValueError("GROQ_API_KEY not found in environment variables")
+SUMMARY_MODEL = "llama-3.1-8b-instant"
+SYSTEM_PROMPT = "You are a helpful assistant. Your goal is to extract the answer to the user's question from the provided text."
+# Bump whenever build_summary_prompt or the generation settings change
+PROMPT_VERSION = "2"
+# Pages up to this many (estimated) tokens are summarized in a single call
+SUMMARY_INPUT_TOKENS = int(os.getenv("SUMMARY_INPUT_TOKENS", "3000"))
+CHUNK_CONCURRENCY = max(1, int(os.getenv("CHUNK_CONCURRENCY", "4")))
+# summarize_with_cohere returns a message starting with this instead of raising
+SUMMARY_ERROR_PREFIX = "Error summarizing content"
 
-client = Groq(api_key=api_key)
+summary_cache = TieredCache(
+    "summaries",
+    max_entries=int(os.getenv("SUMMARY_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("SUMMARY_CACHE_TTL", "86400")),
+    db_path=os.getenv("SUMMARY_CACHE_DB")
+)
 
 
-def summarize_with_cohere(text: str, query: str = None) -> str:
+def summary_cache_key(text: str, query: str = None) -> str:
     """
-    Summarize text using Groq (renamed from Cohere for compatibility)
+    Key a summary by what it was built from, not by URL, so identical
+    page text hits the cache wherever it was fetched from.
     """
-    if not text.strip():
-        return "No content to summarize."
+    return make_key(content_hash(text), normalize_text(query).lower(), SUMMARY_MODEL, PROMPT_VERSION)
 
-    try:
-        # Limit text length to avoid token limits
-        max_chars = 6000 # Increased character limit
-        if len(text) > max_chars:
-            text = text[:max_chars] + "..."
-        
-        if query:
-            prompt = f"""User Question: "{query}"
+
+def build_summary_prompt(text: str, query: str = None) -> str:
+    """
+    Build the summarization prompt for a page or a chunk of one.
+    """
+    if query:
+        return f"""User Question: "{query}"
 
 Please extract the specific answer to the User Question from the content below. 
 If the content contains the answer, summarize THAT part in detail.
@@ -34,8 +49,7 @@ If the content is unrelated, provide a brief general summary.
 
 Content:
 {text}"""
-        else:
-            prompt = f"""Please provide a comprehensive summary of the following content. 
+    return f"""Please provide a comprehensive summary of the following content. 
 Focus on:
 1. The main topic and core definition
 2. Key features, components, or technical details
@@ -44,17 +58,139 @@ Focus on:
 Content:
 {text}"""
 
-        response = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant. Your goal is to extract the answer to the user's question from the provided text."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=400 
+
+def build_merge_prompt(summaries: list, query: str = None) -> str:
+    """
+    Build the prompt that merges summaries of consecutive parts of one page.
+    """
+    parts = "\n\n".join(f"Part {i}:\n{summary}" for i, summary in enumerate(summaries, 1))
+    focus = f'Keep everything relevant to the User Question: "{query}"\n' if query else ""
+    return f"""The following are summaries of consecutive parts of the same webpage.
+Merge them into one coherent summary without repeating points.
+{focus}
+{parts}"""
+
+
+def _messages(prompt: str) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _complete(prompt: str) -> str:
+    return gateway.complete(_messages(prompt), SUMMARY_MODEL, max_tokens=400, temperature=0.3)
+
+
+async def _complete_async(prompt: str) -> str:
+    return await gateway.acomplete(_messages(prompt), SUMMARY_MODEL, max_tokens=400, temperature=0.3)
+
+
+def _page_chunks(text: str, sections: list = None) -> list:
+    return chunk_sections(sections or sections_from_text(text))
+
+
+def _summarize(text: str, query: str = None, sections: list = None) -> str:
+    """
+    Summarize text, splitting it into chunks first when it is over budget.
+    Raises on API errors.
+    """
+    key = summary_cache_key(text, query)
+    cached = summary_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if estimate_tokens(text) <= SUMMARY_INPUT_TOKENS:
+        summary = _complete(build_summary_prompt(text, query))
+    else:
+        partials = [_summarize(chunk["text"], query) for chunk in _page_chunks(text, sections)]
+        while len(partials) > 1:
+            partials = [
+                group[0] if len(group) == 1 else _complete(build_merge_prompt(group, query))
+                for group in group_for_merge(partials)
+            ]
+        summary = partials[0]
+
+    summary_cache.set(key, summary)
+    return summary
+
+
+async def _merge_async(partials: list, query: str, complete) -> str:
+    """Merge partial summaries, in groups that fit one prompt, until one is left."""
+    async def merge(group):
+        return group[0] if len(group) == 1 else await complete(build_merge_prompt(group, query))
+
+    while len(partials) > 1:
+        partials = await asyncio.gather(*(merge(group) for group in group_for_merge(partials)))
+    return partials[0]
+
+
+async def _summarize_async(text: str, query: str, sections: list, semaphore: asyncio.Semaphore) -> str:
+    """Async twin of _summarize; chunks and merge groups are processed in parallel."""
+    key = summary_cache_key(text, query)
+    cached = summary_cache.get(key)
+    if cached is not None:
+        return cached
+
+    async def complete(prompt):
+        async with semaphore:
+            return await _complete_async(prompt)
+
+    if estimate_tokens(text) <= SUMMARY_INPUT_TOKENS:
+        summary = await complete(build_summary_prompt(text, query))
+    else:
+        partials = await asyncio.gather(
+            *(_summarize_async(chunk["text"], query, None, semaphore) for chunk in _page_chunks(text, sections))
         )
-        return response.choices[0].message.content.strip()
+        summary = await _merge_async(partials, query, complete)
+
+    summary_cache.set(key, summary)
+    return summary
+
+
+@timed("summarize")
+def summarize_with_cohere(text: str, query: str = None, sections: list = None) -> str:
+    """
+    Summarize text using Groq (renamed from Cohere for compatibility)
+    Long pages are chunked along their sections and summarized hierarchically.
+    """
+    if not text.strip():
+        return "No content to summarize."
+
+    try:
+        return _summarize(text, query, sections)
     except Exception as e:
         # Return error message instead of crashing
         error_msg = str(e)
-        return f"Error summarizing content: {error_msg}"
+        return f"{SUMMARY_ERROR_PREFIX}: {error_msg}"
+
+
+@timed("summarize")
+async def summarize_with_cohere_async(text: str, query: str = None, sections: list = None) -> str:
+    """
+    Async variant of summarize_with_cohere. Chunks are summarized in parallel,
+    at most CHUNK_CONCURRENCY at a time per page.
+    """
+    if not text.strip():
+        return "No content to summarize."
+
+    try:
+        return await _summarize_async(text, query, sections, asyncio.Semaphore(CHUNK_CONCURRENCY))
+    except Exception as e:
+        error_msg = str(e)
+        return f"{SUMMARY_ERROR_PREFIX}: {error_msg}"
+
+
+@timed("summarize")
+async def merge_summaries_async(summaries: list, query: str = None) -> str:
+    """
+    Combine partial summaries (e.g. of a page's sections) into one, merged
+    in groups like the chunk summaries of a long page. Raises on API errors.
+    """
+    semaphore = asyncio.Semaphore(CHUNK_CONCURRENCY)
+
+    async def complete(prompt):
+        async with semaphore:
+            return await _complete_async(prompt)
+
+    return await _merge_async(list(summaries), query, complete)
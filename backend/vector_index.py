@@ -0,0 +1,225 @@
+"""
+Persistent chunk index of crawled pages.
+
+Chunk vectors live in a memory-mapped float32 matrix (vectors.f32) and their
+metadata in SQLite (index.db), both under one directory. Vectors use feature
+hashing, so they have a fixed size and need no shared vocabulary: pages can
+be added or updated one at a time, and a page whose content hash did not
+change is left alone. Search is one matrix-vector product over the candidate
+rows, so repeat queries against indexed sites never touch the network.
+
+Several workers can share one directory: rows are allocated inside a write
+transaction from the row count stored in SQLite, and each worker remaps the
+vector file when another one has grown it.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from urllib.parse import urlparse
+
+import numpy as np
+
+from cache import content_hash
+from relevance import tokenize
+
+INDEX_DIM = int(os.getenv("INDEX_DIM", "2048"))
+INITIAL_CAPACITY = 1024
+
+
+def hash_vectors(texts: list, dim: int = INDEX_DIM) -> np.ndarray:
+    """L2-normalized signed feature-hashing vectors (sublinear tf), one row per text."""
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token, count in Counter(tokenize(text)).items():
+            # crc32 rather than hash(): it must be stable across processes
+            h = zlib.crc32(token.encode("utf-8"))
+            sign = -1.0 if h & 0x80000000 else 1.0
+            matrix[row, h % dim] += sign * (1.0 + math.log(count))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def domain_of(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+class VectorIndex:
+    def __init__(self, directory: str, dim: int = INDEX_DIM):
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.db"), timeout=10, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, domain TEXT NOT NULL, content_hash TEXT NOT NULL, "
+            "title TEXT, indexed REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "row INTEGER PRIMARY KEY, url TEXT NOT NULL, chunk_index INTEGER NOT NULL, "
+            "heading TEXT, text TEXT NOT NULL, tokens INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_url ON chunks(url)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_domain ON pages(domain)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY)")
+
+        # The vector file is only meaningful at the dimension it was built with
+        stored = dict(self._db.execute("SELECT key, value FROM meta").fetchall())
+        self.dim = int(stored.get("dim", dim))
+        self._db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+        self._db.commit()
+
+        self._path = os.path.join(directory, "vectors.f32")
+        row_bytes = self.dim * 4
+        capacity = os.path.getsize(self._path) // row_bytes if os.path.exists(self._path) else 0
+        self._open(max(capacity, INITIAL_CAPACITY))
+
+    def _open(self, capacity: int):
+        """(Re)map the vector file, growing it to hold capacity rows."""
+        size = capacity * self.dim * 4
+        with open(self._path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self.capacity = capacity
+        self.vectors = np.memmap(self._path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _map_rows(self, rows: int, grow: bool = False):
+        """Make sure rows 0..rows-1 are mapped, picking up a file grown by another worker (or growing it)."""
+        if rows <= self.capacity:
+            return
+        on_disk = os.path.getsize(self._path) // (self.dim * 4)
+        self.vectors.flush()
+        self._open(max(rows, on_disk, self.capacity * 2 if grow else 0))
+
+    def _allocate(self, count: int) -> list:
+        """
+        Take count rows, reusing rows freed by updated pages first. Must run
+        inside a write transaction, so workers sharing the index never hand
+        out the same row.
+        """
+        rows = [r[0] for r in self._db.execute("SELECT row FROM free_rows ORDER BY row LIMIT ?", (count,))]
+        self._db.executemany("DELETE FROM free_rows WHERE row = ?", [(r,) for r in rows])
+        needed = count - len(rows)
+        if needed:
+            stored = self._db.execute("SELECT value FROM meta WHERE key = 'rows'").fetchone()
+            total = int(stored[0]) if stored else 0
+            rows.extend(range(total, total + needed))
+            total += needed
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rows', ?)", (str(total),))
+            self._map_rows(total, grow=True)
+        return rows
+
+    def _release(self, url: str):
+        """
+        Free a page's rows. Their vectors are left in place: a rollback keeps
+        the page pointing at them, and a row is overwritten when it is reused.
+        """
+        rows = [r[0] for r in self._db.execute("SELECT row FROM chunks WHERE url = ?", (url,))]
+        if rows:
+            self._db.executemany("INSERT OR IGNORE INTO free_rows (row) VALUES (?)", [(r,) for r in rows])
+            self._db.execute("DELETE FROM chunks WHERE url = ?", (url,))
+
+    def upsert(self, url: str, chunks: list, title: str = None) -> str:
+        """
+        Index a page's chunks ({"index", "heading", "text", "tokens"}).
+        Returns "added", "updated" or "unchanged" (same content hash).
+        """
+        digest = content_hash("\n".join(chunk["text"] for chunk in chunks))
+        vectors = hash_vectors([chunk["text"] for chunk in chunks], self.dim)
+        with self._lock:
+            # Lock the database for writing first: other workers may be allocating rows too
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT content_hash FROM pages WHERE url = ?", (url,)).fetchone()
+                if row and row[0] == digest:
+                    self._db.rollback()
+                    return "unchanged"
+
+                # Allocate before releasing, so the new vectors never overwrite the page's
+                # current rows before the transaction commits
+                rows = self._allocate(len(chunks))
+                self._release(url)
+                if rows:
+                    self.vectors[rows] = vectors
+                    self.vectors.flush()
+                self._db.executemany(
+                    "INSERT INTO chunks (row, url, chunk_index, heading, text, tokens) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(r, url, c["index"], c.get("heading"), c["text"], c.get("tokens", 0))
+                     for r, c in zip(rows, chunks)]
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO pages (url, domain, content_hash, title, indexed) VALUES (?, ?, ?, ?, ?)",
+                    (url, domain_of(url), digest, title, time.time())
+                )
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                raise
+        return "updated" if row else "added"
+
+    def page_chunks(self, url: str):
+        """Return a page's chunks in order, or None when the page isn't indexed."""
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM pages WHERE url = ?", (url,)).fetchone() is None:
+                return None
+            rows = self._db.execute(
+                "SELECT chunk_index, heading, text, tokens FROM chunks WHERE url = ? ORDER BY chunk_index", (url,)
+            ).fetchall()
+        return [{"index": r[0], "heading": r[1], "text": r[2], "tokens": r[3]} for r in rows]
+
+    def search(self, query: str, k: int = 10, urls: list = None, domains: list = None) -> list:
+        """Top-k chunks for a query, optionally restricted to some URLs or domains."""
+        if k <= 0:
+            return []
+        sql = "SELECT c.row FROM chunks c"
+        params = []
+        if urls:
+            sql += f" WHERE c.url IN ({','.join('?' * len(urls))})"
+            params = list(urls)
+        elif domains:
+            sql += f" JOIN pages p ON p.url = c.url WHERE p.domain IN ({','.join('?' * len(domains))})"
+            params = [d.lower() for d in domains]
+
+        query_vector = hash_vectors([query], self.dim)[0]
+        with self._lock:
+            rows = np.array([r[0] for r in self._db.execute(sql, params)], dtype=np.int64)
+            if not rows.size or not query_vector.any():
+                return []
+            # Rows added by another worker may lie past the end of this worker's mapping
+            self._map_rows(int(rows.max()) + 1)
+            scores = self.vectors[rows] @ query_vector
+            k = min(k, rows.size)
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best], kind="stable")]
+            meta = {
+                r[0]: r[1:] for r in self._db.execute(
+                    f"SELECT row, url, chunk_index, heading, text FROM chunks "
+                    f"WHERE row IN ({','.join('?' * len(best))})",
+                    [int(rows[i]) for i in best]
+                )
+            }
+
+        results = []
+        for i in best:
+            if scores[i] <= 0:
+                break
+            url, chunk_index, heading, text = meta[int(rows[i])]
+            results.append({"url": url, "chunk_index": chunk_index, "heading": heading,
+                            "text": text, "score": round(float(scores[i]), 4)})
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pages": self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0],
+                "chunks": self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0],
+                "free_rows": self._db.execute("SELECT COUNT(*) FROM free_rows").fetchone()[0],
+                "capacity": self.capacity,
+                "dim": self.dim
+            }
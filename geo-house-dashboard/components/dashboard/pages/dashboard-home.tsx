@@ -8,6 +8,7 @@ import { Label } from '@/components/ui/label'
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card'
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs'
 import { cn } from '@/lib/utils'
+import { readServerSentEvents } from '@/lib/sse'
 
 interface URLResponse {
   url: string
@@ -56,6 +57,13 @@ interface ComparisonResult {
   geoAnalysis?: GeoAnalysis
 }
 
+// Button label while a stage of /analyze is running
+const STAGE_LABELS: Record<string, string> = {
+  answer: 'Generating AI answer...',
+  summary: 'Summarizing pages...',
+  compare: 'Comparing...',
+}
+
 export function DashboardHome() {
   const [userUrl, setUserUrl] = useState('')
   const [competitor1, setCompetitor1] = useState('')
@@ -66,6 +74,8 @@ export function DashboardHome() {
   const [comparisonResult, setComparisonResult] = useState<ComparisonResult | null>(null)
   const [error, setError] = useState('')
   const [showInput, setShowInput] = useState(true)
+  const [jobIds, setJobIds] = useState({ summary: '', llm: '', compare: '' })
+  const [stage, setStage] = useState('')
 
   const handleAnalyze = async () => {
     setError('')
@@ -74,52 +84,44 @@ export function DashboardHome() {
     try {
       const urls = [userUrl, competitor1, competitor2, competitor3].filter(Boolean)
 
-      // Step 1: Generate summaries
-      const summaryRes = await fetch('http://localhost:8000/generate/summary', {
+      // One streamed request: the answer and the page summaries are generated
+      // concurrently on the server, then compared
+      const analyzeRes = await fetch('http://localhost:8000/analyze', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           user_url: userUrl,
           urls: [competitor1, competitor2, competitor3].filter(Boolean),
-          query: question,
+          query: question || 'Provide comprehensive information and resources',
         }),
       })
 
-      const summaryData = await summaryRes.json()
-
-      // Check for backend errors
-      if (summaryData.error) {
-        throw new Error(summaryData.error)
+      if (!analyzeRes.ok) throw new Error('Failed to run analysis')
+      if (!analyzeRes.headers.get('content-type')?.includes('text/event-stream')) {
+        const result = await analyzeRes.json()
+        throw new Error(result.error || 'Failed to start analysis')
       }
 
-      if (!summaryRes.ok) throw new Error('Failed to generate summaries')
-
-      // Step 2: Generate LLM responses for the question
-      const llmRes = await fetch('http://localhost:8000/generate_llm_response', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ query: question || 'Provide comprehensive information and resources' }),
+      let summaryData: any = null
+      let compareData: any = null
+      let ids = { summary: '', llm: '', compare: '' }
+      await readServerSentEvents(analyzeRes, (event, payload) => {
+        if (event === 'jobs') {
+          ids = { summary: payload.summary_job_id, llm: payload.llm_job_id, compare: '' }
+          setJobIds(ids)
+          // The Chunks page reads the user's page chunks from this summary job,
+          // scored against this answer
+          localStorage.setItem('summaryJobId', payload.summary_job_id)
+          localStorage.setItem('llmJobId', payload.llm_job_id)
+        }
+        else if (event === 'stage' && payload.status === 'running') setStage(payload.stage)
+        else if (event === 'summary') summaryData = payload
+        else if (event === 'done') compareData = payload
+        else if (event === 'error') throw new Error(payload.error)
       })
 
-      if (!llmRes.ok) throw new Error('Failed to generate LLM response')
-      const llmData = await llmRes.json()
-
-      if (llmData.error) {
-        throw new Error(llmData.error)
-      }
-
-      // Step 3: Compare URLs
-      const compareRes = await fetch('http://localhost:8000/compare', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-      })
-
-      if (!compareRes.ok) throw new Error('Failed to compare URLs')
-      const compareData = await compareRes.json()
-
-      if (compareData.error) {
-        throw new Error(compareData.error)
-      }
+      if (!summaryData || !compareData) throw new Error('Analysis stream ended early')
+      setJobIds({ ...ids, compare: compareData.job_id || '' })
 
       // Parse the geo_analysis JSON if it's a string
       let geoAnalysis
@@ -166,13 +168,18 @@ export function DashboardHome() {
       console.error('[v0] Analysis error:', err)
     } finally {
       setIsLoading(false)
+      setStage('')
     }
   }
 
   const handleOpenGeoHouse = () => {
     if (userUrl) {
       const encodedUrl = encodeURIComponent(userUrl)
-      window.open(`http://localhost:4000/geo/${encodedUrl}`, '_blank')
+      // Reuse a finished comparison, otherwise let GEO-house stream a new one
+      const jobQuery = jobIds.compare
+        ? `?job=${jobIds.compare}`
+        : jobIds.summary && jobIds.llm ? `?summary_job=${jobIds.summary}&llm_job=${jobIds.llm}` : ''
+      window.open(`http://localhost:4000/geo/${encodedUrl}${jobQuery}`, '_blank')
     }
   }
 
@@ -261,7 +268,7 @@ export function DashboardHome() {
               {isLoading ? (
                 <>
                   <Loader2 className="mr-2 h-4 w-4 animate-spin" />
-                  Analyzing...
+                  {STAGE_LABELS[stage] || 'Analyzing...'}
                 </>
               ) : (
                 'Run Comparison'
@@ -5,8 +5,9 @@ import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card'
 import { Badge } from '@/components/ui/badge'
 import { Loader2, ArrowLeft } from 'lucide-react'
 import { Button } from '@/components/ui/button'
-import { useRouter } from 'next/navigation'
+import { useRouter, useSearchParams } from 'next/navigation'
 import { cn } from '@/lib/utils'
+import { readServerSentEvents } from '@/lib/sse'
 
 interface GEOAnalysis {
   overall_alignment: {
@@ -34,8 +35,21 @@ interface GeoHousePageProps {
   url: string
 }
 
+type CompetitorAnalysis = GEOAnalysis['url_analysis']['competitors'][number]
+
+function parseGeoAnalysis(geoAnalysis: unknown): GEOAnalysis {
+  const jsonString = typeof geoAnalysis === 'string'
+    ? geoAnalysis.replace(/```json\n?|\n?```/g, '').trim()
+    : JSON.stringify(geoAnalysis)
+  return JSON.parse(jsonString)
+}
+
 export function GeoHousePage({ url }: GeoHousePageProps) {
   const router = useRouter()
+  const searchParams = useSearchParams()
+  const jobId = searchParams.get('job')
+  const summaryJobId = searchParams.get('summary_job')
+  const llmJobId = searchParams.get('llm_job')
   const [data, setData] = useState<GEOAnalysis | null>(null)
   const [isLoading, setIsLoading] = useState(true)
   const [error, setError] = useState('')
@@ -47,17 +61,56 @@ export function GeoHousePage({ url }: GeoHousePageProps) {
         setIsLoading(true)
         console.log('[v0] Fetching GEO analysis for:', decodedUrl)
 
-        // In a real app, you'd fetch from an endpoint that returns the stored analysis
-        // For now, we'll try to get it from the backend
-        const res = await fetch('http://localhost:8000/compare', {
+        if (jobId) {
+          // Load the stored comparison job instead of re-running /compare
+          const res = await fetch(`http://localhost:8000/jobs/${jobId}`)
+
+          if (!res.ok) throw new Error('Failed to fetch analysis data')
+          const job = await res.json()
+          if (job.error) throw new Error(job.error)
+
+          setData(parseGeoAnalysis(job.result?.geo_analysis))
+          console.log('[v0] GEO analysis loaded:', job)
+          return
+        }
+
+        if (!summaryJobId || !llmJobId) {
+          throw new Error('No analysis job selected. Run an analysis from the dashboard first.')
+        }
+
+        // Stream a fresh comparison and render each section as soon as it is complete
+        const res = await fetch('http://localhost:8000/compare/stream', {
           method: 'POST',
           headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ summary_job_id: summaryJobId, llm_job_id: llmJobId }),
         })
-
         if (!res.ok) throw new Error('Failed to fetch analysis data')
-        const result = await res.json()
-        setData(result.geo_analysis)
-        console.log('[v0] GEO analysis loaded:', result)
+        if (!res.headers.get('content-type')?.includes('text/event-stream')) {
+          const result = await res.json()
+          throw new Error(result.error || 'Failed to start analysis stream')
+        }
+
+        let alignment: GEOAnalysis['overall_alignment'] | null = null
+        let userAnalysis: GEOAnalysis['url_analysis']['user_url'] | null = null
+        const competitors: CompetitorAnalysis[] = []
+        const showPartial = () => {
+          if (!alignment || !userAnalysis) return
+          setData({
+            overall_alignment: alignment,
+            url_analysis: { user_url: userAnalysis, competitors: [...competitors] },
+          })
+          setIsLoading(false)
+        }
+
+        await readServerSentEvents(res, (event, payload) => {
+          if (event === 'overall_alignment') alignment = payload
+          else if (event === 'user_url') userAnalysis = payload
+          else if (event === 'competitor') competitors[payload.index] = payload.analysis
+          else if (event === 'done') setData(parseGeoAnalysis(payload.geo_analysis))
+          else if (event === 'error') throw new Error(payload.error)
+          if (event !== 'done') showPartial()
+        })
+        console.log('[v0] GEO analysis streamed')
       } catch (err) {
         const message = err instanceof Error ? err.message : 'Failed to load analysis'
         setError(message)
@@ -68,7 +121,7 @@ export function GeoHousePage({ url }: GeoHousePageProps) {
     }
 
     fetchData()
-  }, [decodedUrl])
+  }, [decodedUrl, jobId, summaryJobId, llmJobId])
 
   if (isLoading) {
     return (
@@ -204,14 +204,32 @@ export function useHeatmapZones() {
   }
 }
 
+// Chunks of the user's page from the latest summary job, mock data when there is none
+async function fetchChunks(): Promise<Chunk[]> {
+  const jobId = typeof window !== 'undefined' ? localStorage.getItem('summaryJobId') : null
+  if (!jobId) {
+    await delay(1300)
+    return mockAnalysisResult.chunks
+  }
+
+  const llmJobId = localStorage.getItem('llmJobId')
+  const query = llmJobId ? `?llm_job_id=${llmJobId}` : ''
+  const response = await fetch(`http://localhost:8000/jobs/${jobId}/chunks${query}`)
+  if (!response.ok) {
+    throw new Error(`API error: ${response.status}`)
+  }
+  const data = await response.json()
+  if (data.error) {
+    throw new Error(data.error)
+  }
+  return data.chunks
+}
+
 // Chunks hook
 export function useChunks() {
   const { data, error, isLoading } = useSWR<Chunk[]>(
     'chunks',
-    async () => {
-      await delay(1300)
-      return mockAnalysisResult.chunks
-    },
+    fetchChunks,
     { revalidateOnFocus: false }
   )
 
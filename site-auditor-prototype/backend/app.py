@@ -1,172 +1,104 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-import subprocess
-import json
-import requests
-from bs4 import BeautifulSoup
-import re
+import asyncio
+import sys
 import time
+from contextlib import asynccontextmanager
 from datetime import datetime
 import os
 from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)
+# fetcher, llm_gateway, metrics, cache, chunker and site_crawler are shared with the
+# GeoHouse backend and imported from its directory (../../backend in this repository)
+GEO_BACKEND_DIR = os.getenv("GEO_BACKEND_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"
+)
+if not os.path.isfile(os.path.join(GEO_BACKEND_DIR, "fetcher.py")):
+    raise RuntimeError(f"GeoHouse backend modules not found in {GEO_BACKEND_DIR}. Set GEO_BACKEND_DIR.")
+sys.path.append(GEO_BACKEND_DIR)
+from fetcher import AsyncFetcher
+from features import PageFeatures, extract_features
+from geo_scoring import geo_scores, score_signals
+from batch import BatchAuditManager, MAX_BATCH_URLS, sitemap_urls
+from site_audit import SiteAuditManager
+from lighthouse import get_pool, lighthouse_available
+from sentiment import SentimentBatcher
+from llm_gateway import BATCH, INTERACTIVE, gateway
+from metrics import CONTENT_TYPE, METRICS_ENABLED, register_cache, registry, stage, timed, trace_requests
 
-# Groq API Configuration
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-if not GROQ_API_KEY:
-    raise ValueError("GROQ_API_KEY not found in environment variables. Please check your .env file.")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+# Seconds an audit waits for each stage, counted from the start of the audit
+LIGHTHOUSE_STAGE_TIMEOUT = float(os.getenv("LIGHTHOUSE_STAGE_TIMEOUT", "90"))
+SENTIMENT_STAGE_TIMEOUT = float(os.getenv("SENTIMENT_STAGE_TIMEOUT", "20"))
+sentiment_batcher = SentimentBatcher(gateway)
 
-# ============================================================
-# GEO SCORING SYSTEM
-# ============================================================
+# Created on first use, so importing (or mounting) the app doesn't open connections.
+# A missing GROQ_API_KEY shows up in /api/ready instead of failing the import.
+_fetcher = None
+# Stages still running after their audit returned, referenced so they aren't garbage collected
+_late_stages = set()
 
-def answer_nugget_score(text):
-    """Score how well a page answers a question directly."""
-    if not text:
-        return 0
-    
-    first_100_words = " ".join(text.split()[:100])
-    length = len(first_100_words.split())
-    
-    score = 0
-    # Perfect summary window: 40-80 words for direct answers
-    if 40 <= length <= 80:
-        score += 50
-    elif 20 <= length < 40:
-        score += 30
-    elif length > 100:
-        score += 20
-    
-    # Factual tone: multiple sentences
-    sentence_count = first_100_words.count(".") + first_100_words.count("!") + first_100_words.count("?")
-    if sentence_count >= 2:
-        score += 30
-    elif sentence_count == 1:
-        score += 15
-    
-    # Avoid marketing language
-    marketing_words = ["best", "amazing", "incredible", "revolutionary", "game-changer", "must-have"]
-    marketing_count = sum(1 for word in marketing_words if word.lower() in first_100_words.lower())
-    if marketing_count > 2:
-        score -= 20
-    
-    return min(max(score, 0), 100)
 
+def get_fetcher() -> AsyncFetcher:
+    """The pooled async fetcher shared by all audits on this worker."""
+    global _fetcher
+    if _fetcher is None:
+        _fetcher = AsyncFetcher()
+    return _fetcher
 
-def extractability_score(html):
-    """Score how well structured HTML is for AI extraction."""
-    if not html:
-        return 0
-    
-    soup = BeautifulSoup(html, "html.parser")
-    
-    # Count structured elements
-    tables = len(soup.find_all("table"))
-    lists = len(soup.find_all(["ul", "ol"]))
-    schemas = len(soup.find_all("script", {"type": "application/ld+json"}))
-    headings = len(soup.find_all(["h1", "h2", "h3"]))
-    
-    score = 0
-    score += min(tables * 20, 40)  # Tables are goldmines for AI
-    score += min(lists * 10, 30)   # Lists structure data nicely
-    score += min(schemas * 30, 30) # Schema = machine-readable gold
-    score += min(headings * 3, 20) # Clear hierarchy helps
-    
-    return min(score, 100)
 
+async def close_fetcher():
+    global _fetcher
+    if _fetcher is not None:
+        await _fetcher.aclose()
+        _fetcher = None
 
-def authority_links_score(html):
-    """Score based on authoritative external citations."""
-    if not html:
-        return 0
-    
-    soup = BeautifulSoup(html, "html.parser")
-    links = [a.get("href", "") for a in soup.find_all("a", href=True)]
-    
-    authority_domains = [
-        "wikipedia.org", ".gov", ".edu", "nytimes.com", "bbc.com",
-        "nature.com", "science.org", "github.com", "stackoverflow.com",
-        "arxiv.org", "ieee.org", "acm.org"
-    ]
-    
-    authority_count = sum(1 for link in links if any(domain in link for domain in authority_domains))
-    total_links = len(links)
-    
-    if total_links == 0:
-        return 0
-    
-    authority_ratio = authority_count / total_links
-    return min(int(authority_ratio * 100), 100)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_fetcher()
 
-def sentiment_score(text):
-    """Use Groq LLM to score objectivity/factuality of content."""
-    if not text:
-        return 50
-    
-    try:
-        # Use Groq API with mixtral model
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": "llama-3.3-70b-versatile",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": f"""Rate this text for objectivity and factuality on a scale of 1-10.
-1 = Pure marketing/opinion/biased
-10 = Neutral, fact-based, objective
-
-TEXT:
-{text[:1000]}
-
-Respond with ONLY a single number 1-10, no explanation."""
-                }
-            ],
-            "temperature": 0.3,
-            "max_tokens": 10
-        }
-        
-        response = requests.post(
-            GROQ_API_URL,
-            json=payload,
-            headers=headers,
-            timeout=15
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            text_response = result["choices"][0]["message"]["content"].strip()
-            # Extract first number from response
-            numbers = ''.join(filter(str.isdigit, text_response))
-            if numbers:
-                score = int(numbers[0])
-                return min(max(score, 1), 10) * 10
-        
-        # Fallback: Use heuristics if API fails
-        return 50
-    except Exception as e:
-        print(f"Groq sentiment score error: {e}")
-        return 50  # Default middle score
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["Server-Timing"],
+)
+
+# ============================================================
+# GEO SCORING SYSTEM
+# ============================================================
+
+@timed("sentiment")
+async def sentiment_score(text, priority=INTERACTIVE):
+    """
+    Use Groq LLM to score objectivity/factuality of content.
+    Concurrent calls are batched into one request; rate-limited or failed
+    requests fall back to a local heuristic score.
+    """
+    return await sentiment_batcher.ascore(text, priority)
 
 
-def calculate_geo_score(html, text):
-    """Calculate comprehensive GEO score using Groq for sentiment analysis."""
-    nugget = answer_nugget_score(text)
-    extractability = extractability_score(html)
-    authority = authority_links_score(html)
+def calculate_geo_score(features: PageFeatures, sentiment=None):
+    """
+    Calculate comprehensive GEO score using Groq for sentiment analysis.
+    Pass sentiment when it was already scored (e.g. in parallel with the audit).
+    """
+    signals = score_signals([features])
+    nugget, extractability, authority = (
+        int(signals[name][0]) for name in ("answer_nugget", "extractability", "authority")
+    )
     
     # Use Groq LLM for sentiment/objectivity scoring
-    sentiment = sentiment_score(text)
+    if sentiment is None:
+        sentiment = sentiment_batcher.score(features.text)
     
     geo_score = round(
         nugget * 0.25 +
@@ -183,14 +115,13 @@ def calculate_geo_score(html, text):
     }
 
 
-def generate_suggestions(html, text, geo_signals):
+def generate_suggestions(features: PageFeatures, geo_signals):
     """Generate actionable suggestions based on signals."""
-    soup = BeautifulSoup(html, "html.parser")
     suggestions = []
     
-    tables = len(soup.find_all("table"))
-    lists = len(soup.find_all(["ul", "ol"]))
-    schemas = len(soup.find_all("script", {"type": "application/ld+json"}))
+    tables = features.count("table")
+    lists = features.count("ul", "ol")
+    schemas = len(features.json_ld)
     
     if tables == 0:
         suggestions.append({
@@ -235,141 +166,285 @@ def generate_suggestions(html, text, geo_signals):
     return suggestions[:5]  # Top 5 suggestions
 
 
+def score_pages(features_list, priority=INTERACTIVE):
+    """
+    GEO score, signals and suggestions for already fetched pages.
+    Their sentiment is scored together, in as few Groq requests as possible,
+    and the other signals in one vectorized pass.
+    """
+    with stage("sentiment"):
+        sentiments = sentiment_batcher.score_many([features.text for features in features_list], priority)
+    signals = score_signals(features_list)
+    totals = geo_scores(signals, sentiments)
+    results = []
+    for i, (features, sentiment) in enumerate(zip(features_list, sentiments)):
+        geo_signals = {name: int(values[i]) for name, values in signals.items()}
+        geo_signals["sentiment"] = sentiment
+        results.append((int(totals[i]), geo_signals, generate_suggestions(features, geo_signals)))
+    return results
+
+
 # ============================================================
 # LIGHTHOUSE INTEGRATION
 # ============================================================
 
-def run_lighthouse_audit(url):
-    """Run real Lighthouse audit using CLI."""
-    try:
-        # Create temp file path that works on Windows/Linux
-        import tempfile
-        import platform
-        
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"lighthouse_{int(time.time())}.json")
-        
-        # Windows needs shell=True to find 'lighthouse.cmd'
-        # or we explicitly call 'lighthouse.cmd'
-        command = [
-            "lighthouse.cmd" if platform.system() == "Windows" else "lighthouse",
-            url,
-            "--output=json",
-            f"--output-path={output_path}",
-            "--chrome-flags=--headless",
-            "--quiet"
-        ]
-        
-        print(f"Starting Lighthouse audit for {url}...")
-        result = subprocess.run(
-            command,
-            timeout=120, # Increased timeout for slow sites
-            capture_output=True,
-            shell=(platform.system() == "Windows") 
-        )
-        print("Lighthouse audit finished.")
-        
-        if result.returncode != 0:
-            print(f"Lighthouse failed: {result.stderr.decode()}")
-            return None
-        
-        with open(output_path, "r") as f:
-            lighthouse_report = json.load(f)
-        
-        return {
-            "categories": {
-                "performance": lighthouse_report["categories"]["performance"]["score"] * 100,
-                "accessibility": lighthouse_report["categories"]["accessibility"]["score"] * 100,
-                "best-practices": lighthouse_report["categories"]["best-practices"]["score"] * 100,
-                "seo": lighthouse_report["categories"]["seo"]["score"] * 100,
-            },
-            "metrics": {
-                "lcp": lighthouse_report.get("audits", {}).get("largest-contentful-paint", {}).get("numericValue", 0) / 1000,
-                "fid": lighthouse_report.get("audits", {}).get("first-input-delay", {}).get("numericValue", 0),
-                "cls": lighthouse_report.get("audits", {}).get("cumulative-layout-shift", {}).get("numericValue", 0),
-            }
-        }
-    except Exception as e:
-        print(f"Lighthouse error: {e}")
-        return None
+@timed("lighthouse")
+async def run_lighthouse_audit(url):
+    """Run a real Lighthouse audit on the shared Chrome pool (cached per URL)."""
+    return await get_pool().run(url)
 
 
 # ============================================================
 # FETCH PAGE CONTENT
 # ============================================================
 
-def fetch_page_content(url):
-    """Fetch and parse page content."""
+async def fetch_page_content(url):
+    """Fetch a page and extract its features in a single parse."""
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, "html.parser")
-        
-        # Extract main content
-        main_text = ""
-        for tag in soup.find_all(["p", "h1", "h2", "h3", "li"]):
-            main_text += tag.get_text() + " "
-        
-        return response.content.decode("utf-8", errors="ignore"), main_text
+        response = await get_fetcher().fetch(url)
+        with stage("parse"):
+            # Parse in a thread so a large page doesn't stall the event loop
+            features = await asyncio.to_thread(extract_features, response.body)
+        return response.body.decode("utf-8", errors="ignore"), features
     except Exception as e:
         print(f"Fetch error: {e}")
         return None, None
 
 
+# ============================================================
+# AUDIT PIPELINE
+# ============================================================
+
+def normalize_url(url):
+    if not url.startswith(("http://", "https://")):
+        url = f"https://{url}"
+    return url
+
+
+async def wait_for_stage(task, deadline, default=None):
+    """Wait for a stage until the deadline. Returns (value, timed_out); a late stage keeps running."""
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), max(0, deadline - time.time())), False
+    except asyncio.TimeoutError:
+        _late_stages.add(task)
+        task.add_done_callback(_late_stages.discard)
+        return default, True
+    except Exception as e:
+        print(f"Audit stage error: {e}")
+        return default, False
+
+
+async def run_audit(url, lighthouse=True, priority=INTERACTIVE):
+    """
+    Audit one URL. Returns the audit result, or a dict with an "error" key.
+    Lighthouse starts right away and the sentiment call as soon as the page
+    is fetched, so the audit takes about as long as its slowest stage. If a
+    stage misses its timeout the result is returned without it ("partial").
+    """
+    started = time.time()
+    # Lighthouse loads the page itself, so it doesn't wait for our fetch
+    # Tasks copy the context, so the stages add their timings to this request's trace
+    lighthouse_task = asyncio.create_task(run_lighthouse_audit(url)) if lighthouse else None
+
+    # Fetch page content
+    html, features = await fetch_page_content(url)
+    if not html or not features.text:
+        if lighthouse_task:
+            lighthouse_task.cancel()
+        return {"error": "Failed to fetch page"}
+    
+    sentiment_task = asyncio.create_task(sentiment_score(features.text, priority))
+    timed_out = []
+
+    # Calculate GEO score
+    sentiment, late = await wait_for_stage(sentiment_task, started + SENTIMENT_STAGE_TIMEOUT, default=50)
+    if late:
+        timed_out.append("sentiment")
+    geo_score, geo_signals = calculate_geo_score(features, sentiment)
+    
+    # Generate suggestions
+    suggestions = generate_suggestions(features, geo_signals)
+
+    # Run Lighthouse
+    lighthouse_data = None
+    if lighthouse_task:
+        # A late run keeps going in the background and fills the Lighthouse cache
+        lighthouse_data, late = await wait_for_stage(lighthouse_task, started + LIGHTHOUSE_STAGE_TIMEOUT)
+        if late:
+            timed_out.append("lighthouse")
+    
+    return {
+        "url": url,
+        "timestamp": datetime.now().isoformat(),
+        "lighthouse": lighthouse_data,
+        "geoScore": geo_score,
+        "geoSignals": geo_signals,
+        "suggestions": suggestions,
+        "partial": bool(timed_out),
+        "timedOutStages": timed_out,
+        "durationMs": round((time.time() - started) * 1000)
+    }
+
+
+batch_audits = BatchAuditManager(run_audit)
+site_audits = SiteAuditManager(score_pages)
+
+
+# ============================================================
+# METRICS
+# ============================================================
+
+def lighthouse_cache_stats():
+    return get_pool().cache.stats()
+
+
+def sentiment_sources():
+    stats = sentiment_batcher.stats()
+    return {("llm",): stats["llm_scored"], ("local",): stats["local_scored"]}
+
+
+if METRICS_ENABLED:
+    app.middleware("http")(trace_requests)
+    register_cache("lighthouse", lighthouse_cache_stats)
+    registry.collect(
+        "geo_sentiment_scored_total", "counter", "Pages scored for sentiment, by the LLM or the local fallback",
+        ["source"], sentiment_sources
+    )
+
+
 # ============================================================
 # API ENDPOINTS
 # ============================================================
 
-@app.route("/api/audit", methods=["POST"])
-def audit_site():
+async def json_body(request: Request) -> dict:
+    """The request's JSON object, or {} if the body is missing or isn't one."""
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+@app.post("/api/audit")
+async def audit_site(request: Request):
     """Main audit endpoint - runs Lighthouse + GEO analysis."""
-    data = request.json
+    data = await json_body(request)
     url = data.get("url")
     
     if not url:
-        return jsonify({"error": "URL required"}), 400
+        return JSONResponse({"error": "URL required"}, status_code=400)
     
     # Validate URL
-    if not url.startswith(("http://", "https://")):
-        url = f"https://{url}"
+    url = normalize_url(url)
     
     try:
-        # Fetch page content
-        html, text = fetch_page_content(url)
-        if not html or not text:
-            return jsonify({"error": "Failed to fetch page"}), 400
-        
-        # Run Lighthouse
-        lighthouse_data = run_lighthouse_audit(url)
-        
-        # Calculate GEO score
-        geo_score, geo_signals = calculate_geo_score(html, text)
-        
-        # Generate suggestions
-        suggestions = generate_suggestions(html, text, geo_signals)
-        
-        return jsonify({
-            "url": url,
-            "timestamp": datetime.now().isoformat(),
-            "lighthouse": lighthouse_data,
-            "geoScore": geo_score,
-            "geoSignals": geo_signals,
-            "suggestions": suggestions
-        })
+        result = await run_audit(url, lighthouse=bool(data.get("lighthouse", True)))
+        if "error" in result:
+            return JSONResponse(result, status_code=400)
+        return result
     
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return JSONResponse({"error": str(e)}, status_code=500)
 
 
-@app.route("/api/health", methods=["GET"])
-def health():
+@app.post("/api/audit/batch")
+async def audit_batch(request: Request):
+    """Start a batch audit for a list of URLs or a sitemap. Returns a job ID to poll."""
+    data = await json_body(request)
+    urls = data.get("urls") or []
+    sitemap = data.get("sitemap")
+    if batch_audits.full():
+        return batch_busy()
+    
+    if sitemap:
+        urls = urls + await sitemap_urls(normalize_url(sitemap), get_fetcher())
+    if not urls:
+        return JSONResponse({"error": "Provide 'urls' or a 'sitemap' URL"}, status_code=400)
+    
+    # Deduplicate while keeping order
+    urls = list(dict.fromkeys(normalize_url(u) for u in urls))[:MAX_BATCH_URLS]
+    job = batch_audits.submit(urls, lighthouse=bool(data.get("lighthouse", True)), priority=BATCH)
+    if job is None:
+        return batch_busy()
+    return JSONResponse(job.to_dict(include_results=False), status_code=202)
+
+
+def batch_busy() -> JSONResponse:
+    return JSONResponse(
+        {"error": f"Too many unfinished batch jobs (max {batch_audits.max_jobs}). Try again later."},
+        status_code=503, headers={"Retry-After": "30"}
+    )
+
+
+@app.get("/api/audit/batch/{job_id}")
+async def audit_batch_status(job_id: str, results: str = "1"):
+    """Progress and per-URL results of a batch audit."""
+    job = batch_audits.get(job_id)
+    if not job:
+        return JSONResponse({"error": "Unknown job ID"}, status_code=404)
+    return job.to_dict(include_results=results != "0")
+
+
+@app.post("/api/audit/site")
+async def audit_whole_site(request: Request):
+    """Crawl a site from its sitemap and links and GEO-score every page. Returns a job ID to poll."""
+    data = await json_body(request)
+    url = data.get("url")
+    if not url:
+        return JSONResponse({"error": "URL required"}, status_code=400)
+
+    try:
+        max_pages = int(data.get("maxPages", 500))
+        max_depth = int(data.get("maxDepth", 3))
+    except (TypeError, ValueError):
+        return JSONResponse({"error": "maxPages and maxDepth must be integers"}, status_code=400)
+    job = site_audits.submit(normalize_url(url), max_pages=max_pages, max_depth=max_depth)
+    if job is None:
+        return JSONResponse(
+            {"error": f"Too many unfinished site audits (max {site_audits.max_jobs}). Try again later."},
+            status_code=503, headers={"Retry-After": "30"}
+        )
+    return JSONResponse(job.to_dict(include_pages=False), status_code=202)
+
+
+@app.get("/api/audit/site/{job_id}")
+async def audit_site_status(job_id: str, offset: int = 0, limit: int = 100, pages: str = "1"):
+    """Progress, aggregate scores and a page of per-URL rows of a site audit."""
+    job = site_audits.get(job_id)
+    if not job:
+        return JSONResponse({"error": "Unknown job ID"}, status_code=404)
+    return job.to_dict(include_pages=pages != "0", offset=max(0, offset), limit=max(0, min(limit, 1000)))
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics: stage latencies and errors, bytes fetched, LLM tokens and cache lookups."""
+    if not METRICS_ENABLED:
+        return JSONResponse({"error": "Metrics are disabled. Set METRICS_ENABLED=1 to enable them."}, status_code=404)
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/api/health")
+async def health():
     """Health check endpoint."""
-    return jsonify({"status": "ok"})
+    return {"status": "ok", "sentiment": sentiment_batcher.stats(), "llm": gateway.stats()}
+
+
+@app.get("/api/ready")
+async def ready():
+    """
+    Readiness probe: 503 until GROQ_API_KEY is set. Lighthouse is reported
+    but not required, since audits can run without it.
+    """
+    checks = {"groq": gateway.configured(), "lighthouse": lighthouse_available()}
+    is_ready = checks["groq"]
+    return JSONResponse(
+        {"status": "ready" if is_ready else "not ready", "checks": checks},
+        status_code=200 if is_ready else 503
+    )
 
 
 if __name__ == "__main__":
-    app.run(debug=True, port=5000)
+    import uvicorn
+
+    uvicorn.run(app, port=5000)
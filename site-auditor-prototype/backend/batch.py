@@ -0,0 +1,147 @@
+"""
+Batch audits: run many single-URL audits as tasks on the event loop, a
+bounded number at a time, and track their progress under a job ID.
+"""
+import asyncio
+import os
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+
+from fetcher import AsyncFetcher, FetchError
+from site_crawler import parse_sitemap
+
+AUDIT_WORKERS = int(os.getenv("AUDIT_WORKERS", "4"))
+MAX_BATCH_URLS = int(os.getenv("MAX_BATCH_URLS", "500"))
+MAX_BATCH_JOBS = int(os.getenv("MAX_BATCH_JOBS", "50"))
+
+async def sitemap_urls(sitemap_url: str, fetcher: AsyncFetcher, limit: int = MAX_BATCH_URLS) -> list:
+    """
+    Collect page URLs from a sitemap, following sitemap index files.
+    """
+    urls = []
+    pending = [sitemap_url]
+    seen = set()
+    while pending and len(urls) < limit:
+        current = pending.pop(0)
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            locs, is_index = parse_sitemap((await fetcher.fetch(current)).body)
+        except (FetchError, ET.ParseError) as e:
+            print(f"Sitemap error for {current}: {e}")
+            continue
+
+        if is_index:
+            pending.extend(locs)
+        else:
+            urls.extend(locs)
+    return urls[:limit]
+
+
+class BatchJob:
+    def __init__(self, urls: list):
+        self.id = uuid.uuid4().hex
+        self.urls = urls
+        self.created = time.time()
+        self.finished = None
+        self.results = [{"url": url, "status": "pending"} for url in urls]
+        self.completed = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+    @property
+    def status(self) -> str:
+        if self.completed + self.failed == len(self.urls):
+            return "done"
+        return "running" if self.completed + self.failed else "queued"
+
+    def to_dict(self, include_results: bool = True) -> dict:
+        with self.lock:
+            data = {
+                "jobId": self.id,
+                "status": self.status,
+                "total": len(self.urls),
+                "completed": self.completed,
+                "failed": self.failed,
+                "createdAt": self.created,
+                "finishedAt": self.finished
+            }
+            if include_results:
+                data["results"] = [dict(r) for r in self.results]
+            return data
+
+
+class BatchAuditManager:
+    """
+    Schedules audits for batch jobs as tasks behind one shared semaphore, so
+    the number of concurrent audits is bounded across all jobs. audit_fn is
+    a coroutine function; submit must be called from the event loop. At most
+    max_jobs jobs are queued or running; finished ones are evicted oldest first.
+    """
+
+    def __init__(self, audit_fn, max_workers: int = AUDIT_WORKERS, max_jobs: int = MAX_BATCH_JOBS):
+        self.audit_fn = audit_fn
+        self.max_jobs = max_jobs
+        self.slots = asyncio.Semaphore(max(1, max_workers))
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        # Running tasks, referenced here so they aren't garbage collected
+        self._tasks = set()
+
+    def full(self) -> bool:
+        """Whether max_jobs jobs are still queued or running."""
+        with self.lock:
+            return self._unfinished() >= self.max_jobs
+
+    def submit(self, urls: list, **audit_kwargs):
+        """Start a job, or return None when max_jobs jobs are still unfinished."""
+        job = BatchJob(urls)
+        with self.lock:
+            if self._unfinished() >= self.max_jobs:
+                return None
+            self.jobs[job.id] = job
+            self._evict()
+        for index, url in enumerate(urls):
+            task = asyncio.create_task(self._run_one(job, index, url, audit_kwargs))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    async def _run_one(self, job: BatchJob, index: int, url: str, audit_kwargs: dict):
+        async with self.slots:
+            with job.lock:
+                job.results[index]["status"] = "running"
+            try:
+                result = await self.audit_fn(url, **audit_kwargs)
+                error = result.get("error")
+            except Exception as e:
+                result, error = None, str(e)
+
+        with job.lock:
+            if error:
+                job.results[index] = {"url": url, "status": "failed", "error": error}
+                job.failed += 1
+            else:
+                job.results[index] = {"url": url, "status": "done", "result": result}
+                job.completed += 1
+            if job.completed + job.failed == len(job.urls):
+                job.finished = time.time()
+
+    def _unfinished(self) -> int:
+        return sum(job.status != "done" for job in self.jobs.values())
+
+    def _evict(self):
+        # Drop the oldest finished jobs once we hold more than max_jobs
+        for job_id in list(self.jobs):
+            if len(self.jobs) <= self.max_jobs:
+                break
+            if self.jobs[job_id].status == "done":
+                del self.jobs[job_id]
@@ -0,0 +1,172 @@
+"""
+Benchmark single-pass feature extraction against the old repeated BeautifulSoup
+parses, and check that both give the same scores and suggestions.
+
+Runs over every .html file in a corpus directory. Without one, it generates
+synthetic pages of roughly 100 KB, 1 MB and 5 MB, and checks a set of small
+varied pages as well. Exits with status 1 if any score or suggestion differs.
+
+Usage (from the site-auditor-prototype/backend directory):
+    python benchmarks/bench_features.py [--corpus path/to/html] [--repeat 3] [--pages 300]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app import generate_suggestions
+from bench_scoring import synthetic_page as varied_page
+from features import extract_features
+from geo_scoring import AUTHORITY_DOMAINS, answer_nugget_score, authority_links_score, extractability_score
+
+# Sentiment is scored by the LLM, not from the HTML, so both paths get the same value
+SENTIMENT = 50
+
+EDGE_PAGES = [
+    b"",
+    b"<html><body></body></html>",
+    b"<p>No html or body tags. Two sentences here.</p>",
+    b"<HTML><BODY><H1>Upper case</H1><P>Text.</P><A HREF='https://arxiv.org/x'>x</A></BODY></HTML>",
+    b"<p>Unclosed <b>tags<p>next paragraph<li>loose item<table><tr><td>cell",
+    b"<ul><li>outer<ul><li>inner <a href=''>empty</a><a>no href</a></li></ul></li></ul><!-- <p>comment</p> -->",
+    b"<p>Entities &amp; &lt;tags&gt; &nbsp;and caf\xc3\xa9.</p><script type='application/ld+json'>{}</script>",
+    b"<h2>Heading</h2><script>var p = '<p>not text</p>';</script><style>p { color: red }</style><p>After.</p>",
+]
+
+
+def legacy_audit(html: bytes):
+    """Scores and suggestion titles from the four html.parser passes one audit used to make."""
+    soup = BeautifulSoup(html, "html.parser")
+    text = ""
+    for tag in soup.find_all(["p", "h1", "h2", "h3", "li"]):
+        text += tag.get_text() + " "
+    nugget = answer_nugget_score(text)
+
+    extractability = 0
+    if html:
+        soup = BeautifulSoup(html, "html.parser")
+        tables = len(soup.find_all("table"))
+        lists = len(soup.find_all(["ul", "ol"]))
+        schemas = len(soup.find_all("script", {"type": "application/ld+json"}))
+        headings = len(soup.find_all(["h1", "h2", "h3"]))
+        extractability = min(
+            min(tables * 20, 40) + min(lists * 10, 30) + min(schemas * 30, 30) + min(headings * 3, 20), 100
+        )
+
+    authority = 0
+    if html:
+        soup = BeautifulSoup(html, "html.parser")
+        links = [a.get("href", "") for a in soup.find_all("a", href=True)]
+        if links:
+            authority_count = sum(1 for link in links if any(domain in link for domain in AUTHORITY_DOMAINS))
+            authority = min(int(authority_count / len(links) * 100), 100)
+
+    soup = BeautifulSoup(html, "html.parser")
+    tables = len(soup.find_all("table"))
+    lists = len(soup.find_all(["ul", "ol"]))
+    schemas = len(soup.find_all("script", {"type": "application/ld+json"}))
+    titles = []
+    if tables == 0:
+        titles.append("Add a Comparison Table")
+    if nugget < 50:
+        titles.append("Add a Quick Answer Section")
+    if schemas == 0:
+        titles.append("Add Schema Markup")
+    if lists < 2:
+        titles.append("Use Lists for Structure")
+    if SENTIMENT < 60:
+        titles.append("Use Neutral Language")
+    return (nugget, extractability, authority), titles[:5]
+
+
+def single_pass_audit(html: bytes):
+    """The same scores and suggestion titles from one extract_features parse."""
+    features = extract_features(html)
+    scores = (answer_nugget_score(features.text), extractability_score(features), authority_links_score(features))
+    geo_signals = dict(zip(("answer_nugget", "extractability", "authority"), scores), sentiment=SENTIMENT)
+    return scores, [s["title"] for s in generate_suggestions(features, geo_signals)]
+
+
+def synthetic_page(target_bytes: int) -> bytes:
+    block = """<section><h2>Section heading</h2>
+<p>Generative engines prefer short factual passages. See <a href="https://en.wikipedia.org/wiki/Search">the reference</a>.</p>
+<ul><li>First point</li><li>Second point</li></ul>
+<table><tr><td>Option</td><td>Value</td></tr></table></section>
+"""
+    head = """<html><head><title>Synthetic</title>
+<script type="application/ld+json">{"@type": "FAQPage"}</script></head><body><h1>Synthetic page</h1>"""
+    repeats = max(1, target_bytes // len(block))
+    return (head + block * repeats + "</body></html>").encode()
+
+
+def load_corpus(corpus: str):
+    if corpus:
+        for name in sorted(os.listdir(corpus)):
+            if name.endswith((".html", ".htm")):
+                with open(os.path.join(corpus, name), "rb") as f:
+                    yield name, f.read()
+        return
+    for label, size in (("synthetic-100k", 100_000), ("synthetic-1m", 1_000_000), ("synthetic-5m", 5_000_000)):
+        yield label, synthetic_page(size)
+
+
+def check_pages(count: int):
+    rng = random.Random(5)
+    pages = [(f"edge-{i}", html) for i, html in enumerate(EDGE_PAGES)]
+    return pages + [(f"varied-{i}", varied_page(rng)) for i in range(count)]
+
+
+def best_of(repeat: int, fn, arg):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn(arg)
+        times.append(time.perf_counter() - start)
+    return min(times), value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="directory of saved .html files")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=300, help="small varied pages to check without --corpus")
+    args = parser.parse_args()
+
+    results = []
+    mismatches = []
+    for name, html in load_corpus(args.corpus):
+        legacy_s, expected = best_of(args.repeat, legacy_audit, html)
+        single_s, actual = best_of(args.repeat, single_pass_audit, html)
+        if actual != expected:
+            mismatches.append({"page": name, "legacy": expected, "single_pass": actual})
+        results.append({
+            "page": name,
+            "bytes": len(html),
+            "legacy_s": round(legacy_s, 4),
+            "single_pass_s": round(single_s, 4),
+            "speedup": round(legacy_s / single_s, 1) if single_s else None
+        })
+
+    checked = [] if args.corpus else check_pages(args.pages)
+    for name, html in checked:
+        expected, actual = legacy_audit(html), single_pass_audit(html)
+        if actual != expected:
+            mismatches.append({"page": name, "legacy": expected, "single_pass": actual})
+
+    print(json.dumps({
+        "pages": results,
+        "checked_pages": len(results) + len(checked),
+        "identical_results": not mismatches,
+        "mismatches": mismatches[:20]
+    }, indent=2))
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
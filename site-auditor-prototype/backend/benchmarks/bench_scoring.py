@@ -0,0 +1,114 @@
+"""
+Benchmark batch GEO signal scoring against the per-page scorers, and check
+that both give the same scores.
+
+Scores every .html file in a corpus directory. Without one, it generates
+synthetic pages: short answers, long articles, marketing copy, pages with
+many links and empty pages. Exits with status 1 if any score differs.
+
+Usage (from the site-auditor-prototype/backend directory):
+    python benchmarks/bench_scoring.py [--corpus path/to/html] [--pages 2000] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from features import extract_features
+from geo_scoring import (
+    MARKETING_WORDS, answer_nugget_score, authority_links_score, extractability_score, geo_scores, score_signals
+)
+
+WORDS = ["search", "engines", "answer", "questions", "with", "short", "factual", "passages", "the", "a", "data"]
+LINKS = [
+    "https://en.wikipedia.org/wiki/Search", "https://www.data.gov/", "https://github.com/org/repo",
+    "https://example.com/blog", "/pricing", "#top", "https://cs.stanford.edu/", "mailto:team@example.com"
+]
+
+
+def synthetic_page(rng: random.Random) -> bytes:
+    # Marketing words are glued together now and then, so overlaps are exercised too
+    vocabulary = WORDS + list(MARKETING_WORDS) + ["Best", "AMAZING", "amazingame-changer", "x!", "y?", "z."]
+    paragraphs = []
+    for _ in range(rng.choice([0, 1, 2, 5, 40])):
+        words = rng.choices(vocabulary, k=rng.choice([5, 15, 30, 60, 90, 200]))
+        paragraphs.append(f"<p>{' '.join(words)}.</p>")
+    links = "".join(f'<a href="{rng.choice(LINKS)}">link</a>' for _ in range(rng.choice([0, 1, 3, 20, 200])))
+    blocks = "".join(rng.choice([
+        "<table><tr><td>1</td></tr></table>", "<ul><li>item</li></ul>", "<ol><li>step</li></ol>", "<h2>Part</h2>",
+        '<script type="application/ld+json">{}</script>'
+    ]) for _ in range(rng.choice([0, 2, 8])))
+    return f"<html><body><h1>Title</h1>{blocks}{''.join(paragraphs)}<div>{links}</div></body></html>".encode()
+
+
+def load_pages(corpus: str, count: int) -> list:
+    if corpus:
+        pages = []
+        for name in sorted(os.listdir(corpus)):
+            if name.endswith((".html", ".htm")):
+                with open(os.path.join(corpus, name), "rb") as f:
+                    pages.append(extract_features(f.read()))
+        return pages
+    rng = random.Random(7)
+    return [extract_features(synthetic_page(rng)) for _ in range(count)] + [extract_features(b"")]
+
+
+def per_page(features_list: list) -> list:
+    return [
+        (answer_nugget_score(features.text), extractability_score(features), authority_links_score(features))
+        for features in features_list
+    ]
+
+
+def batch(features_list: list) -> list:
+    signals = score_signals(features_list)
+    return list(zip(*(signals[name].tolist() for name in ("answer_nugget", "extractability", "authority"))))
+
+
+def best_of(repeat: int, fn, arg):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn(arg)
+        times.append(time.perf_counter() - start)
+    return min(times), value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="directory of saved .html files")
+    parser.add_argument("--pages", type=int, default=2000, help="synthetic pages to score without --corpus")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_pages(args.corpus, args.pages)
+    legacy_s, expected = best_of(args.repeat, per_page, pages)
+    batch_s, actual = best_of(args.repeat, batch, pages)
+
+    rng = random.Random(11)
+    sentiments = [rng.randrange(10, 101, 10) for _ in pages]
+    expected_totals = [
+        min(max(round(nugget * 0.25 + extract * 0.3 + authority * 0.25 + sentiment * 0.2), 0), 100)
+        for (nugget, extract, authority), sentiment in zip(expected, sentiments)
+    ]
+    actual_totals = geo_scores(score_signals(pages), sentiments).tolist()
+
+    mismatches = [i for i, (a, b) in enumerate(zip(expected, actual)) if a != b]
+    mismatches += [i for i, (a, b) in enumerate(zip(expected_totals, actual_totals)) if a != b]
+    print(json.dumps({
+        "pages": len(pages),
+        "per_page_s": round(legacy_s, 4),
+        "batch_s": round(batch_s, 4),
+        "speedup": round(legacy_s / batch_s, 1) if batch_s else None,
+        "identical_scores": not mismatches,
+        "mismatched_pages": sorted(set(mismatches))[:20]
+    }, indent=2))
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
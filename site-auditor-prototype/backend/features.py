@@ -0,0 +1,73 @@
+"""
+Single-pass HTML feature extraction for the GEO scorers.
+
+One lxml parse and one walk over the tree produce an immutable PageFeatures
+record that every scoring and suggestion function reads from.
+"""
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping, Tuple
+
+import lxml.html
+from lxml import etree
+
+# Tags whose text makes up the page's "main text", as in the original auditor
+TEXT_TAGS = {"p", "h1", "h2", "h3", "li"}
+COUNTED_TAGS = {"table", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "a", "img", "script"}
+
+
+@dataclass(frozen=True)
+class PageFeatures:
+    tag_counts: Mapping[str, int] = field(default_factory=lambda: MappingProxyType({}))
+    links: Tuple[str, ...] = ()
+    json_ld: Tuple[str, ...] = ()
+    headings: Tuple[Tuple[str, str], ...] = ()
+    text: str = ""
+
+    def count(self, *tags) -> int:
+        return sum(self.tag_counts.get(tag, 0) for tag in tags)
+
+
+def extract_features(html) -> PageFeatures:
+    """Parse HTML once and collect everything the auditor scores on."""
+    if not html:
+        return PageFeatures()
+    try:
+        root = lxml.html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        return PageFeatures()
+
+    counts = {}
+    links = []
+    json_ld = []
+    headings = []
+    text_parts = []
+
+    for el in root.iter():
+        tag = el.tag
+        if not isinstance(tag, str):
+            continue  # comments and processing instructions
+        tag = tag.lower()
+        if tag in COUNTED_TAGS:
+            counts[tag] = counts.get(tag, 0) + 1
+
+        if tag == "a":
+            href = el.get("href")
+            if href is not None:
+                links.append(href)
+        elif tag == "script":
+            if el.get("type") == "application/ld+json":
+                json_ld.append(el.text or "")
+        if tag in TEXT_TAGS:
+            content = el.text_content()
+            text_parts.append(content + " ")
+            if tag[0] == "h":
+                headings.append((tag, content.strip()))
+
+    return PageFeatures(
+        tag_counts=MappingProxyType(counts),
+        links=tuple(links),
+        json_ld=tuple(json_ld),
+        headings=tuple(headings),
+        text="".join(text_parts)
+    )
@@ -0,0 +1,275 @@
+"""
+Lighthouse runner pool.
+
+Each worker owns one long-lived headless Chrome and points the Lighthouse CLI
+at it with --port, so Chrome starts once per worker instead of once per audit.
+Reports are read from stdout (no temp files), only the categories we score
+are collected, and results are cached per URL with a TTL. Audits run as
+asyncio subprocesses, so waiting on Lighthouse doesn't hold a thread; the
+pool itself is created on first use by get_pool().
+"""
+import asyncio
+import atexit
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+import requests
+
+from cache import TieredCache, make_key
+
+LIGHTHOUSE_CONCURRENCY = int(os.getenv("LIGHTHOUSE_CONCURRENCY", "2"))
+LIGHTHOUSE_TIMEOUT = float(os.getenv("LIGHTHOUSE_TIMEOUT", "120"))
+# Restart a worker's Chrome after this many audits to keep its memory in check
+LIGHTHOUSE_MAX_RUNS = int(os.getenv("LIGHTHOUSE_MAX_RUNS", "50"))
+CATEGORIES = ["performance", "accessibility", "best-practices", "seo"]
+
+IS_WINDOWS = platform.system() == "Windows"
+LIGHTHOUSE_BIN = os.getenv("LIGHTHOUSE_BIN", "lighthouse.cmd" if IS_WINDOWS else "lighthouse")
+CHROME_CANDIDATES = ["google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome"]
+
+
+def find_chrome():
+    """CHROME_PATH if set, else the first Chrome/Chromium on PATH (None if there is none)."""
+    if os.getenv("CHROME_PATH"):
+        return os.getenv("CHROME_PATH")
+    for name in CHROME_CANDIDATES:
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+def lighthouse_available() -> bool:
+    """Whether the Lighthouse CLI can be found (LIGHTHOUSE_BIN, on PATH or as a path)."""
+    return shutil.which(LIGHTHOUSE_BIN) is not None
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def parse_report(report: dict) -> dict:
+    """Keep only the category scores and Core Web Vitals we return."""
+    categories = report.get("categories", {})
+    audits = report.get("audits", {})
+
+    def metric(audit_id):
+        return audits.get(audit_id, {}).get("numericValue") or 0
+
+    return {
+        "categories": {
+            name: (categories.get(name, {}).get("score") or 0) * 100 for name in CATEGORIES
+        },
+        "metrics": {
+            "lcp": metric("largest-contentful-paint") / 1000,
+            # Lighthouse 10+ dropped first-input-delay; max-potential-fid is the lab stand-in
+            "fid": metric("first-input-delay") or metric("max-potential-fid"),
+            "cls": metric("cumulative-layout-shift"),
+        }
+    }
+
+
+class ChromeWorker:
+    """One headless Chrome, started lazily and reused for every audit this worker runs."""
+
+    def __init__(self, chrome_path: str):
+        self.chrome_path = chrome_path
+        self.process = None
+        self.port = None
+        self.profile_dir = None
+        self.runs = 0
+
+    def ensure_started(self):
+        if self.process and self.process.poll() is None and self.runs < LIGHTHOUSE_MAX_RUNS:
+            return
+        self.stop()
+        self.port = _free_port()
+        self.profile_dir = tempfile.mkdtemp(prefix="lighthouse_chrome_")
+        self.process = subprocess.Popen(
+            [
+                self.chrome_path,
+                "--headless=new",
+                f"--remote-debugging-port={self.port}",
+                f"--user-data-dir={self.profile_dir}",
+                "--no-first-run",
+                "--no-default-browser-check",
+                "--disable-gpu",
+                "about:blank",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        self.runs = 0
+        self._wait_ready()
+
+    def _wait_ready(self, timeout: float = 15):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                requests.get(f"http://127.0.0.1:{self.port}/json/version", timeout=1)
+                return
+            except requests.RequestException:
+                time.sleep(0.1)
+        self.stop()
+        raise RuntimeError("Chrome did not start")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+    def command(self, url: str) -> list:
+        return [
+            LIGHTHOUSE_BIN,
+            url,
+            f"--port={self.port}",
+            "--output=json",
+            "--output-path=stdout",
+            f"--only-categories={','.join(CATEGORIES)}",
+            "--quiet"
+        ]
+
+
+def _spawn(command: list):
+    if IS_WINDOWS:
+        # lighthouse.cmd is a batch file, which has to go through the shell
+        return asyncio.create_subprocess_shell(
+            subprocess.list2cmdline(command), stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+    return asyncio.create_subprocess_exec(*command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+class LighthousePool:
+    """
+    Runs Lighthouse on at most `size` URLs at once, one per Chrome worker.
+    Without a Chrome binary, Lighthouse launches its own Chrome per run.
+    """
+
+    def __init__(self, size: int = LIGHTHOUSE_CONCURRENCY, chrome_path: str = None):
+        self.chrome_path = chrome_path or find_chrome()
+        self.workers = asyncio.Queue()
+        self._all = []
+        for _ in range(max(1, size)):
+            worker = ChromeWorker(self.chrome_path) if self.chrome_path else None
+            self._all.append(worker)
+            self.workers.put_nowait(worker)
+        self.cache = TieredCache(
+            "lighthouse",
+            max_entries=int(os.getenv("LIGHTHOUSE_CACHE_SIZE", "256")),
+            ttl=float(os.getenv("LIGHTHOUSE_CACHE_TTL", "3600")),
+            db_path=os.getenv("LIGHTHOUSE_CACHE_DB")
+        )
+        self._inflight = {}
+
+    async def run(self, url: str):
+        """Lighthouse result for a URL (cached), or None if the audit failed."""
+        key = make_key(url)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return json.loads(cached)
+
+        # Concurrent requests for the same URL share one run
+        shared = self._inflight.get(key)
+        if shared is not None:
+            return await asyncio.shield(shared)
+        shared = self._inflight[key] = asyncio.get_running_loop().create_future()
+
+        result = None
+        try:
+            result = await self._run_uncached(url)
+            if result is not None:
+                self.cache.set(key, json.dumps(result))
+            return result
+        finally:
+            self._inflight.pop(key, None)
+            shared.set_result(result)
+
+    async def _run_uncached(self, url: str):
+        worker = await self.workers.get()
+        stopping = None
+        try:
+            if worker is not None:
+                # Starting Chrome blocks until it answers, so it happens in a thread
+                await asyncio.to_thread(worker.ensure_started)
+                command = worker.command(url)
+            else:
+                command = [
+                    LIGHTHOUSE_BIN, url, "--output=json", "--output-path=stdout",
+                    f"--only-categories={','.join(CATEGORIES)}", "--chrome-flags=--headless", "--quiet"
+                ]
+
+            print(f"Starting Lighthouse audit for {url}...")
+            process = await _spawn(command)
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), LIGHTHOUSE_TIMEOUT)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                # The killed run may have left a tab busy, so start fresh next time.
+                # Stopping Chrome waits for it to exit, so it happens in a thread.
+                if worker is not None:
+                    stopping = asyncio.ensure_future(asyncio.to_thread(worker.stop))
+                    await asyncio.shield(stopping)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                print(f"Lighthouse timed out for {url}")
+                return None
+            print("Lighthouse audit finished.")
+            if worker is not None:
+                worker.runs += 1
+                if worker.runs >= LIGHTHOUSE_MAX_RUNS:
+                    # Recycle Chrome now instead of on the worker's next run
+                    stopping = asyncio.ensure_future(asyncio.to_thread(worker.stop))
+                    await asyncio.shield(stopping)
+
+            if process.returncode != 0:
+                print(f"Lighthouse failed: {stderr.decode(errors='ignore')}")
+                return None
+            return parse_report(json.loads(stdout))
+        except Exception as e:
+            print(f"Lighthouse error: {e}")
+            return None
+        finally:
+            if stopping is not None and not stopping.done():
+                # Cancelled while Chrome was stopping: hand the worker back once it has stopped
+                stopping.add_done_callback(lambda _: self.workers.put_nowait(worker))
+            else:
+                self.workers.put_nowait(worker)
+
+    def shutdown(self):
+        for worker in self._all:
+            if worker is not None:
+                worker.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> LighthousePool:
+    """The shared pool, created on first use (this finds Chrome and opens the result cache)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = LighthousePool()
+            atexit.register(_pool.shutdown)
+        return _pool
@@ -0,0 +1,171 @@
+"""
+Batched objectivity (sentiment) scoring.
+
+Requests are collected for a short window and sent to Groq as one prompt of
+up to SENTIMENT_BATCH_SIZE numbered excerpts, answered with a JSON array of
+scores, which is then fanned back out to the callers. Requests go through
+the shared LLM gateway; while it is paused by a rate limit, or when a request
+fails, a deterministic local scorer answers instead.
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from groq import RateLimitError
+
+from llm_gateway import INTERACTIVE
+
+SENTIMENT_MODEL = "llama-3.3-70b-versatile"
+SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "8"))
+# Seconds to wait for more requests before sending a batch that isn't full
+SENTIMENT_BATCH_WINDOW = float(os.getenv("SENTIMENT_BATCH_WINDOW", "0.05"))
+# Batch requests in flight at once
+SENTIMENT_MAX_INFLIGHT = int(os.getenv("SENTIMENT_MAX_INFLIGHT", "2"))
+EXCERPT_CHARS = 1000
+NEUTRAL_SCORE = 50
+
+MARKETING_WORDS = {
+    "best", "amazing", "incredible", "revolutionary", "game-changer", "must-have", "ultimate",
+    "unbeatable", "exclusive", "guaranteed", "perfect", "awesome", "stunning", "world-class",
+    "leading", "premier", "unmatched", "breakthrough", "free", "limited", "hurry", "buy", "deal"
+}
+PERSONAL_WORDS = {"you", "your", "yours", "we", "our", "us", "i", "my"}
+_WORD_RE = re.compile(r"[a-z][a-z'-]*|\d+(?:[.,]\d+)?%?")
+
+BATCH_PROMPT = """Rate each numbered text for objectivity and factuality on a scale of 1-10.
+1 = Pure marketing/opinion/biased
+10 = Neutral, fact-based, objective
+
+{texts}
+
+Respond with ONLY a JSON array of {count} integers, one per text in order, no explanation."""
+
+
+def local_sentiment_score(text: str) -> int:
+    """
+    Deterministic objectivity estimate on the same 10-100 scale as the LLM:
+    promotional words, direct address and exclamations lower it, figures raise it.
+    """
+    excerpt = (text or "")[:EXCERPT_CHARS]
+    words = _WORD_RE.findall(excerpt.lower())
+    if not words:
+        return NEUTRAL_SCORE
+    sentences = max(1, len(re.findall(r"[.!?]+", excerpt)))
+
+    promotional = sum(1 for w in words if w in MARKETING_WORDS) / len(words)
+    personal = sum(1 for w in words if w in PERSONAL_WORDS) / len(words)
+    exclamations = excerpt.count("!") / sentences
+    figures = sum(1 for w in words if w[0].isdigit()) / len(words)
+
+    score = 7.0 - promotional * 60 - personal * 15 - exclamations * 3 + min(figures * 20, 2.0)
+    return min(max(round(score), 1), 10) * 10
+
+
+def parse_scores(reply: str, count: int) -> list:
+    """Scores (10-100) from a JSON array reply; None where a score is missing or invalid."""
+    scores = [None] * count
+    match = re.search(r"\[.*?\]", reply or "", re.S)
+    if not match:
+        return scores
+    try:
+        values = json.loads(match.group(0))
+    except ValueError:
+        return scores
+    for i, value in enumerate(values[:count]):
+        try:
+            scores[i] = min(max(int(float(value)), 1), 10) * 10
+        except (TypeError, ValueError):
+            pass
+    return scores
+
+
+class SentimentBatcher:
+    def __init__(self, gateway, batch_size: int = SENTIMENT_BATCH_SIZE, window: float = SENTIMENT_BATCH_WINDOW):
+        self.gateway = gateway
+        self.batch_size = max(1, batch_size)
+        self.window = window
+        self.executor = ThreadPoolExecutor(max_workers=SENTIMENT_MAX_INFLIGHT, thread_name_prefix="sentiment")
+        self.counters = {"batches": 0, "llm_scored": 0, "local_scored": 0}
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+
+    def submit(self, text: str, priority: int = INTERACTIVE) -> Future:
+        future = Future()
+        if not text:
+            future.set_result(NEUTRAL_SCORE)
+            return future
+        with self._cond:
+            self._pending.append((text[:EXCERPT_CHARS], priority, future))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._collect, daemon=True, name="sentiment-batcher")
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def score(self, text: str, priority: int = INTERACTIVE) -> int:
+        return self.submit(text, priority).result()
+
+    async def ascore(self, text: str, priority: int = INTERACTIVE) -> int:
+        """score for async callers: waits for the batch without holding a thread."""
+        return await asyncio.wrap_future(self.submit(text, priority))
+
+    def score_many(self, texts: list, priority: int = INTERACTIVE) -> list:
+        """Score several texts at once; they are batched together."""
+        futures = [self.submit(text, priority) for text in texts]
+        return [future.result() for future in futures]
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return dict(self.counters, cooling_down=self.gateway.paused_for() > 0)
+
+    def _collect(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Give other callers the window to join this batch, unless it is already full
+                deadline = time.time() + self.window
+                while len(self._pending) < self.batch_size:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+            self.executor.submit(self._score_batch, batch)
+
+    def _score_batch(self, batch: list):
+        texts = [text for text, _, _ in batch]
+        scores = [None] * len(batch)
+        # Score locally instead of queueing behind a rate limit
+        if not self.gateway.paused_for():
+            scores = self._request(texts, min(priority for _, priority, _ in batch))
+        local = sum(1 for score in scores if score is None)
+        with self._stats_lock:
+            self.counters["batches"] += 1
+            self.counters["llm_scored"] += len(scores) - local
+            self.counters["local_scored"] += local
+        for text, score, (_, _, future) in zip(texts, scores, batch):
+            future.set_result(local_sentiment_score(text) if score is None else score)
+
+    def _request(self, texts: list, priority: int) -> list:
+        numbered = "\n\n".join(f"[{i}] TEXT:\n{text}" for i, text in enumerate(texts, 1))
+        messages = [{"role": "user", "content": BATCH_PROMPT.format(texts=numbered, count=len(texts))}]
+        try:
+            # No retries: a failed batch is scored locally right away
+            reply = self.gateway.complete(
+                messages, SENTIMENT_MODEL, max_tokens=4 * len(texts) + 16, temperature=0.3,
+                priority=priority, retries=0
+            )
+            return parse_scores(reply, len(texts))
+        except RateLimitError:
+            print("Groq sentiment rate limited, using local scores")
+        except Exception as e:
+            print(f"Groq sentiment score error: {e}")
+        return [None] * len(texts)
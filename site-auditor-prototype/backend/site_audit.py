@@ -0,0 +1,218 @@
+"""
+Whole-site GEO audits: crawl a site and score each page as it arrives.
+
+Each site job runs the shared SiteCrawler on its own event loop in a worker
+thread. Pages are parsed once (extract_features gives both the links to
+follow and the features to score) and scored in groups, so one sentiment
+request covers a whole group even though the politeness delay spaces the
+pages out. Each page is then reduced to a compact row, so memory stays
+bounded for large sites.
+"""
+import asyncio
+import contextlib
+import heapq
+import os
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from fetcher import AsyncFetcher
+from features import extract_features
+from llm_gateway import BATCH
+from site_crawler import CRAWL_MAX_DEPTH, SiteCrawler, normalize_url
+
+SITE_AUDIT_WORKERS = int(os.getenv("SITE_AUDIT_WORKERS", "2"))
+SITE_AUDIT_MAX_PAGES = int(os.getenv("SITE_AUDIT_MAX_PAGES", "10000"))
+# Pages scored together (one sentiment request), and groups scored at once per site
+SITE_SCORE_BATCH = int(os.getenv("SITE_SCORE_BATCH", "8"))
+SITE_SCORE_CONCURRENCY = int(os.getenv("SITE_SCORE_CONCURRENCY", "2"))
+MAX_SITE_JOBS = int(os.getenv("MAX_SITE_JOBS", "20"))
+WORST_PAGES = 10
+
+
+def extract_page_features(result):
+    features = extract_features(result.body)
+    return features.links, features
+
+
+class SiteAuditJob:
+    def __init__(self, url: str, max_pages: int, max_depth: int):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.created = time.time()
+        self.finished = None
+        self.status = "queued"
+        self.error = None
+        self.pages = []
+        self.failed = 0
+        self.crawl_stats = {}
+        self.lock = threading.Lock()
+        self._score_total = 0
+        self._signal_totals = Counter()
+        self._suggestions = Counter()
+        self._worst = []
+
+    def record(self, row: dict):
+        with self.lock:
+            self.pages.append(row)
+            if "error" in row:
+                self.failed += 1
+                return
+            self._score_total += row["geoScore"]
+            self._signal_totals.update(row["geoSignals"])
+            self._suggestions.update(row["suggestions"])
+            # Negated scores: the heap pops the highest score kept, leaving the N lowest
+            item = (-row["geoScore"], len(self.pages), row["url"])
+            if len(self._worst) < WORST_PAGES:
+                heapq.heappush(self._worst, item)
+            else:
+                heapq.heappushpop(self._worst, item)
+
+    def to_dict(self, include_pages: bool = True, offset: int = 0, limit: int = 100) -> dict:
+        with self.lock:
+            scored = len(self.pages) - self.failed
+            data = {
+                "jobId": self.id,
+                "url": self.url,
+                "status": self.status,
+                "error": self.error,
+                "maxPages": self.max_pages,
+                "maxDepth": self.max_depth,
+                "crawled": len(self.pages),
+                "scored": scored,
+                "failed": self.failed,
+                "averageGeoScore": round(self._score_total / scored, 1) if scored else None,
+                "averageSignals": {
+                    name: round(total / scored, 1) for name, total in self._signal_totals.items()
+                } if scored else {},
+                "topSuggestions": [
+                    {"title": title, "pages": count} for title, count in self._suggestions.most_common(5)
+                ],
+                "lowestScoringPages": [
+                    {"url": url, "geoScore": -score} for score, _, url in sorted(self._worst, reverse=True)
+                ],
+                "crawlStats": dict(self.crawl_stats),
+                "createdAt": self.created,
+                "finishedAt": self.finished
+            }
+            if include_pages:
+                data["pages"] = [dict(row) for row in self.pages[offset:offset + limit]]
+            return data
+
+
+class SiteAuditManager:
+    """
+    Runs up to SITE_AUDIT_WORKERS site crawls at once. score_fn(features_list,
+    priority) returns one (geo_score, geo_signals, suggestions) per page. At
+    most max_jobs jobs are queued or running; finished ones are evicted oldest first.
+    """
+
+    def __init__(self, score_fn, max_workers: int = SITE_AUDIT_WORKERS, max_jobs: int = MAX_SITE_JOBS):
+        self.score_fn = score_fn
+        self.max_jobs = max_jobs
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="site-audit")
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def full(self) -> bool:
+        """Whether max_jobs jobs are still queued or running."""
+        with self.lock:
+            return self._unfinished() >= self.max_jobs
+
+    def submit(self, url: str, max_pages: int = SITE_AUDIT_MAX_PAGES, max_depth: int = CRAWL_MAX_DEPTH):
+        """Start a site audit, or return None when max_jobs jobs are still unfinished."""
+        job = SiteAuditJob(normalize_url(url) or url, min(max(1, max_pages), SITE_AUDIT_MAX_PAGES), max(0, max_depth))
+        with self.lock:
+            if self._unfinished() >= self.max_jobs:
+                return None
+            self.jobs[job.id] = job
+            self._evict()
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _run(self, job: SiteAuditJob):
+        job.status = "running"
+        try:
+            asyncio.run(self._crawl(job))
+            job.status = "done"
+        except Exception as e:
+            print(f"Site audit error for {job.url}: {e}")
+            job.status, job.error = "failed", str(e)
+        job.finished = time.time()
+
+    def _score(self, pages: list) -> list:
+        results = self.score_fn([page["data"] for page in pages], BATCH)
+        return [
+            {
+                "url": page["url"],
+                "depth": page["depth"],
+                "geoScore": geo_score,
+                "geoSignals": geo_signals,
+                "suggestions": [s["title"] for s in suggestions]
+            }
+            for page, (geo_score, geo_signals, suggestions) in zip(pages, results)
+        ]
+
+    async def _crawl(self, job: SiteAuditJob):
+        fetcher = AsyncFetcher()
+        crawler = SiteCrawler(fetcher, extract_page_features, max_pages=job.max_pages, max_depth=job.max_depth)
+        job.crawl_stats = crawler.stats
+        slots = asyncio.Semaphore(SITE_SCORE_CONCURRENCY)
+        scoring = set()
+
+        group = []
+
+        async def score(pages):
+            try:
+                rows = await asyncio.to_thread(self._score, pages)
+            except Exception as e:
+                rows = [{"url": page["url"], "depth": page["depth"], "error": str(e)} for page in pages]
+            finally:
+                slots.release()
+            for row in rows:
+                job.record(row)
+
+        async def flush():
+            nonlocal group
+            # Waiting for a free slot also holds back the crawler (its page queue is small)
+            await slots.acquire()
+            task = asyncio.create_task(score(group))
+            scoring.add(task)
+            task.add_done_callback(scoring.discard)
+            group = []
+
+        try:
+            async with contextlib.aclosing(crawler.crawl(job.url)) as pages:
+                async for page in pages:
+                    if "error" not in page and not page["data"].text:
+                        page = {"url": page["url"], "depth": page["depth"], "error": "No text content"}
+                    if "error" in page:
+                        job.record({"url": page["url"], "depth": page["depth"], "error": page["error"]})
+                        continue
+                    group.append(page)
+                    if len(group) >= SITE_SCORE_BATCH:
+                        await flush()
+            if group:
+                await flush()
+            await asyncio.gather(*scoring)
+        finally:
+            await fetcher.aclose()
+
+    def _unfinished(self) -> int:
+        return sum(job.status not in ("done", "failed") for job in self.jobs.values())
+
+    def _evict(self):
+        # Drop the oldest finished jobs once we hold more than max_jobs
+        for job_id in list(self.jobs):
+            if len(self.jobs) <= self.max_jobs:
+                break
+            if self.jobs[job_id].status in ("done", "failed"):
+                del self.jobs[job_id]